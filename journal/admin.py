@@ -3,7 +3,8 @@ from .models import (
     AfterTradeEntry, PreTradeEntry, BacktestEntry, 
     StrategyTag, FilterPreset, LotSizeCalculation,
     ChoiceCategory, ChoiceOption, CommonMistakeLog, TradeTemplate,
-    JournalField, JournalFieldOption, JournalFieldValue
+    JournalField, JournalFieldOption, JournalFieldValue, JournalFieldValueChoice,
+    DailyTradeRollup, TradeStreak, SearchDocument
 )
 
 
@@ -188,14 +189,54 @@ class JournalFieldOptionAdmin(admin.ModelAdmin):
     ordering = ['field', 'order', 'display_label']
 
 
+class JournalFieldValueChoiceInline(admin.TabularInline):
+    model = JournalFieldValueChoice
+    extra = 0
+    readonly_fields = ['option']
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        # Maintained from value_text on save
+        return False
+
+
 @admin.register(JournalFieldValue)
 class JournalFieldValueAdmin(admin.ModelAdmin):
     list_display = ['field', 'entry_type', 'entry_id', 'get_value_display', 'created_at']
     list_filter = ['entry_type', 'field', 'field__journal_type', 'created_at']
     search_fields = ['field__display_name', 'value_text', 'field__user__username']
     readonly_fields = ['created_at', 'updated_at']
+    inlines = [JournalFieldValueChoiceInline]
+    ordering = ['entry_type', 'entry_id', 'field__order', 'field__display_name']
     
     def get_value_display(self, obj):
         return obj.get_value_display()
     get_value_display.short_description = 'Value'
+    
+    def delete_queryset(self, request, queryset):
+        # Bumps each owner's data version once instead of per row
+        JournalFieldValue.purge(queryset)
+
+
+
+@admin.register(DailyTradeRollup)
+class DailyTradeRollupAdmin(admin.ModelAdmin):
+    list_display = ['date', 'user', 'pair', 'session', 'trades', 'wins', 'losses', 'sum_rr']
+    list_filter = ['user', 'date', 'session']
+    search_fields = ['pair', 'user__username']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(TradeStreak)
+class TradeStreakAdmin(admin.ModelAdmin):
+    list_display = ['user', 'current_outcome', 'current_length', 'max_win_streak', 'max_loss_streak', 'updated_at']
+    search_fields = ['user__username']
+    readonly_fields = ['last_date', 'last_time', 'last_entry_id', 'updated_at']
+
 
+@admin.register(SearchDocument)
+class SearchDocumentAdmin(admin.ModelAdmin):
+    list_display = ['entry_type', 'entry_id', 'user', 'date', 'pair', 'updated_at']
+    list_filter = ['entry_type', 'user']
+    search_fields = ['pair', 'user__username']
+    readonly_fields = ['updated_at']
@@ -1,11 +1,17 @@
 """
 API endpoints for dynamic features (dropdowns, sync, etc.)
 """
-from django.http import JsonResponse
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponseNotModified, JsonResponse
+from django.urls import reverse
 from django.views.decorators.http import require_http_methods
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-from .models import ChoiceOption, ChoiceCategory
+from .models import AfterTradeEntry, BacktestEntry, ChoiceOption, ChoiceCategory, PreTradeEntry, UserDataVersion
 
 
 @require_http_methods(["GET"])
@@ -100,3 +106,264 @@ def api_dropdown_category(request, category_name):
             'error': str(e)
         }, status=500)
 
+
+
+# Dashboard widgets
+#
+# Each widget of the dashboard is loaded by the browser from its own endpoint so
+# a slow block never holds up the others. Payloads are cached per widget under
+# the user's data version (bumped on every journal write), and every response
+# reports how long its widget took in a Server-Timing header.
+
+RECENT_ENTRIES_LIMIT = 5
+
+
+def _dashboard_widget_response(request, widget, build, params=(), per_day=False):
+    """
+    Serve a dashboard widget payload, cached independently of the other widgets.
+    
+    build() is only called on a cache miss. Widgets whose values depend on
+    today's date (rolling windows) pass per_day=True so they roll over at midnight.
+    """
+    version = UserDataVersion.get_version(request.user.pk)
+    key_parts = [widget, str(request.user.pk), str(version)]
+    key_parts += [str(param) for param in params]
+    if per_day:
+        key_parts.append(timezone.now().date().isoformat())
+    cache_key = 'dashboard_widget:' + ':'.join(key_parts)
+    etag = '"%s"' % hashlib.md5(cache_key.encode()).hexdigest()
+    
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+        response['ETag'] = etag
+        return response
+    
+    started = time.perf_counter()
+    payload = cache.get(cache_key)
+    cached = payload is not None
+    if not cached:
+        payload = build()
+        cache.set(cache_key, payload, settings.JOURNAL_CACHE_TIMEOUT)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    
+    response = JsonResponse({
+        'success': True,
+        'widget': widget,
+        'data': payload,
+        'cached': cached,
+        'timing_ms': round(elapsed_ms, 2),
+        'timestamp': str(timezone.now())
+    })
+    response['ETag'] = etag
+    response['Cache-Control'] = 'private, no-cache'
+    response['Server-Timing'] = '%s;dur=%.2f;desc="%s"' % (widget, elapsed_ms, 'cache hit' if cached else 'cache miss')
+    return response
+
+
+def _widget_error(e):
+    return JsonResponse({
+        'success': False,
+        'error': str(e)
+    }, status=500)
+
+
+@require_http_methods(["GET"])
+@login_required
+def api_dashboard_kpis(request):
+    """KPI cards, current streak and the bias / market condition chart values"""
+    from .services import DashboardMetrics
+    
+    try:
+        return _dashboard_widget_response(
+            request, 'kpis',
+            lambda: DashboardMetrics.compute(request.user).as_dict(),
+            per_day=True
+        )
+    except Exception as e:
+        return _widget_error(e)
+
+
+@require_http_methods(["GET"])
+@login_required
+def api_dashboard_charts(request):
+    """
+    Weekly win rate and monthly POI score series for the dashboard charts
+    
+    Optional query params: weeks, months (window sizes)
+    """
+    from .services import DashboardMetrics, DEFAULT_CHART_WEEKS, DEFAULT_CHART_MONTHS, MAX_CHART_WEEKS, MAX_CHART_MONTHS
+    
+    try:
+        weeks = int(request.GET.get('weeks', DEFAULT_CHART_WEEKS))
+        months = int(request.GET.get('months', DEFAULT_CHART_MONTHS))
+    except (TypeError, ValueError):
+        return JsonResponse({
+            'success': False,
+            'error': 'weeks and months must be integers'
+        }, status=400)
+    # Clamp here as well so the cache key matches the window actually computed
+    weeks = min(max(weeks, 1), MAX_CHART_WEEKS)
+    months = min(max(months, 1), MAX_CHART_MONTHS)
+    
+    try:
+        return _dashboard_widget_response(
+            request, 'charts',
+            lambda: DashboardMetrics.chart_series(request.user, weeks=weeks, months=months),
+            params=(weeks, months),
+            per_day=True
+        )
+    except Exception as e:
+        return _widget_error(e)
+
+
+def _recent_after_trades(user):
+    entries = AfterTradeEntry.objects.filter(user=user).order_by('-date').values('pk', 'pair', 'date', 'outcome')
+    return [
+        {
+            'pair': entry['pair'],
+            'date': entry['date'].strftime('%b %d, %Y'),
+            'label': entry['outcome'].upper(),
+            'style': 'primary' if entry['outcome'] == 'win' else 'danger',
+            'url': reverse('after_trade_detail', args=[entry['pk']]),
+        }
+        for entry in entries[:RECENT_ENTRIES_LIMIT]
+    ]
+
+
+def _recent_pre_trades(user):
+    entries = PreTradeEntry.objects.filter(user=user).order_by('-date').values('pk', 'pair', 'date', 'trade_taken')
+    return [
+        {
+            'pair': entry['pair'],
+            'date': entry['date'].strftime('%b %d, %Y'),
+            'label': 'Taken' if entry['trade_taken'] else 'Not Taken',
+            'style': 'primary' if entry['trade_taken'] else 'secondary',
+            'url': reverse('pre_trade_detail', args=[entry['pk']]),
+        }
+        for entry in entries[:RECENT_ENTRIES_LIMIT]
+    ]
+
+
+def _recent_backtests(user):
+    entries = BacktestEntry.objects.filter(user=user).order_by('-date').values('pk', 'pair', 'date', 'outcome')
+    return [
+        {
+            'pair': entry['pair'],
+            'date': entry['date'].strftime('%b %d, %Y'),
+            'label': entry['outcome'].upper(),
+            'style': 'primary',
+            'url': reverse('backtest_detail', args=[entry['pk']]),
+        }
+        for entry in entries[:RECENT_ENTRIES_LIMIT]
+    ]
+
+
+RECENT_ENTRY_LOADERS = {
+    'after': _recent_after_trades,
+    'pre': _recent_pre_trades,
+    'backtest': _recent_backtests,
+}
+
+
+@require_http_methods(["GET"])
+@login_required
+def api_dashboard_recent(request, journal_type):
+    """Latest entries of one journal (after, pre or backtest) for the Recent Activity lists"""
+    loader = RECENT_ENTRY_LOADERS.get(journal_type)
+    if loader is None:
+        return JsonResponse({
+            'success': False,
+            'error': f'Unknown journal type: {journal_type}'
+        }, status=404)
+    
+    try:
+        return _dashboard_widget_response(
+            request, f'recent_{journal_type}',
+            lambda: loader(request.user)
+        )
+    except Exception as e:
+        return _widget_error(e)
+
+
+@require_http_methods(["GET"])
+@login_required
+def api_search_suggest(request):
+    """
+    Typeahead suggestions for the search box: pairs, strategy tags, custom
+    field option labels and recent note phrases matching ?q=
+
+    Optional query param: limit (suggestions per kind)
+    """
+    from .suggest import DEFAULT_SUGGESTIONS, MAX_SUGGESTIONS, suggest
+    
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_SUGGESTIONS))
+    except (TypeError, ValueError):
+        return JsonResponse({
+            'success': False,
+            'error': 'limit must be an integer'
+        }, status=400)
+    limit = min(max(limit, 1), MAX_SUGGESTIONS)
+    query = request.GET.get('q', '')
+    
+    try:
+        started = time.perf_counter()
+        suggestions = suggest(request.user, query, limit)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    except Exception as e:
+        return _widget_error(e)
+    
+    response = JsonResponse({
+        'success': True,
+        'query': query,
+        'suggestions': [suggestion.as_dict() for suggestion in suggestions],
+        'timing_ms': round(elapsed_ms, 2),
+    })
+    response['Cache-Control'] = 'private, no-cache'
+    response['Server-Timing'] = 'suggest;dur=%.2f' % elapsed_ms
+    return response
+
+
+MAX_INSTRUMENT_RESULTS = 100
+
+
+@require_http_methods(["GET"])
+@login_required
+def api_instrument_search(request):
+    """
+    Lot size calculator instruments matching ?q= by code or name word prefix
+
+    Optional query params: type (repeatable: forex, index, commodity,
+    crypto), limit
+    """
+    from .instrument_data import INSTRUMENT_INDEX, search_instruments
+    
+    types = [value for value in request.GET.getlist('type') if value]
+    unknown = [value for value in types if value not in INSTRUMENT_INDEX.types]
+    if unknown:
+        return JsonResponse({
+            'success': False,
+            'error': f'Unknown instrument type: {unknown[0]}',
+            'types': list(INSTRUMENT_INDEX.types)
+        }, status=400)
+    try:
+        limit = int(request.GET.get('limit', MAX_INSTRUMENT_RESULTS))
+    except (TypeError, ValueError):
+        return JsonResponse({
+            'success': False,
+            'error': 'limit must be an integer'
+        }, status=400)
+    limit = min(max(limit, 1), MAX_INSTRUMENT_RESULTS)
+    query = request.GET.get('q', '')
+    
+    results = search_instruments(query, types=set(types), limit=limit)
+    response = JsonResponse({
+        'success': True,
+        'query': query,
+        'types': types,
+        'count': len(results),
+        'results': results,
+    })
+    # The instrument table only changes with a deploy
+    response['Cache-Control'] = 'private, max-age=3600'
+    return response
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class JournalConfig(AppConfig):
+    name = 'journal'
+
+    def ready(self):
+        # Register model signal handlers
+        from . import signals  # noqa: F401
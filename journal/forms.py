@@ -2,6 +2,8 @@ from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from decimal import Decimal
+from functools import lru_cache
+from .instrument_data import get_instrument_choices
 from .models import AfterTradeEntry, PreTradeEntry, BacktestEntry, StrategyTag, FilterPreset, LotSizeCalculation
 from .utils import (
     get_session_choices, get_bias_choices, get_market_condition_choices,
@@ -11,7 +13,7 @@ from .utils import (
     get_lower_tf_confirmation_choices, get_predicted_directional_bias_choices,
     get_poi_performance_choices, get_htf_poi_type_choices, get_high_impact_news_choices,
     get_behaviour_choices, get_pair_choices,
-    get_user_journal_fields, create_dynamic_form_field, get_field_value_for_entry
+    get_user_journal_fields, create_dynamic_form_field, CustomFieldValueMap
 )
 
 
@@ -23,8 +25,78 @@ class UserRegistrationForm(UserCreationForm):
         fields = ('username', 'email', 'password1', 'password2')
 
 
-class AfterTradeEntryForm(forms.ModelForm):
-    """Dynamic form - only shows system fields + user-defined custom fields"""
+class CustomFieldsFormMixin:
+    """
+    Adds a user's custom fields to a journal entry form.
+    
+    EntryForm.for_user(user) returns a subclass with the custom fields declared
+    up front. It is built once per (form, user, schema version) and memoized,
+    so each request only copies the declared fields, and an edit form loads all
+    stored values of the entry in one query.
+    """
+    journal_type = None
+    # JournalField snapshot the class was built from
+    custom_fields = ()
+    
+    @classmethod
+    def for_user(cls, user):
+        """Subclass of the form declaring the user's custom fields"""
+        from .models import UserDataVersion
+        user_id = getattr(user, 'pk', user)
+        return _custom_form_class(cls, user_id, UserDataVersion.get_schema_version(user_id))
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.custom_fields and self.instance and self.instance.pk:
+            field_values = CustomFieldValueMap.for_entries([self.instance], self.custom_fields)
+            for field in self.custom_fields:
+                value_obj = field_values.get(self.instance, field)
+                if value_obj:
+                    self.initial.setdefault(f'custom_{field.name}', self.custom_field_initial(field, value_obj))
+    
+    @staticmethod
+    def custom_field_initial(field, value_obj):
+        """Form value of a stored JournalFieldValue"""
+        if field.field_type == 'checkbox':
+            return value_obj.value_boolean
+        elif field.field_type in ['number', 'decimal']:
+            return value_obj.value_number
+        elif field.field_type == 'date':
+            return value_obj.value_date
+        elif field.field_type == 'time':
+            return value_obj.value_time
+        elif field.field_type == 'datetime':
+            return value_obj.value_datetime
+        elif field.field_type == 'multiselect':
+            return value_obj.split_choices(value_obj.value_text)
+        return value_obj.value_text
+
+
+# Memoized form classes per process; a schema change moves users to a new key
+# and the superseded classes age out of the LRU
+FORM_CLASS_CACHE_SIZE = 256
+
+
+@lru_cache(maxsize=FORM_CLASS_CACHE_SIZE)
+def _custom_form_class(form_class, user_id, schema_version):
+    """Subclass of form_class declaring the user's custom fields (schema_version only keys the memo)"""
+    custom_fields = get_user_journal_fields(user_id, form_class.journal_type)
+    attrs = {'__module__': form_class.__module__, 'custom_fields': custom_fields}
+    for field in custom_fields:
+        try:
+            form_field = create_dynamic_form_field(field)
+        except Exception as e:
+            # Skip fields that can't be created
+            continue
+        if form_field is not None:
+            attrs[f'custom_{field.name}'] = form_field
+    return type(form_class.__name__, (form_class,), attrs)
+
+
+class AfterTradeEntryForm(CustomFieldsFormMixin, forms.ModelForm):
+    """Dynamic form - only shows system fields + user-defined custom fields (build it with for_user)"""
+    journal_type = 'after_trade'
+    
     class Meta:
         model = AfterTradeEntry
         # System fields only: pair, date, outcome (direction), chart_image (screenshot), observations (notes)
@@ -41,7 +113,6 @@ class AfterTradeEntryForm(forms.ModelForm):
         }
 
     def __init__(self, *args, **kwargs):
-        user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         
         # System fields setup
@@ -54,48 +125,12 @@ class AfterTradeEntryForm(forms.ModelForm):
         )
         self.fields['outcome'].choices = get_outcome_choices()
         self.fields['outcome'].label = 'Direction/Outcome'
-        
-        # Add dynamic custom fields if user is provided
-        if user:
-            try:
-                custom_fields = get_user_journal_fields(user, 'after_trade')
-                for field in custom_fields:
-                    try:
-                        form_field = create_dynamic_form_field(field)
-                        if form_field is None:
-                            continue
-                        # Set initial value if editing existing entry
-                        if self.instance and self.instance.pk:
-                            try:
-                                value_obj = get_field_value_for_entry(self.instance, field)
-                                if value_obj:
-                                    if field.field_type == 'checkbox':
-                                        form_field.initial = value_obj.value_boolean
-                                    elif field.field_type in ['number', 'decimal']:
-                                        form_field.initial = value_obj.value_number
-                                    elif field.field_type == 'date':
-                                        form_field.initial = value_obj.value_date
-                                    elif field.field_type == 'datetime':
-                                        form_field.initial = value_obj.value_datetime
-                                    elif field.field_type == 'multiselect':
-                                        # Multi-select stored as comma-separated
-                                        form_field.initial = value_obj.value_text.split(',') if value_obj.value_text else []
-                                    else:
-                                        form_field.initial = value_obj.value_text
-                            except Exception as e:
-                                # Skip if we can't get the value
-                                pass
-                        self.fields[f'custom_{field.name}'] = form_field
-                    except Exception as e:
-                        # Skip fields that can't be created
-                        continue
-            except Exception as e:
-                # If we can't get custom fields, continue without them
-                pass
 
 
-class PreTradeEntryForm(forms.ModelForm):
-    """Dynamic form - only shows system fields + user-defined custom fields"""
+class PreTradeEntryForm(CustomFieldsFormMixin, forms.ModelForm):
+    """Dynamic form - only shows system fields + user-defined custom fields (build it with for_user)"""
+    journal_type = 'pre_trade'
+    
     class Meta:
         model = PreTradeEntry
         # System fields only: pair, date, bias (direction), setup_image (screenshot), notes
@@ -112,7 +147,6 @@ class PreTradeEntryForm(forms.ModelForm):
         }
 
     def __init__(self, *args, **kwargs):
-        user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         
         # System fields setup
@@ -125,48 +159,12 @@ class PreTradeEntryForm(forms.ModelForm):
         )
         self.fields['bias'].choices = get_bias_choices()
         self.fields['bias'].label = 'Direction/Bias'
-        
-        # Add dynamic custom fields if user is provided
-        if user:
-            try:
-                custom_fields = get_user_journal_fields(user, 'pre_trade')
-                for field in custom_fields:
-                    try:
-                        form_field = create_dynamic_form_field(field)
-                        if form_field is None:
-                            continue
-                        # Set initial value if editing existing entry
-                        if self.instance and self.instance.pk:
-                            try:
-                                value_obj = get_field_value_for_entry(self.instance, field)
-                                if value_obj:
-                                    if field.field_type == 'checkbox':
-                                        form_field.initial = value_obj.value_boolean
-                                    elif field.field_type in ['number', 'decimal']:
-                                        form_field.initial = value_obj.value_number
-                                    elif field.field_type == 'date':
-                                        form_field.initial = value_obj.value_date
-                                    elif field.field_type == 'datetime':
-                                        form_field.initial = value_obj.value_datetime
-                                    elif field.field_type == 'multiselect':
-                                        # Multi-select stored as comma-separated
-                                        form_field.initial = value_obj.value_text.split(',') if value_obj.value_text else []
-                                    else:
-                                        form_field.initial = value_obj.value_text
-                            except Exception as e:
-                                # Skip if we can't get the value
-                                pass
-                        self.fields[f'custom_{field.name}'] = form_field
-                    except Exception as e:
-                        # Skip fields that can't be created
-                        continue
-            except Exception as e:
-                # If we can't get custom fields, continue without them
-                pass
 
 
-class BacktestEntryForm(forms.ModelForm):
-    """Dynamic form - only shows system fields + user-defined custom fields"""
+class BacktestEntryForm(CustomFieldsFormMixin, forms.ModelForm):
+    """Dynamic form - only shows system fields + user-defined custom fields (build it with for_user)"""
+    journal_type = 'backtest'
+    
     class Meta:
         model = BacktestEntry
         # System fields only: pair, date, htf_bias (direction), screenshot, notes
@@ -183,7 +181,6 @@ class BacktestEntryForm(forms.ModelForm):
         }
 
     def __init__(self, *args, **kwargs):
-        user = kwargs.pop('user', None)
         super().__init__(*args, **kwargs)
         
         # System fields setup
@@ -196,44 +193,6 @@ class BacktestEntryForm(forms.ModelForm):
         )
         self.fields['htf_bias'].choices = get_bias_choices()
         self.fields['htf_bias'].label = 'Direction/Bias'
-        
-        # Add dynamic custom fields if user is provided
-        if user:
-            try:
-                custom_fields = get_user_journal_fields(user, 'backtest')
-                for field in custom_fields:
-                    try:
-                        form_field = create_dynamic_form_field(field)
-                        if form_field is None:
-                            continue
-                        # Set initial value if editing existing entry
-                        if self.instance and self.instance.pk:
-                            try:
-                                value_obj = get_field_value_for_entry(self.instance, field)
-                                if value_obj:
-                                    if field.field_type == 'checkbox':
-                                        form_field.initial = value_obj.value_boolean
-                                    elif field.field_type in ['number', 'decimal']:
-                                        form_field.initial = value_obj.value_number
-                                    elif field.field_type == 'date':
-                                        form_field.initial = value_obj.value_date
-                                    elif field.field_type == 'datetime':
-                                        form_field.initial = value_obj.value_datetime
-                                    elif field.field_type == 'multiselect':
-                                        # Multi-select stored as comma-separated
-                                        form_field.initial = value_obj.value_text.split(',') if value_obj.value_text else []
-                                    else:
-                                        form_field.initial = value_obj.value_text
-                            except Exception as e:
-                                # Skip if we can't get the value
-                                pass
-                        self.fields[f'custom_{field.name}'] = form_field
-                    except Exception as e:
-                        # Skip fields that can't be created
-                        continue
-            except Exception as e:
-                # If we can't get custom fields, continue without them
-                pass
 
 
 class LotSizeCalculatorForm(forms.Form):
@@ -267,18 +226,14 @@ class LotSizeCalculatorForm(forms.Form):
         widget=forms.NumberInput(attrs={'class': 'form-control', 'step': '0.01', 'id': 'stop_loss_pips'}),
         help_text='Stop loss in pips/points'
     )
+    # Callable choices: the precomputed tuple from the instrument index is
+    # neither rebuilt nor deep-copied when the form is constructed
     instrument = forms.ChoiceField(
-        choices=[],
+        choices=get_instrument_choices,
         widget=forms.Select(attrs={'class': 'form-select', 'id': 'instrument_select'}),
         help_text='Trading instrument'
     )
     
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # Get instruments from instrument_data
-        from .instrument_data import get_instrument_choices
-        self.fields['instrument'].choices = get_instrument_choices()
-    
     def calculate_lot_size(self):
         """
         Calculate lot size using the standard formula:
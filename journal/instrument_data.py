@@ -1,7 +1,16 @@
 """
 Instrument data for lot size calculator
 Contains pip/point values for all trading instruments
+
+INSTRUMENTS is loaded once into INSTRUMENT_INDEX, an immutable index with
+the sorted codes, a name-token prefix map, the form choices and the JSON the
+calculator page embeds, so neither rendering the form nor searching walks
+or re-sorts the table.
 """
+import json
+import re
+from bisect import bisect_left
+from types import MappingProxyType
 
 # Instrument data - pip values are in USD per standard lot
 INSTRUMENTS = {
@@ -65,14 +74,82 @@ INSTRUMENTS = {
 }
 
 
+class InstrumentIndex:
+    """Read-only lookup structures over an instrument table"""
+
+    def __init__(self, instruments):
+        self.instruments = MappingProxyType({
+            code: MappingProxyType(dict(data)) for code, data in instruments.items()
+        })
+        self.codes = tuple(sorted(self.instruments))
+        self.types = tuple(sorted({data['type'] for data in self.instruments.values()}))
+        by_name = sorted(self.instruments.items(), key=lambda item: item[1]['name'])
+        self.choices = tuple((code, data['name']) for code, data in by_name)
+        self.choices_by_type = MappingProxyType({
+            instrument_type: tuple((code, data['name']) for code, data in by_name if data['type'] == instrument_type)
+            for instrument_type in self.types
+        })
+        # Position of each code in name order, to list search results like the choices
+        self.name_order = MappingProxyType({code: position for position, (code, _) in enumerate(self.choices)})
+        # Sorted (token, code) pairs: every word of the name, and the code itself
+        self.tokens = tuple(sorted({
+            (token, code)
+            for code, data in self.instruments.items()
+            for token in (code, *self.name_tokens(data['name']))
+        }))
+        self.token_keys = tuple(token for token, _ in self.tokens)
+        self.json = json.dumps(instruments)
+
+    @staticmethod
+    def name_tokens(name):
+        return re.findall(r'[A-Z0-9&]+', name.upper())
+
+    def get(self, code):
+        return self.instruments.get(code.upper())
+
+    def prefixed(self, prefix):
+        """Codes with a name token (or code) starting with prefix"""
+        found = set()
+        for index in range(bisect_left(self.token_keys, prefix), len(self.tokens)):
+            token, code = self.tokens[index]
+            if not token.startswith(prefix):
+                break
+            found.add(code)
+        return found
+
+    def search(self, query, types=None, limit=None):
+        """
+        Codes of instruments matching every word of query by code or name
+        word prefix (types narrows by instrument type): exact code first,
+        then codes starting with the query, then the rest, each in name order
+        """
+        words = self.name_tokens(query)
+        if words:
+            matches = self.prefixed(words[0])
+            for word in words[1:]:
+                matches &= self.prefixed(word)
+        else:
+            matches = set(self.codes)
+        if types:
+            matches = {code for code in matches if self.instruments[code]['type'] in types}
+        compact = ''.join(words)
+        ranked = sorted(matches, key=lambda code: (
+            code != compact, not code.startswith(compact), self.name_order[code]
+        ))
+        return ranked[:limit] if limit else ranked
+
+
+INSTRUMENT_INDEX = InstrumentIndex(INSTRUMENTS)
+
+
 def get_instrument_choices():
     """Get list of tuples for form choices"""
-    return [(code, data['name']) for code, data in sorted(INSTRUMENTS.items(), key=lambda x: x[1]['name'])]
+    return INSTRUMENT_INDEX.choices
 
 
 def get_instrument_data(instrument_code):
     """Get instrument data by code"""
-    return INSTRUMENTS.get(instrument_code.upper())
+    return INSTRUMENT_INDEX.get(instrument_code)
 
 
 def get_pip_value(instrument_code):
@@ -83,16 +160,16 @@ def get_pip_value(instrument_code):
     return 10.00  # Default for unknown instruments
 
 
-def search_instruments(query):
-    """Search instruments by code or name"""
-    query = query.upper().strip()
+def search_instruments(query, types=None, limit=None):
+    """Search instruments by code or name (word prefixes), optionally of some types only"""
     results = []
-    for code, data in INSTRUMENTS.items():
-        if query in code or query in data['name'].upper():
-            results.append({
-                'code': code,
-                'name': data['name'],
-                'type': data['type']
-            })
+    for code in INSTRUMENT_INDEX.search(query, types, limit):
+        data = INSTRUMENT_INDEX.instruments[code]
+        results.append({
+            'code': code,
+            'name': data['name'],
+            'type': data['type'],
+            'pip_value': data['pip_value'],
+            'pip_decimal': data['pip_decimal'],
+        })
     return results
-
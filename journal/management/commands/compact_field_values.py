@@ -0,0 +1,66 @@
+"""
+Management command to remove JournalFieldValue rows whose journal entry no longer exists
+Run: python manage.py compact_field_values [--check] [--chunk-size 1000] [--no-vacuum]
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef
+
+from journal.models import JournalFieldValue
+from journal.query_engine import JOURNAL_CONFIGS
+
+
+class Command(BaseCommand):
+    help = 'Delete orphaned custom field values in chunks, then VACUUM/ANALYZE the table where the backend supports it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only count orphans, do not delete anything')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Rows deleted per batch')
+        parser.add_argument('--no-vacuum', action='store_true', help='Skip VACUUM/ANALYZE after deleting')
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+        reclaimed = 0
+        for journal_type, config in JOURNAL_CONFIGS.items():
+            orphans = JournalFieldValue.objects.filter(entry_type=journal_type).exclude(
+                Exists(config.model.objects.filter(pk=OuterRef('entry_id')))
+            ).order_by('pk')
+
+            if options['check']:
+                count = orphans.count()
+                style = self.style.WARNING if count else self.style.SUCCESS
+                self.stdout.write(style(f'{journal_type}: {count} orphaned field values'))
+                continue
+
+            deleted = 0
+            while True:
+                pks = list(orphans.values_list('pk', flat=True)[:chunk_size])
+                if not pks:
+                    break
+                with transaction.atomic():
+                    deleted += JournalFieldValue.purge(JournalFieldValue.objects.filter(pk__in=pks))
+            reclaimed += deleted
+            self.stdout.write(self.style.SUCCESS(f'{journal_type}: removed {deleted} orphaned field values'))
+
+        if options['check']:
+            return
+        self.stdout.write(self.style.SUCCESS(f'Reclaimed {reclaimed} rows'))
+        if reclaimed and not options['no_vacuum']:
+            self._vacuum()
+
+    def _vacuum(self):
+        """Give the freed pages back and refresh planner statistics (outside any transaction)"""
+        table = JournalFieldValue._meta.db_table
+        if connection.vendor == 'postgresql':
+            statement = f'VACUUM (ANALYZE) {connection.ops.quote_name(table)}'
+        elif connection.vendor == 'sqlite':
+            # SQLite can only vacuum the whole database file
+            statement = 'VACUUM'
+        else:
+            self.stdout.write(f'VACUUM is not supported on {connection.vendor}, skipped')
+            return
+        with connection.cursor() as cursor:
+            cursor.execute(statement)
+            if connection.vendor == 'sqlite':
+                cursor.execute(f'ANALYZE {connection.ops.quote_name(table)}')
+        self.stdout.write(self.style.SUCCESS(f'Ran {statement} on {connection.vendor}'))
@@ -0,0 +1,66 @@
+"""
+Management command to rebuild the custom_data projection of journal entries from JournalFieldValue
+Run: python manage.py rebuild_custom_data [--check] [--user 1] [--chunk-size 500]
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from journal.models import JournalFieldValue
+from journal.query_engine import JOURNAL_CONFIGS
+from journal.search import refresh_search_documents
+from journal.utils import build_custom_data
+
+
+class Command(BaseCommand):
+    help = 'Re-sync the custom_data column of journal entries with their JournalFieldValue rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, do not write anything')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Entries per batch')
+        parser.add_argument('--user', type=int, dest='user_id', help='Only process this user id')
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+        for journal_type, config in JOURNAL_CONFIGS.items():
+            entries = config.model.objects.order_by('pk')
+            if options['user_id']:
+                entries = entries.filter(user_id=options['user_id'])
+
+            total = drifted = 0
+            last_pk = 0
+            while True:
+                chunk = list(entries.filter(pk__gt=last_pk).only('pk', 'custom_data')[:chunk_size])
+                if not chunk:
+                    break
+                last_pk = chunk[-1].pk
+                total += len(chunk)
+                stale = self._drifted_entries(journal_type, chunk)
+                drifted += len(stale)
+                if stale and not options['check']:
+                    with transaction.atomic():
+                        config.model.objects.bulk_update(stale, ['custom_data'], batch_size=chunk_size)
+                        refresh_search_documents(journal_type, config.model.objects.filter(pk__in=[e.pk for e in stale]))
+
+            if options['check']:
+                style = self.style.WARNING if drifted else self.style.SUCCESS
+                self.stdout.write(style(f'{journal_type}: {drifted} of {total} entries have drifted custom data'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{journal_type}: rebuilt custom data for {drifted} of {total} entries'))
+
+    @staticmethod
+    def _drifted_entries(journal_type, entries):
+        """Entries whose stored custom_data differs from their values; custom_data is set to the expected one"""
+        values_by_entry = {}
+        values = JournalFieldValue.objects.filter(
+            entry_type=journal_type, entry_id__in=[entry.pk for entry in entries]
+        ).select_related('field').order_by()
+        for value_obj in values:
+            values_by_entry.setdefault(value_obj.entry_id, []).append(value_obj)
+
+        stale = []
+        for entry in entries:
+            expected = build_custom_data(values_by_entry.get(entry.pk, []))
+            if entry.custom_data != expected:
+                entry.custom_data = expected
+                stale.append(entry)
+        return stale
@@ -0,0 +1,84 @@
+"""
+Management command to rebuild the search documents of journal entries
+Run: python manage.py rebuild_search_documents [--check] [--user 1] [--chunk-size 500]
+"""
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from journal.models import SearchDocument, SearchTrigram
+from journal.search import (
+    SEARCH_SOURCES, build_search_documents, get_search_backend, save_search_documents,
+)
+
+
+# Document fields compared to tell a stale document from a current one
+COMPARED_FIELDS = ['user_id', 'date', 'pair', 'body', 'custom_text']
+
+
+class Command(BaseCommand):
+    help = 'Re-sync the SearchDocument rows used by search with the journal entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, do not write anything')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Entries per batch')
+        parser.add_argument('--user', type=int, dest='user_id', help='Only process this user id')
+
+    def handle(self, *args, **options):
+        chunk_size = max(options['chunk_size'], 1)
+        for journal_type, source in SEARCH_SOURCES.items():
+            entries = source.model.objects.order_by('pk')
+            documents = SearchDocument.objects.filter(entry_type=journal_type)
+            if options['user_id']:
+                entries = entries.filter(user_id=options['user_id'])
+                documents = documents.filter(user_id=options['user_id'])
+
+            total = drifted = 0
+            last_pk = 0
+            while True:
+                chunk = list(entries.filter(pk__gt=last_pk)[:chunk_size])
+                if not chunk:
+                    break
+                last_pk = chunk[-1].pk
+                total += len(chunk)
+                stale = self._stale_documents(journal_type, chunk)
+                drifted += len(stale)
+                if stale and not options['check']:
+                    with transaction.atomic():
+                        save_search_documents(stale)
+
+            orphans = documents.exclude(entry_id__in=source.model.objects.values('pk'))
+            if options['check']:
+                orphaned = orphans.count()
+                style = self.style.WARNING if drifted or orphaned else self.style.SUCCESS
+                self.stdout.write(style(
+                    f'{journal_type}: {drifted} of {total} entries have missing or stale search documents, '
+                    f'{orphaned} orphaned documents'
+                ))
+            else:
+                orphaned, _ = orphans.delete()
+                self.stdout.write(self.style.SUCCESS(
+                    f'{journal_type}: rebuilt {drifted} of {total} search documents, removed {orphaned} orphaned'
+                ))
+
+    @staticmethod
+    def _stale_documents(journal_type, entries):
+        """Expected documents of entries whose stored document is missing, differs or lacks trigrams"""
+        rows = SearchDocument.objects.filter(
+            entry_type=journal_type, entry_id__in=[entry.pk for entry in entries]
+        )
+        fields = list(COMPARED_FIELDS)
+        if get_search_backend().keeps_trigrams:
+            rows = rows.annotate(has_trigrams=Exists(SearchTrigram.objects.filter(document=OuterRef('pk'))))
+            fields.append('has_trigrams')
+        stored = {row['entry_id']: row for row in rows.values('entry_id', *fields)}
+        stale = []
+        for document in build_search_documents(journal_type, entries):
+            row = stored.get(document.entry_id)
+            if (
+                row is None
+                or any(getattr(document, name) != row[name] for name in COMPARED_FIELDS)
+                or row.get('has_trigrams') is False
+            ):
+                stale.append(document)
+        return stale
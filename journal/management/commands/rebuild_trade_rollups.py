@@ -0,0 +1,180 @@
+"""
+Management command to rebuild DailyTradeRollup rows and TradeStreak counters from after trade entries
+Run: python manage.py rebuild_trade_rollups [--check] [--workers 4] [--chunk-size 200]
+"""
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from itertools import groupby
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+from journal.models import AfterTradeEntry, DailyTradeRollup, TradeStreak
+
+
+CENT = Decimal('0.01')
+STREAK_FIELDS = [
+    'current_outcome', 'current_length', 'max_win_streak', 'max_loss_streak',
+    'last_date', 'last_time', 'last_entry_id',
+]
+
+
+class Command(BaseCommand):
+    help = 'Rebuild daily trade rollups and streaks in parallel chunks and report drift from the live entries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report drift, do not write anything')
+        parser.add_argument('--workers', type=int, default=4, help='Number of parallel chunk readers')
+        parser.add_argument('--chunk-size', type=int, default=200, help='Users per chunk')
+        parser.add_argument('--user', type=int, dest='user_id', help='Only process this user id')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['user_id']:
+            users = users.filter(pk=options['user_id'])
+        user_ids = list(users.values_list('pk', flat=True))
+        chunk_size = max(options['chunk_size'], 1)
+        chunks = [user_ids[i:i + chunk_size] for i in range(0, len(user_ids), chunk_size)]
+
+        drifted_users = 0
+        rows_written = 0
+        drifted_streaks = 0
+        with ThreadPoolExecutor(max_workers=max(options['workers'], 1)) as pool:
+            for expected, stored, expected_streaks, stored_streaks in pool.map(self._load_chunk, chunks):
+                drifted = self._drifted_users(expected, stored)
+                drifted_users += len(drifted)
+                if drifted and not options['check']:
+                    rows_written += self._replace_rows(drifted, expected)
+
+                drifted = self._drifted_streaks(expected_streaks, stored_streaks)
+                drifted_streaks += len(drifted)
+                if drifted and not options['check']:
+                    self._replace_streaks(drifted, expected_streaks)
+
+        if options['check']:
+            style = self.style.WARNING if drifted_users or drifted_streaks else self.style.SUCCESS
+            self.stdout.write(style(f'{drifted_users} of {len(user_ids)} users have drifted rollups'))
+            self.stdout.write(style(f'{drifted_streaks} of {len(user_ids)} users have drifted streaks'))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Rebuilt rollups for {drifted_users} of {len(user_ids)} users ({rows_written} rows written)'
+                )
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f'Rebuilt streaks for {drifted_streaks} of {len(user_ids)} users')
+            )
+
+    def _load_chunk(self, user_ids):
+        """Read the expected and stored rollups and streaks for a chunk of users (runs in a worker thread)"""
+        try:
+            return (
+                self._expected_rows(user_ids), self._stored_rows(user_ids),
+                self._expected_streaks(user_ids), self._stored_streaks(user_ids),
+            )
+        finally:
+            connections.close_all()
+
+    @staticmethod
+    def _expected_rows(user_ids):
+        decimal_zero = Value(Decimal('0'), output_field=DecimalField())
+        rows = AfterTradeEntry.objects.filter(user_id__in=user_ids).order_by().annotate(
+            session_key=Coalesce('session', Value(''))
+        ).values('user_id', 'date', 'pair', 'session_key').annotate(
+            trades=Count('id'),
+            wins=Count('id', filter=Q(outcome='win')),
+            losses=Count('id', filter=Q(outcome='loss')),
+            rr_count=Count('rr_ratio'),
+            sum_rr=Coalesce(Sum('rr_ratio'), decimal_zero),
+            sum_risk_pips=Coalesce(Sum('risk_pips'), decimal_zero),
+            sum_reward_pips=Coalesce(Sum('reward_pips'), decimal_zero),
+            trending_up_count=Count('id', filter=Q(market_condition='Trending Up')),
+            trending_down_count=Count('id', filter=Q(market_condition='Trending Down')),
+            consolidating_count=Count('id', filter=Q(market_condition='Consolidating')),
+        )
+        return {
+            (row['user_id'], row['date'], row['pair'], row['session_key']): _counters(row)
+            for row in rows
+        }
+
+    @staticmethod
+    def _stored_rows(user_ids):
+        rows = DailyTradeRollup.objects.filter(user_id__in=user_ids).values(
+            'user_id', 'date', 'pair', 'session', *DailyTradeRollup.COUNTER_FIELDS
+        )
+        return {
+            (row['user_id'], row['date'], row['pair'], row['session']): _counters(row)
+            for row in rows
+        }
+
+    @staticmethod
+    def _expected_streaks(user_ids):
+        rows = AfterTradeEntry.objects.filter(user_id__in=user_ids).order_by(
+            'user_id', *TradeStreak.ENTRY_ORDERING
+        ).values_list('user_id', 'outcome', 'date', 'time_of_entry', 'id')
+        streaks = {}
+        for user_id, user_rows in groupby(rows.iterator(), key=lambda row: row[0]):
+            streaks[user_id] = TradeStreak.build(user_id, (row[1:] for row in user_rows))
+        return streaks
+
+    @staticmethod
+    def _stored_streaks(user_ids):
+        return {
+            streak.user_id: streak
+            for streak in TradeStreak.objects.filter(user_id__in=user_ids)
+        }
+
+    @staticmethod
+    def _drifted_streaks(expected, stored):
+        def counters(streak):
+            return tuple(getattr(streak, name) for name in STREAK_FIELDS) if streak else None
+        return {
+            user_id for user_id in set(expected) | set(stored)
+            if counters(expected.get(user_id)) != counters(stored.get(user_id))
+        }
+
+    @staticmethod
+    def _replace_streaks(user_ids, expected):
+        with transaction.atomic():
+            TradeStreak.objects.filter(user_id__in=user_ids).delete()
+            TradeStreak.objects.bulk_create(
+                [expected[user_id] for user_id in user_ids if user_id in expected],
+                batch_size=500
+            )
+
+    @staticmethod
+    def _drifted_users(expected, stored):
+        drifted = set()
+        for key in set(expected) | set(stored):
+            if expected.get(key) != stored.get(key):
+                drifted.add(key[0])
+        return drifted
+
+    @staticmethod
+    def _replace_rows(user_ids, expected):
+        new_rows = [
+            DailyTradeRollup(
+                user_id=user_id, date=date, pair=pair, session=session,
+                **dict(zip(DailyTradeRollup.COUNTER_FIELDS, counters))
+            )
+            for (user_id, date, pair, session), counters in expected.items()
+            if user_id in user_ids
+        ]
+        with transaction.atomic():
+            DailyTradeRollup.objects.filter(user_id__in=user_ids).delete()
+            DailyTradeRollup.objects.bulk_create(new_rows, batch_size=500)
+        return len(new_rows)
+
+
+def _counters(row):
+    """Comparable tuple of a rollup row's counters, in COUNTER_FIELDS order"""
+    values = []
+    for name in DailyTradeRollup.COUNTER_FIELDS:
+        value = row[name]
+        if isinstance(value, Decimal):
+            value = value.quantize(CENT)
+        values.append(value)
+    return tuple(values)
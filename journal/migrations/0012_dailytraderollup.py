@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:01
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, Q, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_rollups(apps, schema_editor):
+    """Build the rollup rows of existing after trade entries; later writes keep them in sync"""
+    AfterTradeEntry = apps.get_model('journal', 'AfterTradeEntry')
+    DailyTradeRollup = apps.get_model('journal', 'DailyTradeRollup')
+
+    decimal_zero = Value(Decimal('0'), output_field=DecimalField())
+    rows = AfterTradeEntry.objects.order_by().annotate(
+        session_key=Coalesce('session', Value(''))
+    ).values('user_id', 'date', 'pair', 'session_key').annotate(
+        trades=Count('id'),
+        wins=Count('id', filter=Q(outcome='win')),
+        losses=Count('id', filter=Q(outcome='loss')),
+        rr_count=Count('rr_ratio'),
+        sum_rr=Coalesce(Sum('rr_ratio'), decimal_zero),
+        sum_risk_pips=Coalesce(Sum('risk_pips'), decimal_zero),
+        sum_reward_pips=Coalesce(Sum('reward_pips'), decimal_zero),
+        trending_up_count=Count('id', filter=Q(market_condition='Trending Up')),
+        trending_down_count=Count('id', filter=Q(market_condition='Trending Down')),
+        consolidating_count=Count('id', filter=Q(market_condition='Consolidating')),
+    )
+    rollups = []
+    for row in rows.iterator(chunk_size=1000):
+        row['session'] = row.pop('session_key')
+        rollups.append(DailyTradeRollup(**row))
+        if len(rollups) >= 1000:
+            DailyTradeRollup.objects.bulk_create(rollups)
+            rollups = []
+    DailyTradeRollup.objects.bulk_create(rollups)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0011_make_after_trade_fields_optional'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTradeRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('pair', models.CharField(max_length=20)),
+                ('session', models.CharField(blank=True, default='', max_length=20)),
+                ('trades', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('losses', models.IntegerField(default=0)),
+                ('rr_count', models.IntegerField(default=0, help_text='Trades with an RR ratio')),
+                ('sum_rr', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sum_risk_pips', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('sum_reward_pips', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('trending_up_count', models.IntegerField(default=0)),
+                ('trending_down_count', models.IntegerField(default=0)),
+                ('consolidating_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_trade_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily Trade Rollups',
+                'ordering': ['-date', 'pair', 'session'],
+                'unique_together': {('user', 'date', 'pair', 'session')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:08
+
+from itertools import groupby
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_streaks(apps, schema_editor):
+    """Count the streaks of existing after trade entries, in TradeStreak.ENTRY_ORDERING"""
+    AfterTradeEntry = apps.get_model('journal', 'AfterTradeEntry')
+    TradeStreak = apps.get_model('journal', 'TradeStreak')
+
+    rows = AfterTradeEntry.objects.order_by(
+        'user_id', 'date', models.F('time_of_entry').asc(nulls_first=True), 'id'
+    ).values_list('user_id', 'outcome', 'date', 'time_of_entry', 'id')
+    streaks = []
+    for user_id, user_rows in groupby(rows.iterator(chunk_size=1000), key=lambda row: row[0]):
+        # Same counting as TradeStreak.push at the time of this migration
+        streak = TradeStreak(user_id=user_id)
+        for _, outcome, date, time, entry_id in user_rows:
+            if streak.current_length and outcome == streak.current_outcome:
+                streak.current_length += 1
+            else:
+                streak.current_outcome = outcome
+                streak.current_length = 1
+            if outcome == 'win':
+                streak.max_win_streak = max(streak.max_win_streak, streak.current_length)
+            else:
+                streak.max_loss_streak = max(streak.max_loss_streak, streak.current_length)
+            streak.last_date, streak.last_time, streak.last_entry_id = date, time, entry_id
+        streaks.append(streak)
+        if len(streaks) >= 1000:
+            TradeStreak.objects.bulk_create(streaks)
+            streaks = []
+    TradeStreak.objects.bulk_create(streaks)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('journal', '0013_userdataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TradeStreak',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trade_streak', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('current_outcome', models.CharField(blank=True, default='', max_length=10)),
+                ('current_length', models.PositiveIntegerField(default=0)),
+                ('max_win_streak', models.PositiveIntegerField(default=0)),
+                ('max_loss_streak', models.PositiveIntegerField(default=0)),
+                ('last_date', models.DateField(blank=True, null=True)),
+                ('last_time', models.TimeField(blank=True, null=True)),
+                ('last_entry_id', models.BigIntegerField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Trade Streak',
+                'verbose_name_plural': 'Trade Streaks',
+            },
+        ),
+        migrations.RunPython(backfill_streaks, migrations.RunPython.noop),
+    ]
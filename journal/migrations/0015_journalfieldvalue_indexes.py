@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0014_tradestreak'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='journalfieldvalue',
+            options={'verbose_name': 'Journal Field Value', 'verbose_name_plural': 'Journal Field Values'},
+        ),
+        migrations.AddIndex(
+            model_name='journalfieldvalue',
+            index=models.Index(fields=['field', 'value_number', 'entry_id'], name='fieldvalue_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalfieldvalue',
+            index=models.Index(fields=['field', 'value_date', 'entry_id'], name='fieldvalue_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalfieldvalue',
+            index=models.Index(fields=['field', 'value_boolean', 'entry_id'], name='fieldvalue_boolean_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalfieldvalue',
+            index=models.Index(fields=['field', 'entry_id'], name='fieldvalue_field_entry_idx'),
+        ),
+    ]
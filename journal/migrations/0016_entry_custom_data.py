@@ -0,0 +1,98 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:16
+
+from itertools import groupby
+
+from django.db import migrations, models
+
+
+ENTRY_TABLES = ['journal_aftertradeentry', 'journal_pretradeentry', 'journal_backtestentry']
+
+
+def create_gin_indexes(apps, schema_editor):
+    # GIN (jsonb_path_ops) serves containment lookups on custom_data; PostgreSQL only
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in ENTRY_TABLES:
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_custom_data_gin ON {table} USING gin (custom_data jsonb_path_ops)'
+        )
+
+
+def projected_value(value_obj):
+    # Same rules as JournalFieldValue.get_projected_value at the time of this migration
+    field_type = value_obj.field.field_type
+    if field_type == 'checkbox':
+        return bool(value_obj.value_boolean)
+    elif field_type in ['number', 'decimal']:
+        return float(value_obj.value_number) if value_obj.value_number is not None else None
+    elif field_type == 'date':
+        return value_obj.value_date.isoformat() if value_obj.value_date else None
+    elif field_type == 'datetime':
+        return value_obj.value_datetime.isoformat() if value_obj.value_datetime else None
+    return value_obj.value_text or None
+
+
+def backfill_custom_data(apps, schema_editor):
+    """Project the JournalFieldValues of existing entries into their custom_data"""
+    JournalFieldValue = apps.get_model('journal', 'JournalFieldValue')
+    models_by_type = {
+        'after_trade': apps.get_model('journal', 'AfterTradeEntry'),
+        'pre_trade': apps.get_model('journal', 'PreTradeEntry'),
+        'backtest': apps.get_model('journal', 'BacktestEntry'),
+    }
+
+    values = JournalFieldValue.objects.filter(entry_type__in=models_by_type).select_related('field').order_by(
+        'entry_type', 'entry_id'
+    )
+    pending = {entry_type: [] for entry_type in models_by_type}
+    for (entry_type, entry_id), entry_values in groupby(
+        values.iterator(chunk_size=1000), key=lambda value_obj: (value_obj.entry_type, value_obj.entry_id)
+    ):
+        custom_data = {}
+        for value_obj in entry_values:
+            projected = projected_value(value_obj)
+            if projected is not None:
+                custom_data[value_obj.field.name] = projected
+        if not custom_data:
+            continue
+        model = models_by_type[entry_type]
+        pending[entry_type].append(model(pk=entry_id, custom_data=custom_data))
+        if len(pending[entry_type]) >= 1000:
+            model.objects.bulk_update(pending[entry_type], ['custom_data'])
+            pending[entry_type] = []
+    for entry_type, entries in pending.items():
+        models_by_type[entry_type].objects.bulk_update(entries, ['custom_data'])
+
+
+def drop_gin_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in ENTRY_TABLES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_custom_data_gin')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0015_journalfieldvalue_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aftertradeentry',
+            name='custom_data',
+            field=models.JSONField(blank=True, default=dict, help_text='Custom field values keyed by field name, projected from JournalFieldValue'),
+        ),
+        migrations.AddField(
+            model_name='backtestentry',
+            name='custom_data',
+            field=models.JSONField(blank=True, default=dict, help_text='Custom field values keyed by field name, projected from JournalFieldValue'),
+        ),
+        migrations.AddField(
+            model_name='pretradeentry',
+            name='custom_data',
+            field=models.JSONField(blank=True, default=dict, help_text='Custom field values keyed by field name, projected from JournalFieldValue'),
+        ),
+        migrations.RunPython(create_gin_indexes, drop_gin_indexes),
+        migrations.RunPython(backfill_custom_data, migrations.RunPython.noop),
+    ]
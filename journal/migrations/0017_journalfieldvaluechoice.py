@@ -0,0 +1,69 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def split_choices(value_text):
+    # Same rules as JournalFieldValue.split_choices at the time of this migration
+    if not value_text:
+        return []
+    value_text = str(value_text).strip()
+    if value_text.startswith('[') and value_text.endswith(']'):
+        value_text = value_text[1:-1].replace("'", '').replace('"', '')
+    return [item.strip() for item in value_text.split(',') if item.strip()]
+
+
+def backfill_choices(apps, schema_editor):
+    """Link existing multi-select values to their options and normalize value_text to comma-separated"""
+    JournalFieldValue = apps.get_model('journal', 'JournalFieldValue')
+    JournalFieldOption = apps.get_model('journal', 'JournalFieldOption')
+    JournalFieldValueChoice = apps.get_model('journal', 'JournalFieldValueChoice')
+
+    option_ids = {
+        (field_id, value): pk
+        for pk, field_id, value in JournalFieldOption.objects.filter(
+            field__field_type='multiselect'
+        ).order_by().values_list('pk', 'field_id', 'value')
+    }
+    values = JournalFieldValue.objects.filter(field__field_type='multiselect').order_by('pk')
+    choices = []
+    for value_obj in values.iterator(chunk_size=1000):
+        selected = list(dict.fromkeys(split_choices(value_obj.value_text)))
+        normalized = ','.join(selected)
+        if normalized != value_obj.value_text:
+            JournalFieldValue.objects.filter(pk=value_obj.pk).update(value_text=normalized)
+        choices.extend(
+            JournalFieldValueChoice(value_id=value_obj.pk, option_id=option_ids[(value_obj.field_id, choice)])
+            for choice in selected
+            if (value_obj.field_id, choice) in option_ids
+        )
+        if len(choices) >= 1000:
+            JournalFieldValueChoice.objects.bulk_create(choices)
+            choices = []
+    JournalFieldValueChoice.objects.bulk_create(choices)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0016_entry_custom_data'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JournalFieldValueChoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('option', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='value_choices', to='journal.journalfieldoption')),
+                ('value', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='choices', to='journal.journalfieldvalue')),
+            ],
+            options={
+                'verbose_name': 'Journal Field Value Choice',
+                'verbose_name_plural': 'Journal Field Value Choices',
+                'indexes': [models.Index(fields=['option', 'value'], name='fieldvaluechoice_option_idx')],
+                'unique_together': {('value', 'option')},
+            },
+        ),
+        migrations.RunPython(backfill_choices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0017_journalfieldvaluechoice'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userdataversion',
+            name='schema_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:26
+
+from django.db import migrations, models
+from django.utils.dateparse import parse_time
+
+
+ENTRY_MODELS = {
+    'after_trade': 'AfterTradeEntry',
+    'pre_trade': 'PreTradeEntry',
+    'backtest': 'BacktestEntry',
+}
+
+
+def backfill_value_time(apps, schema_editor):
+    """
+    Parse the value_text of existing time field values into value_time and
+    re-project them into custom_data as value_time.isoformat(), like new saves
+    """
+    JournalFieldValue = apps.get_model('journal', 'JournalFieldValue')
+
+    values = JournalFieldValue.objects.filter(
+        field__field_type='time', entry_type__in=ENTRY_MODELS
+    ).exclude(value_text='').select_related('field').order_by('pk')
+    updated = []
+    for value_obj in values.iterator(chunk_size=1000):
+        try:
+            value_obj.value_time = parse_time(value_obj.value_text.strip())
+        except ValueError:
+            continue
+        if value_obj.value_time is not None:
+            updated.append(value_obj)
+        if len(updated) >= 1000:
+            save_chunk(apps, updated)
+            updated = []
+    save_chunk(apps, updated)
+
+
+def save_chunk(apps, value_objs):
+    JournalFieldValue = apps.get_model('journal', 'JournalFieldValue')
+    JournalFieldValue.objects.bulk_update(value_objs, ['value_time'])
+
+    projected = {}
+    for value_obj in value_objs:
+        projected.setdefault(value_obj.entry_type, {}).setdefault(value_obj.entry_id, {})[
+            value_obj.field.name
+        ] = value_obj.value_time.isoformat()
+    for entry_type, entry_values in projected.items():
+        model = apps.get_model('journal', ENTRY_MODELS[entry_type])
+        entries = list(model.objects.filter(pk__in=entry_values).only('pk', 'custom_data'))
+        for entry in entries:
+            entry.custom_data = {**(entry.custom_data or {}), **entry_values[entry.pk]}
+        model.objects.bulk_update(entries, ['custom_data'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0018_userdataversion_schema_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='journalfieldvalue',
+            name='value_time',
+            field=models.TimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='journalfieldvalue',
+            index=models.Index(fields=['field', 'value_time', 'entry_id'], name='fieldvalue_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='journalfieldvalue',
+            index=models.Index(fields=['field', 'value_datetime', 'entry_id'], name='fieldvalue_datetime_idx'),
+        ),
+        migrations.RunPython(backfill_value_time, migrations.RunPython.noop),
+    ]
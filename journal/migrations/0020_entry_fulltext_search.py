@@ -0,0 +1,17 @@
+from django.db import migrations
+
+
+# This migration used to build a full-text index over each entry table (FTS5
+# tables and triggers on SQLite, generated tsvector columns on PostgreSQL).
+# 0021_searchdocument replaced that with one index over the SearchDocument
+# table before either shipped, so it is kept empty to leave the migration
+# graph intact without adding and then dropping columns on the entry tables.
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0019_fieldvalue_value_time'),
+    ]
+
+    operations = []
@@ -0,0 +1,185 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:32
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+TABLE = 'journal_searchdocument'
+FTS_TABLE = 'journal_searchdocument_fts'
+# Document columns and their weight class
+COLUMNS = (('pair', 'A'), ('body', 'B'), ('custom_text', 'C'))
+# Entry columns concatenated into the document body per journal, as
+# journal.search.SEARCH_SOURCES had them at the time of this migration
+SEARCH_SOURCES = {
+    'after_trade': ('AfterTradeEntry', (
+        'observations', 'major_impact_news', 'ai_summary', 'outcome', 'session',
+    )),
+    'pre_trade': ('PreTradeEntry', (
+        'notes', 'reason_for_taking_or_not', 'htf_draws', 'lower_tf_confirmation', 'bias',
+    )),
+    'backtest': ('BacktestEntry', (
+        'notes', 'entry_trigger', 'behaviour_based_on_previous_moves', 'lower_tf_bos', 'high_impact_news',
+        'htf_bias', 'outcome',
+    )),
+}
+CUSTOM_TEXT_TYPES = ['text', 'textarea', 'select', 'multiselect', 'url', 'email']
+# Entry tables an unreleased version of 0020 indexed directly
+ENTRY_TABLES = ['journal_aftertradeentry', 'journal_pretradeentry', 'journal_backtestentry']
+
+
+def sqlite_statements():
+    names = [column for column, _ in COLUMNS]
+    column_list = ', '.join(names)
+    new_values = ', '.join(f'new.{name}' for name in names)
+    old_values = ', '.join(f'old.{name}' for name in names)
+    delete_old = f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f'INSERT INTO {FTS_TABLE}(rowid, {column_list}) VALUES (new.id, {new_values});'
+    return [
+        f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5({column_list}, content='{TABLE}', content_rowid='id')",
+        f'CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {TABLE} BEGIN {insert_new} END',
+        f'CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {TABLE} BEGIN {delete_old} END',
+        f'CREATE TRIGGER {FTS_TABLE}_update AFTER UPDATE OF {column_list} ON {TABLE} BEGIN {delete_old} {insert_new} END',
+    ]
+
+
+def postgresql_statements():
+    vector = ' || '.join(
+        f"setweight(to_tsvector('english'::regconfig, coalesce({column}, '')), '{weight}')"
+        for column, weight in COLUMNS
+    )
+    return [
+        f'ALTER TABLE {TABLE} ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED',
+        f'CREATE INDEX {TABLE}_search_idx ON {TABLE} USING GIN (search_vector)',
+    ]
+
+
+def pair_search_text(pair):
+    pair = (pair or '').strip()
+    if len(pair) == 6 and pair.isalpha():
+        return f'{pair} {pair[:3]} {pair[3:]}'
+    return pair
+
+
+def custom_search_text(custom_data, fields):
+    parts = []
+    for field in fields:
+        value = custom_data.get(field.name)
+        if field.field_type not in CUSTOM_TEXT_TYPES or not value:
+            continue
+        if field.field_type in ['select', 'multiselect']:
+            labels = {option.value: option.display_label for option in field.options.all()}
+            choices = [item.strip() for item in value.split(',') if item.strip()] if field.field_type == 'multiselect' else [value]
+            for choice in choices:
+                parts.append(choice)
+                if labels.get(choice, choice) != choice:
+                    parts.append(labels[choice])
+        else:
+            parts.append(str(value))
+    return '\n'.join(parts)
+
+
+def backfill_documents(apps, schema_editor):
+    """Build the search documents of existing entries, as journal.search.build_search_document did then"""
+    SearchDocument = apps.get_model('journal', 'SearchDocument')
+    JournalField = apps.get_model('journal', 'JournalField')
+
+    for journal_type, (model_name, text_fields) in SEARCH_SOURCES.items():
+        fields_by_user = {}
+        for field in JournalField.objects.filter(journal_type=journal_type, is_active=True).order_by(
+            'order', 'display_name'
+        ).prefetch_related('options'):
+            fields_by_user.setdefault(field.user_id, []).append(field)
+
+        entries = apps.get_model('journal', model_name).objects.order_by('pk')
+        documents = []
+        for entry in entries.iterator(chunk_size=1000):
+            texts = (getattr(entry, name) for name in text_fields)
+            documents.append(SearchDocument(
+                user_id=entry.user_id,
+                entry_type=journal_type,
+                entry_id=entry.pk,
+                date=entry.date,
+                pair=pair_search_text(entry.pair),
+                body='\n'.join(str(text) for text in texts if text),
+                custom_text=custom_search_text(entry.custom_data or {}, fields_by_user.get(entry.user_id, [])),
+            ))
+            if len(documents) >= 1000:
+                SearchDocument.objects.bulk_create(documents)
+                documents = []
+        SearchDocument.objects.bulk_create(documents)
+
+
+def drop_entry_indexes(schema_editor):
+    """Remove the FTS5 tables of local SQLite databases that applied the old 0020"""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in ENTRY_TABLES:
+        for suffix in ('insert', 'delete', 'update'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {table}_fts_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {table}_fts')
+
+
+def create_document_index(apps, schema_editor):
+    drop_entry_indexes(schema_editor)
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        with schema_editor.connection.cursor() as cursor:
+            try:
+                cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(body)')
+                cursor.execute('DROP TABLE temp.fts5_probe')
+            except Exception:
+                # SQLite built without FTS5: search falls back to icontains
+                return
+        statements = sqlite_statements()
+    elif vendor == 'postgresql':
+        statements = postgresql_statements()
+    else:
+        return
+    for sql in statements:
+        schema_editor.execute(sql)
+
+
+def drop_document_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        for suffix in ('insert', 'delete', 'update'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    elif vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {TABLE}_search_idx')
+        schema_editor.execute(f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0020_entry_fulltext_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('after_trade', 'After Trade'), ('pre_trade', 'Pre Trade'), ('backtest', 'Backtest')], max_length=20)),
+                ('entry_id', models.PositiveIntegerField()),
+                ('date', models.DateField()),
+                ('pair', models.CharField(blank=True, max_length=20)),
+                ('body', models.TextField(blank=True)),
+                ('custom_text', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Search Document',
+                'verbose_name_plural': 'Search Documents',
+                'indexes': [models.Index(fields=['user', 'entry_type', '-date'], name='searchdoc_user_type_date_idx')],
+                'unique_together': {('entry_type', 'entry_id')},
+            },
+        ),
+        migrations.RunPython(create_document_index, drop_document_index),
+        # After the index, so the FTS5 triggers index the backfilled rows
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,81 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:36
+
+import re
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def create_trigram_index(apps, schema_editor):
+    # PostgreSQL matches trigrams with pg_trgm instead of the SearchTrigram table
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX journal_searchdocument_trgm_idx ON journal_searchdocument '
+        "USING GIN ((pair || ' ' || body || ' ' || custom_text) gin_trgm_ops)"
+    )
+
+
+def trigrams(text):
+    # Same rules as journal.search.trigrams at the time of this migration
+    found = set()
+    for word in re.findall(r'\w+', text.lower()):
+        padded = f'  {word} '
+        found.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return found
+
+
+def backfill_trigrams(apps, schema_editor):
+    """Index the trigrams of existing search documents; PostgreSQL needs no rows"""
+    if schema_editor.connection.vendor == 'postgresql':
+        return
+    SearchDocument = apps.get_model('journal', 'SearchDocument')
+    SearchTrigram = apps.get_model('journal', 'SearchTrigram')
+
+    documents = SearchDocument.objects.order_by('pk').values_list('pk', 'user_id', 'pair', 'body', 'custom_text')
+    rows = []
+    for pk, user_id, *texts in documents.iterator(chunk_size=1000):
+        rows.extend(
+            SearchTrigram(document_id=pk, user_id=user_id, trigram=trigram)
+            for trigram in trigrams(' '.join(texts))
+        )
+        if len(rows) >= 1000:
+            SearchTrigram.objects.bulk_create(rows)
+            rows = []
+    SearchTrigram.objects.bulk_create(rows)
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS journal_searchdocument_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0021_searchdocument'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchTrigram',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigram', models.CharField(max_length=3)),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigrams', to='journal.searchdocument')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_trigrams', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Search Trigram',
+                'verbose_name_plural': 'Search Trigrams',
+                'indexes': [models.Index(fields=['user', 'trigram', 'document'], name='searchtrigram_user_idx')],
+                'unique_together': {('document', 'trigram')},
+            },
+        ),
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+        migrations.RunPython(backfill_trigrams, migrations.RunPython.noop),
+    ]
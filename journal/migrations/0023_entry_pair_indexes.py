@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('journal', '0022_searchtrigram'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aftertradeentry',
+            index=models.Index(fields=['user', 'pair', 'date'], name='aftertrade_user_pair_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='backtestentry',
+            index=models.Index(fields=['user', 'pair', 'date'], name='backtest_user_pair_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pretradeentry',
+            index=models.Index(fields=['user', 'pair', 'date'], name='pretrade_user_pair_idx'),
+        ),
+    ]
@@ -1,8 +1,10 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
+import datetime
 import os
 
 
@@ -165,12 +167,17 @@ class AfterTradeEntry(models.Model):
     # AI-generated summary
     ai_summary = models.TextField(blank=True, null=True, help_text='Auto-generated trade summary')
     summary_generated_at = models.DateTimeField(blank=True, null=True, editable=False)
+    custom_data = models.JSONField(default=dict, blank=True, help_text='Custom field values keyed by field name, projected from JournalFieldValue')
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-date', '-time_of_entry']
         verbose_name_plural = 'After Trade Entries'
+        indexes = [
+            # Exact pair lookups of the search box's pair: qualifier
+            models.Index(fields=['user', 'pair', 'date'], name='aftertrade_user_pair_idx'),
+        ]
 
     def __str__(self):
         return f"{self.pair} - {self.date} - {self.outcome}"
@@ -180,7 +187,9 @@ class AfterTradeEntry(models.Model):
         self.is_win = (self.outcome == 'win')
         if self.risk_pips and self.reward_pips and self.risk_pips > 0:
             self.rr_ratio = self.reward_pips / self.risk_pips
-        super().save(*args, **kwargs)
+        # Rollup signal handlers run inside this transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 class PreTradeEntry(models.Model):
@@ -202,12 +211,17 @@ class PreTradeEntry(models.Model):
     reason_for_taking_or_not = models.TextField()
     outcome_image = models.ImageField(upload_to=get_pre_trade_outcome_upload_path, blank=True, null=True)
     notes = models.TextField(blank=True)
+    custom_data = models.JSONField(default=dict, blank=True, help_text='Custom field values keyed by field name, projected from JournalFieldValue')
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-date', '-created_at']
         verbose_name_plural = 'Pre Trade Entries'
+        indexes = [
+            # Exact pair lookups of the search box's pair: qualifier
+            models.Index(fields=['user', 'pair', 'date'], name='pretrade_user_pair_idx'),
+        ]
 
     def __str__(self):
         return f"{self.pair} - {self.date}"
@@ -238,12 +252,17 @@ class BacktestEntry(models.Model):
     notes = models.TextField(blank=True)
     chasing_long_on = models.BooleanField(default=False)
     overnight = models.BooleanField(default=False)
+    custom_data = models.JSONField(default=dict, blank=True, help_text='Custom field values keyed by field name, projected from JournalFieldValue')
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-date', '-created_at']
         verbose_name_plural = 'Backtest Entries'
+        indexes = [
+            # Exact pair lookups of the search box's pair: qualifier
+            models.Index(fields=['user', 'pair', 'date'], name='backtest_user_pair_idx'),
+        ]
 
     def __str__(self):
         return f"{self.pair} - {self.date} - {self.outcome}"
@@ -473,19 +492,46 @@ class JournalFieldValue(models.Model):
     value_number = models.DecimalField(max_digits=20, decimal_places=10, null=True, blank=True)
     value_boolean = models.BooleanField(null=True, blank=True)
     value_date = models.DateField(null=True, blank=True)
+    value_time = models.TimeField(null=True, blank=True)
     value_datetime = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        ordering = ['field__order', 'field__display_name']
+        # No default ordering: it joined JournalField into every value query.
+        # Callers that display values order them by their fields.
         unique_together = ['entry_type', 'entry_id', 'field']
         verbose_name = 'Journal Field Value'
         verbose_name_plural = 'Journal Field Values'
+        indexes = [
+            # Custom field filters: field + typed value, entry_id covers the IN (subquery)
+            models.Index(fields=['field', 'value_number', 'entry_id'], name='fieldvalue_number_idx'),
+            models.Index(fields=['field', 'value_date', 'entry_id'], name='fieldvalue_date_idx'),
+            models.Index(fields=['field', 'value_time', 'entry_id'], name='fieldvalue_time_idx'),
+            models.Index(fields=['field', 'value_datetime', 'entry_id'], name='fieldvalue_datetime_idx'),
+            models.Index(fields=['field', 'value_boolean', 'entry_id'], name='fieldvalue_boolean_idx'),
+            models.Index(fields=['field', 'entry_id'], name='fieldvalue_field_entry_idx'),
+        ]
     
     def __str__(self):
         return f"{self.field.display_name}: {self.get_value_display()}"
     
+    @classmethod
+    def purge(cls, queryset):
+        """
+        Delete the value rows of queryset and return how many went.
+        
+        A regular ORM delete, so multi-select choice rows cascade and delete
+        signals are sent; bump_version_for_field_value leaves such bulk deletes
+        alone and each affected user's data version is bumped once here.
+        """
+        queryset = queryset.order_by()
+        user_ids = list(queryset.values_list('field__user_id', flat=True).distinct())
+        _, deleted = queryset.delete()
+        for user_id in user_ids:
+            UserDataVersion.bump(user_id)
+        return deleted.get(cls._meta.label, 0)
+    
     def get_value_display(self):
         """Get the value formatted for display based on field type"""
         if self.field.field_type == 'checkbox':
@@ -494,6 +540,8 @@ class JournalFieldValue(models.Model):
             return str(self.value_number) if self.value_number is not None else ''
         elif self.field.field_type == 'date':
             return str(self.value_date) if self.value_date else ''
+        elif self.field.field_type == 'time':
+            return str(self.value_time) if self.value_time else ''
         elif self.field.field_type == 'datetime':
             return str(self.value_datetime) if self.value_datetime else ''
         elif self.field.field_type == 'multiselect':
@@ -502,6 +550,32 @@ class JournalFieldValue(models.Model):
         else:
             return self.value_text
     
+    def get_projected_value(self):
+        """JSON value stored for this field in the entry's custom_data, or None when empty"""
+        field_type = self.field.field_type
+        if field_type == 'checkbox':
+            return bool(self.value_boolean)
+        elif field_type in ['number', 'decimal']:
+            return float(self.value_number) if self.value_number is not None else None
+        elif field_type == 'date':
+            return self.value_date.isoformat() if self.value_date else None
+        elif field_type == 'time':
+            return self.value_time.isoformat() if self.value_time else None
+        elif field_type == 'datetime':
+            return self.value_datetime.isoformat() if self.value_datetime else None
+        return self.value_text or None
+    
+    @staticmethod
+    def display_projected_value(field_type, value):
+        """Format a custom_data value for display, like get_value_display"""
+        if value is None:
+            return ''
+        if field_type == 'checkbox':
+            return 'Yes' if value else 'No'
+        if field_type in ['number', 'decimal'] and isinstance(value, float) and value.is_integer():
+            return str(int(value))
+        return str(value)
+    
     def set_value(self, value):
         """Set the value based on field type"""
         if self.field.field_type == 'checkbox':
@@ -520,6 +594,13 @@ class JournalFieldValue(models.Model):
             else:
                 self.value_date = value
             self.value_text = str(value) if value else ''
+        elif self.field.field_type == 'time':
+            if isinstance(value, str):
+                from django.utils.dateparse import parse_time
+                self.value_time = parse_time(value)
+            else:
+                self.value_time = value
+            self.value_text = str(value) if value else ''
         elif self.field.field_type == 'datetime':
             if isinstance(value, str):
                 from django.utils.dateparse import parse_datetime
@@ -527,6 +608,381 @@ class JournalFieldValue(models.Model):
             else:
                 self.value_datetime = value
             self.value_text = str(value) if value else ''
+        elif self.field.field_type == 'multiselect':
+            # Stored comma-separated; the selected options are also linked through JournalFieldValueChoice
+            if isinstance(value, (list, tuple)):
+                self.value_text = ','.join(str(item) for item in value if item)
+            else:
+                self.value_text = ','.join(self.split_choices(value))
         else:
             self.value_text = str(value) if value else ''
+    
+    @staticmethod
+    def split_choices(value_text):
+        """Option values of a multi-select value_text (comma-separated, or a legacy list repr)"""
+        if not value_text:
+            return []
+        value_text = str(value_text).strip()
+        if value_text.startswith('[') and value_text.endswith(']'):
+            # Older rows stored str(list), e.g. "['fvg', 'ifvg']"
+            value_text = value_text[1:-1].replace("'", '').replace('"', '')
+        return [item.strip() for item in value_text.split(',') if item.strip()]
+
+
+class JournalFieldValueChoice(models.Model):
+    """One selected option of a multi-select JournalFieldValue, for indexed membership filters"""
+    value = models.ForeignKey(JournalFieldValue, on_delete=models.CASCADE, related_name='choices')
+    option = models.ForeignKey(JournalFieldOption, on_delete=models.CASCADE, related_name='value_choices')
+    
+    class Meta:
+        unique_together = ['value', 'option']
+        indexes = [
+            # "entries having option X": option first, value covers the join back
+            models.Index(fields=['option', 'value'], name='fieldvaluechoice_option_idx'),
+        ]
+        verbose_name = 'Journal Field Value Choice'
+        verbose_name_plural = 'Journal Field Value Choices'
+    
+    def __str__(self):
+        return f"{self.value_id}: {self.option_id}"
+    
+    @classmethod
+    def sync(cls, value_objs):
+        """Replace the choice rows of the multi-select values among value_objs with their current options"""
+        value_objs = [value_obj for value_obj in value_objs if value_obj.field.field_type == 'multiselect']
+        if not value_objs:
+            return
+        missing_pk = [value_obj for value_obj in value_objs if value_obj.pk is None]
+        if missing_pk:
+            # Backends that don't return ids from an upsert
+            rows = JournalFieldValue.objects.filter(
+                entry_type=missing_pk[0].entry_type,
+                entry_id__in={value_obj.entry_id for value_obj in missing_pk},
+                field__in={value_obj.field_id for value_obj in missing_pk},
+            ).values_list('entry_id', 'field_id', 'pk')
+            pks = {(entry_id, field_id): pk for entry_id, field_id, pk in rows}
+            for value_obj in missing_pk:
+                value_obj.pk = pks.get((value_obj.entry_id, value_obj.field_id))
+        
+        fields = {value_obj.field_id: value_obj.field for value_obj in value_objs}
+        if all('options' in getattr(field, '_prefetched_objects_cache', {}) for field in fields.values()):
+            # Fields from the cached schema (get_user_journal_fields) carry their options
+            options = [option for field in fields.values() for option in field.options.all()]
+        else:
+            options = JournalFieldOption.objects.filter(field__in=fields).order_by()
+        option_ids = {(option.field_id, option.value): option.pk for option in options}
+        # No savepoint of its own inside save_field_values_for_entry's transaction
+        with transaction.atomic(savepoint=False):
+            cls.objects.filter(value__in=[value_obj.pk for value_obj in value_objs]).delete()
+            cls.objects.bulk_create([
+                cls(value_id=value_obj.pk, option_id=option_ids[(value_obj.field_id, choice)])
+                for value_obj in value_objs
+                for choice in dict.fromkeys(JournalFieldValue.split_choices(value_obj.value_text))
+                if (value_obj.field_id, choice) in option_ids
+            ])
+
+
+
+# Aggregate Models
+class DailyTradeRollup(models.Model):
+    """Per-user daily aggregate of after trade entries, kept in sync on every write"""
+    # AfterTradeEntry fields that feed the rollup
+    SOURCE_FIELDS = [
+        'user_id', 'date', 'pair', 'session', 'outcome', 'market_condition',
+        'rr_ratio', 'risk_pips', 'reward_pips',
+    ]
+    CONDITION_COUNTERS = {
+        'Trending Up': 'trending_up_count',
+        'Trending Down': 'trending_down_count',
+        'Consolidating': 'consolidating_count',
+    }
+    COUNTER_FIELDS = [
+        'trades', 'wins', 'losses', 'rr_count', 'sum_rr', 'sum_risk_pips', 'sum_reward_pips',
+        'trending_up_count', 'trending_down_count', 'consolidating_count',
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_trade_rollups')
+    date = models.DateField()
+    pair = models.CharField(max_length=20)
+    session = models.CharField(max_length=20, blank=True, default='')
+    trades = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    losses = models.IntegerField(default=0)
+    rr_count = models.IntegerField(default=0, help_text='Trades with an RR ratio')
+    sum_rr = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sum_risk_pips = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    sum_reward_pips = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    trending_up_count = models.IntegerField(default=0)
+    trending_down_count = models.IntegerField(default=0)
+    consolidating_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-date', 'pair', 'session']
+        unique_together = ['user', 'date', 'pair', 'session']
+        verbose_name_plural = 'Daily Trade Rollups'
+
+    def __str__(self):
+        return f"{self.pair} - {self.date} - {self.trades} trades"
+
+    @classmethod
+    def contribution(cls, values):
+        """Counters a single trade adds to its rollup row, from a dict of SOURCE_FIELDS"""
+        delta = {name: 0 for name in cls.COUNTER_FIELDS}
+        delta['trades'] = 1
+        delta['wins'] = 1 if values['outcome'] == 'win' else 0
+        delta['losses'] = 1 if values['outcome'] == 'loss' else 0
+        if values['rr_ratio'] is not None:
+            delta['rr_count'] = 1
+            delta['sum_rr'] = cls._as_cents(values['rr_ratio'])
+        delta['sum_risk_pips'] = cls._as_cents(values['risk_pips'])
+        delta['sum_reward_pips'] = cls._as_cents(values['reward_pips'])
+        counter = cls.CONDITION_COUNTERS.get(values['market_condition'])
+        if counter:
+            delta[counter] = 1
+        return delta
+
+    @staticmethod
+    def _as_cents(value):
+        # Match what a 2-decimal-place column stores (rr_ratio is unrounded until saved)
+        return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+    @staticmethod
+    def rollup_key(values):
+        return (values['user_id'], values['date'], values['pair'], values['session'] or '')
+
+    @classmethod
+    def record_change(cls, old_values=None, new_values=None):
+        """
+        Apply the before/after delta of one trade write.
+
+        old_values is None for a create, new_values is None for a delete.
+        """
+        deltas = {}
+        for values, sign in ((old_values, -1), (new_values, 1)):
+            if not values:
+                continue
+            key = cls.rollup_key(values)
+            delta = deltas.setdefault(key, {name: 0 for name in cls.COUNTER_FIELDS})
+            for name, amount in cls.contribution(values).items():
+                delta[name] += sign * amount
+
+        for key, delta in deltas.items():
+            changes = {name: F(name) + amount for name, amount in delta.items() if amount}
+            if changes:
+                cls._apply_delta(key, changes)
+
+    @classmethod
+    def _apply_delta(cls, key, changes):
+        user_id, date, pair, session = key
+        rollup, _ = cls.objects.get_or_create(user_id=user_id, date=date, pair=pair, session=session)
+        cls.objects.filter(pk=rollup.pk).update(updated_at=timezone.now(), **changes)
+        # Drop rows whose last trade was moved or deleted
+        cls.objects.filter(pk=rollup.pk, trades__lte=0).delete()
+
+
+class UserDataVersion(models.Model):
+    """
+    Per-user counters used to key caches: version is bumped on every journal
+    data change, schema_version whenever the user's custom fields or their
+    options change.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='data_version')
+    version = models.PositiveBigIntegerField(default=0)
+    schema_version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'User Data Version'
+        verbose_name_plural = 'User Data Versions'
+
+    def __str__(self):
+        return f"{self.user_id} @ v{self.version}"
+
+    @classmethod
+    def get_version(cls, user_id):
+        return cls.objects.filter(user_id=user_id).values_list('version', flat=True).first() or 0
+
+    @classmethod
+    def get_schema_version(cls, user_id):
+        return cls.objects.filter(user_id=user_id).values_list('schema_version', flat=True).first() or 0
+
+    @classmethod
+    def bump(cls, user_id):
+        """Increment the user's version (creating the row on first write)"""
+        cls._increment(user_id, 'version')
+
+    @classmethod
+    def bump_schema(cls, user_id):
+        """Increment the user's schema version (creating the row on first write)"""
+        cls._increment(user_id, 'schema_version')
+
+    @classmethod
+    def _increment(cls, user_id, counter):
+        if not user_id:
+            return
+        changes = {counter: F(counter) + 1, 'updated_at': timezone.now()}
+        updated = cls.objects.filter(user_id=user_id).update(**changes)
+        if not updated:
+            version, created = cls.objects.get_or_create(user_id=user_id, defaults={counter: 1})
+            if not created:
+                cls.objects.filter(user_id=user_id).update(**changes)
+
+
+class TradeStreak(models.Model):
+    """
+    Per-user running and record win/loss streaks over after trade entries.
+
+    Appending a trade after the latest one updates the counters in place;
+    anything that reorders history (back-dated inserts, edits, deletes)
+    falls back to a recompute.
+    """
+    # Chronological order the streaks are counted in; entries without a time sort first within a day
+    ENTRY_ORDERING = [F('date').asc(), F('time_of_entry').asc(nulls_first=True), F('id').asc()]
+    # Fields whose change can alter the streaks of an existing entry
+    SOURCE_FIELDS = ['user_id', 'date', 'time_of_entry', 'outcome']
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='trade_streak')
+    current_outcome = models.CharField(max_length=10, blank=True, default='')
+    current_length = models.PositiveIntegerField(default=0)
+    max_win_streak = models.PositiveIntegerField(default=0)
+    max_loss_streak = models.PositiveIntegerField(default=0)
+    # Position of the latest counted trade, to tell appends from back-dated inserts
+    last_date = models.DateField(blank=True, null=True)
+    last_time = models.TimeField(blank=True, null=True)
+    last_entry_id = models.BigIntegerField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Trade Streak'
+        verbose_name_plural = 'Trade Streaks'
+
+    def __str__(self):
+        return f"{self.user_id}: {self.current_length} {self.current_outcome or '-'}"
+
+    @property
+    def streak_type(self):
+        """'win', 'loss' or '' for the current run"""
+        if not self.current_length:
+            return ''
+        return 'loss' if self.current_outcome == 'loss' else 'win'
+
+    @staticmethod
+    def sort_key(date, time, entry_id):
+        """Python equivalent of ENTRY_ORDERING"""
+        return (date, time is not None, time or datetime.time.min, entry_id)
+
+    def push(self, outcome, date, time, entry_id):
+        """Count one more trade at the end of the history"""
+        if self.current_length and outcome == self.current_outcome:
+            self.current_length += 1
+        else:
+            self.current_outcome = outcome
+            self.current_length = 1
+        if outcome == 'win':
+            self.max_win_streak = max(self.max_win_streak, self.current_length)
+        else:
+            self.max_loss_streak = max(self.max_loss_streak, self.current_length)
+        self.last_date, self.last_time, self.last_entry_id = date, time, entry_id
+
+    @classmethod
+    def for_user(cls, user_id):
+        """Stored streaks of a user, or an empty (unsaved) instance if they have no trades"""
+        return cls.objects.filter(user_id=user_id).first() or cls(user_id=user_id)
+
+    @staticmethod
+    def entry_values(entry):
+        """SOURCE_FIELDS of an entry instance, with not yet parsed date/time strings converted"""
+        return {
+            'user_id': entry.user_id,
+            'date': entry._meta.get_field('date').to_python(entry.date),
+            'time_of_entry': entry._meta.get_field('time_of_entry').to_python(entry.time_of_entry),
+            'outcome': entry.outcome,
+        }
+
+    @classmethod
+    def record_append(cls, entry):
+        """Update the counters for a newly created trade, recomputing if it was back-dated"""
+        values = cls.entry_values(entry)
+        streak, _ = cls.objects.select_for_update().get_or_create(user_id=values['user_id'])
+        if streak.last_entry_id is not None and (
+            cls.sort_key(values['date'], values['time_of_entry'], entry.pk)
+            < cls.sort_key(streak.last_date, streak.last_time, streak.last_entry_id)
+        ):
+            return cls.recompute(values['user_id'])
+        streak.push(values['outcome'], values['date'], values['time_of_entry'], entry.pk)
+        streak.save()
+        return streak
+
+    @classmethod
+    def build(cls, user_id, rows):
+        """Unsaved streak counters from (outcome, date, time_of_entry, id) rows in ENTRY_ORDERING"""
+        streak = cls(user_id=user_id)
+        for row in rows:
+            streak.push(*row)
+        return streak
+
+    @classmethod
+    def recompute(cls, user_id):
+        """Rebuild the counters from the user's full history"""
+        rows = AfterTradeEntry.objects.filter(user_id=user_id).order_by(*cls.ENTRY_ORDERING).values_list(
+            'outcome', 'date', 'time_of_entry', 'id'
+        )
+        streak = cls.build(user_id, rows.iterator())
+        if streak.last_entry_id is None:
+            cls.objects.filter(user_id=user_id).delete()
+            return streak
+        streak.save()
+        return streak
+
+
+class SearchDocument(models.Model):
+    """
+    Denormalized search text of one journal entry, across all three journals.
+
+    Full-text indexes (tsvector/GIN on PostgreSQL, FTS5 on SQLite) are built
+    over this table only; journal.search keeps the rows current on entry and
+    custom field value writes.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_documents')
+    entry_type = models.CharField(max_length=20, choices=JournalField.JOURNAL_TYPE_CHOICES)
+    entry_id = models.PositiveIntegerField()
+    date = models.DateField()
+    pair = models.CharField(max_length=20, blank=True)
+    # System text columns of the entry, most important first
+    body = models.TextField(blank=True)
+    # Text, select and multi-select custom field values (option labels included)
+    custom_text = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        unique_together = ['entry_type', 'entry_id']
+        indexes = [
+            models.Index(fields=['user', 'entry_type', '-date'], name='searchdoc_user_type_date_idx'),
+        ]
+        verbose_name = 'Search Document'
+        verbose_name_plural = 'Search Documents'
+
+    def __str__(self):
+        return f"{self.entry_type} #{self.entry_id}"
+
+
+class SearchTrigram(models.Model):
+    """
+    One trigram of the words of a search document, for fuzzy search on
+    databases without pg_trgm (PostgreSQL matches trigrams in its own index).
+    """
+    document = models.ForeignKey(SearchDocument, on_delete=models.CASCADE, related_name='trigrams')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='search_trigrams')
+    trigram = models.CharField(max_length=3)
+
+    class Meta:
+        unique_together = ['document', 'trigram']
+        indexes = [
+            models.Index(fields=['user', 'trigram', 'document'], name='searchtrigram_user_idx'),
+        ]
+        verbose_name = 'Search Trigram'
+        verbose_name_plural = 'Search Trigrams'
+
+    def __str__(self):
+        return f"{self.document_id}: {self.trigram!r}"
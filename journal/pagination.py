@@ -0,0 +1,164 @@
+"""
+Keyset (cursor) pagination for the journal list pages
+
+Instead of COUNT(*) + OFFSET, a page is fetched with a WHERE clause that
+continues after (or before) the sort key of the last row shown, so page 500
+costs the same as page 1. Totals come from a count cached per data version.
+"""
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    """One page of a CursorPaginator; iterable like a Django Page"""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset on a unique sort key.
+
+    keys is a list of (expression, descending) pairs; the last one must make
+    the ordering unique (normally the primary key). Expressions must not be
+    nullable - wrap nullable columns in Coalesce.
+    """
+
+    def __init__(self, queryset, keys, per_page, count=None):
+        self.keys = keys
+        self.per_page = per_page
+        self._count = count
+        self.queryset = queryset.annotate(**{
+            self._alias(index): expression for index, (expression, descending) in enumerate(keys)
+        })
+
+    @staticmethod
+    def _alias(index):
+        return f'cursor_key_{index}'
+
+    @property
+    def count(self):
+        """Total rows, from the count callable given to the paginator (None if there is none)"""
+        if callable(self._count):
+            self._count = self._count()
+        return self._count
+
+    def _ordering(self, reverse=False):
+        ordering = []
+        for index, (_, descending) in enumerate(self.keys):
+            if descending != reverse:
+                ordering.append(f'-{self._alias(index)}')
+            else:
+                ordering.append(self._alias(index))
+        return ordering
+
+    def _after(self, values, reverse=False):
+        """Rows strictly after values in the (possibly reversed) ordering"""
+        condition = Q()
+        for index, (_, descending) in enumerate(self.keys):
+            lookup = 'lt' if descending != reverse else 'gt'
+            step = Q(**{f'{self._alias(index)}__{lookup}': values[index]})
+            for previous in range(index):
+                step &= Q(**{self._alias(previous): values[previous]})
+            condition |= step
+        return condition
+
+    def encode_cursor(self, row, direction):
+        values = [getattr(row, self._alias(index)) for index in range(len(self.keys))]
+        payload = json.dumps([direction, values], cls=DjangoJSONEncoder, separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            direction, raw_values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if direction not in ('next', 'prev') or len(raw_values) != len(self.keys):
+                raise ValueError(cursor)
+            annotations = self.queryset.query.annotations
+            values = [
+                annotations[self._alias(index)].output_field.to_python(value)
+                for index, value in enumerate(raw_values)
+            ]
+        except Exception as e:
+            raise InvalidCursor(str(e)) from e
+        return direction, values
+
+    def page(self, cursor=None):
+        """The page after/before cursor, or the first page without one"""
+        if not cursor:
+            direction, values = 'next', None
+        else:
+            direction, values = self.decode_cursor(cursor)
+        reverse = direction == 'prev'
+
+        rows = self.queryset.order_by(*self._ordering(reverse))
+        if values is not None:
+            rows = rows.filter(self._after(values, reverse))
+        rows = list(rows[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+        if not rows:
+            return CursorPage(rows, self)
+
+        if reverse:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+        return CursorPage(
+            rows, self,
+            next_cursor=self.encode_cursor(rows[-1], 'next') if has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], 'prev') if has_previous else None,
+        )
+
+    def get_page(self, cursor=None):
+        """Like page(), but falls back to the first page for a malformed cursor"""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page()
+
+
+def cached_count(queryset, user_id, *key_parts):
+    """
+    COUNT(*) of queryset, cached until the user's journal data next changes.
+
+    key_parts identify the query (journal type, filters, ...).
+    """
+    from .models import UserDataVersion
+
+    version = UserDataVersion.get_version(user_id)
+    digest = hashlib.md5(json.dumps(key_parts, sort_keys=True, default=str).encode()).hexdigest()
+    cache_key = f'journal_list_count:{user_id}:{version}:{digest}'
+    return cache.get_or_set(cache_key, queryset.count, settings.JOURNAL_CACHE_TIMEOUT)
@@ -0,0 +1,628 @@
+"""
+Declarative query engine shared by the journal list views
+
+A list request is parsed into a JournalFilterSpec (system fields, custom
+fields, tags, date ranges, sort) which JournalQueryEngine compiles into a
+single queryset. Typed custom field conditions become IN (subquery)
+predicates read through the JournalFieldValue indexes, multi-select and tag
+conditions correlated EXISTS subqueries and the search box a subquery on the
+search documents, so no entry ids are ever pulled into Python and fed back
+as IN (...) lists.
+
+The search box also takes field qualifiers (parse_search_query):
+`pair:EUR/USD outcome:loss session:London tag:breakout rr>2
+date:2025-01..2025-03 cf.smt_confirmation:yes "stop hunt"`. Qualifiers
+compile to exact, range and subquery predicates on indexed columns; only the
+remaining words and quoted phrases go to the full-text index.
+"""
+import calendar
+import re
+from dataclasses import dataclass, field as dataclass_field
+from datetime import date, datetime, time
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Exists, F, OuterRef, Q, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime, parse_time
+
+from .models import AfterTradeEntry, PreTradeEntry, BacktestEntry, JournalFieldValue, JournalFieldValueChoice
+
+
+TRUE_VALUES = ['true', '1', 'yes']
+# Prefix of search qualifiers on custom fields (cf.<field name>:value)
+CUSTOM_QUALIFIER_PREFIX = 'cf.'
+# How several selected options of a multi-select filter combine (?custom_<name>_match=)
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+
+@dataclass(frozen=True)
+class QualifierTarget:
+    """The system field a search qualifier (key:value) filters"""
+    # 'pair', 'choice', 'number', 'date' or 'tag'
+    kind: str
+    field: str = ''
+    # ChoiceOption category whose labels a choice value may also be given as
+    category: str = ''
+
+
+# Qualifiers every journal has
+COMMON_QUALIFIERS = {
+    'pair': QualifierTarget('pair', 'pair'),
+    'date': QualifierTarget('date', 'date'),
+}
+
+
+@dataclass(frozen=True)
+class JournalConfig:
+    """What differs between the journal types as far as listing goes"""
+    model: type
+    # Request parameter of the journal's choice filter and the model field it filters
+    choice_param: str
+    choice_field: str
+    # Sort keys accepted in ?sort=<key>_<asc|desc> and the model fields they order by
+    sort_fields: dict
+    # Optional time of day column that orders entries within a date
+    time_field: str = None
+    has_tags: bool = False
+    # Search qualifier keys, besides COMMON_QUALIFIERS, and what they filter
+    qualifiers: dict = dataclass_field(default_factory=dict)
+
+
+JOURNAL_CONFIGS = {
+    'after_trade': JournalConfig(
+        model=AfterTradeEntry,
+        choice_param='outcome',
+        choice_field='outcome',
+        sort_fields={'date': 'date', 'pair': 'pair', 'outcome': 'outcome'},
+        time_field='time_of_entry',
+        has_tags=True,
+        qualifiers={
+            'outcome': QualifierTarget('choice', 'outcome', 'outcome'),
+            'session': QualifierTarget('choice', 'session', 'session'),
+            'bias': QualifierTarget('choice', 'bias', 'bias'),
+            'market': QualifierTarget('choice', 'market_condition', 'market_condition'),
+            'tag': QualifierTarget('tag'),
+            'rr': QualifierTarget('number', 'rr_ratio'),
+            'risk': QualifierTarget('number', 'risk_percentage'),
+        },
+    ),
+    'pre_trade': JournalConfig(
+        model=PreTradeEntry,
+        choice_param='bias',
+        choice_field='bias',
+        sort_fields={'date': 'date', 'pair': 'pair', 'bias': 'bias'},
+        qualifiers={
+            'session': QualifierTarget('choice', 'session_target', 'session'),
+            'bias': QualifierTarget('choice', 'bias', 'bias'),
+            'market': QualifierTarget('choice', 'market_condition', 'market_condition'),
+        },
+    ),
+    'backtest': JournalConfig(
+        model=BacktestEntry,
+        choice_param='bias',
+        choice_field='htf_bias',
+        sort_fields={'date': 'date', 'pair': 'pair', 'bias': 'htf_bias'},
+        time_field='entry_time',
+        qualifiers={
+            'outcome': QualifierTarget('choice', 'outcome', 'backtest_outcome'),
+            'session': QualifierTarget('choice', 'session_time', 'session'),
+            'bias': QualifierTarget('choice', 'htf_bias', 'bias'),
+            'market': QualifierTarget('choice', 'market_condition', 'market_condition'),
+            'day': QualifierTarget('choice', 'day_of_week', 'day_of_week'),
+        },
+    ),
+}
+
+# Every qualifier key some journal understands; other key:value words stay free text
+QUALIFIER_KEYS = set(COMMON_QUALIFIERS).union(*(config.qualifiers for config in JOURNAL_CONFIGS.values()))
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_time(value):
+    try:
+        return parse_time(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_datetime(value):
+    """A datetime-local input value (or ISO datetime), made aware in the current time zone"""
+    try:
+        parsed = parse_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed is not None and settings.USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def _parse_decimal(value):
+    try:
+        return Decimal(value)
+    except (TypeError, ValueError, InvalidOperation):
+        return None
+
+
+# Custom field types filtered by exact value and/or a min/max range, with the
+# parser for the submitted values and the typed column they are compared against
+RANGE_FIELD_TYPES = {
+    'number': (_parse_decimal, 'value_number'),
+    'decimal': (_parse_decimal, 'value_number'),
+    'date': (_parse_date, 'value_date'),
+    'time': (_parse_time, 'value_time'),
+    'datetime': (_parse_datetime, 'value_datetime'),
+}
+
+
+def _date_bounds(value):
+    """(first, last) day of a YYYY, YYYY-MM or YYYY-MM-DD value, or None"""
+    parts = value.split('-')
+    try:
+        if len(parts) == 1:
+            year = int(parts[0])
+            return date(year, 1, 1), date(year, 12, 31)
+        if len(parts) == 2:
+            year, month = int(parts[0]), int(parts[1])
+            return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+    except ValueError:
+        return None
+    parsed = _parse_date(value)
+    return (parsed, parsed) if parsed else None
+
+
+def _exact_bounds(parse):
+    """Bounds parser for values that are single points"""
+    def bounds(value):
+        parsed = parse(value)
+        return (parsed, parsed) if parsed is not None else None
+    return bounds
+
+
+def _choice_value(value, choices):
+    """The stored value of a choice given by value or label (any case, spacing ignored); value itself if none matches"""
+    def normalized(text):
+        return re.sub(r'\W|_', '', str(text)).lower()
+
+    wanted = normalized(value)
+    for choice_value, label in choices:
+        if wanted in (normalized(choice_value), normalized(label)):
+            return choice_value
+    return value
+
+
+def pair_spellings(pair):
+    """A pair as typed, upper-cased, and in its other spelling: EUR/USD <-> EURUSD"""
+    pair = pair.strip().upper()
+    spellings = [pair]
+    match = re.fullmatch(r'([A-Z]{3})(/?)([A-Z]{3})', pair)
+    if match:
+        base, slash, quote = match.groups()
+        spellings.append(f'{base}{quote}' if slash else f'{base}/{quote}')
+    return spellings
+
+
+# Search query language
+
+QUERY_TOKEN_RE = re.compile(
+    r'(?P<key>[A-Za-z_][\w.]*)(?P<op>>=|<=|[:=<>])(?:"(?P<quoted>[^"]*)"?|(?P<value>[^\s"]+))'
+    r'|"(?P<phrase>[^"]*)"?'
+    r'|(?P<word>[^\s"]+)'
+)
+
+
+@dataclass(frozen=True)
+class Qualifier:
+    """One key<op>value condition of a search query; key is lower-cased, op one of : = > >= < <="""
+    key: str
+    op: str
+    value: str
+
+    @property
+    def values(self):
+        """Comma-separated alternatives of the value (outcome:win,loss)"""
+        return [value.strip() for value in self.value.split(',') if value.strip()]
+
+
+@dataclass
+class SearchQuery:
+    qualifiers: list = dataclass_field(default_factory=list)
+    # Residual free text for the full-text index, phrases still quoted
+    text: str = ''
+
+
+def parse_search_query(query):
+    """
+    Split a search box query into qualifiers and free text.
+
+    Qualifier keys are QUALIFIER_KEYS and cf.<custom field name>; unknown
+    key:value words (URLs, 1:2) are left in the free text as typed.
+    """
+    qualifiers = []
+    text = []
+    for match in QUERY_TOKEN_RE.finditer(query or ''):
+        key = (match.group('key') or '').lower()
+        if key and (key in QUALIFIER_KEYS or key.startswith(CUSTOM_QUALIFIER_PREFIX)):
+            value = match.group('quoted') if match.group('quoted') is not None else match.group('value')
+            if value and value.strip():
+                qualifiers.append(Qualifier(key, match.group('op'), value.strip()))
+        elif match.group('phrase') is not None:
+            if match.group('phrase').strip():
+                text.append(f'"{match.group("phrase").strip()}"')
+        else:
+            text.append(match.group(0))
+    return SearchQuery(qualifiers, ' '.join(text))
+
+
+def range_lookups(column, qualifier, bounds):
+    """
+    Lookups on column for a comparison qualifier - key>v, key>=v, key<v,
+    key<=v, key:v or key:a..b (inclusive, either end optional). bounds
+    parses a value into its (low, high) ends, so date:2025-01 spans the
+    month. {} when a value doesn't parse.
+    """
+    op, value = qualifier.op, qualifier.value
+    if op in (':', '=') and '..' in value:
+        start, end = value.split('..', 1)
+        lookups = {}
+        for raw, index, lookup in ((start, 0, 'gte'), (end, 1, 'lte')):
+            if raw.strip():
+                parsed = bounds(raw.strip())
+                if parsed is None:
+                    return {}
+                lookups[f'{column}__{lookup}'] = parsed[index]
+        return lookups
+    parsed = bounds(value)
+    if parsed is None:
+        return {}
+    low, high = parsed
+    if op == '>':
+        return {f'{column}__gt': high}
+    if op == '>=':
+        return {f'{column}__gte': low}
+    if op == '<':
+        return {f'{column}__lt': low}
+    if op == '<=':
+        return {f'{column}__lte': high}
+    if low == high:
+        return {column: low}
+    return {f'{column}__gte': low, f'{column}__lte': high}
+
+
+@dataclass
+class CustomFieldFilter:
+    """Raw filter values submitted for one custom field (custom_<name>, _min, _max, _match)"""
+    field: object
+    value: str = ''
+    min_value: str = ''
+    max_value: str = ''
+    # Multi-select fields: every selected option, combined per match
+    values: list = dataclass_field(default_factory=list)
+    match: str = MATCH_ANY
+
+    @property
+    def is_active(self):
+        return bool(self.value or self.min_value or self.max_value or self.values)
+
+
+@dataclass
+class JournalFilterSpec:
+    """Parsed list request; values are kept as submitted so they can be echoed back to the form"""
+    search: str = ''
+    # Trigram similarity matching for the search box (?fuzzy=1)
+    fuzzy: bool = False
+    pair: str = ''
+    choice: str = ''
+    date_from: str = ''
+    date_to: str = ''
+    tags: list = dataclass_field(default_factory=list)
+    custom: list = dataclass_field(default_factory=list)
+    sort: str = 'date_desc'
+
+    @classmethod
+    def from_querydict(cls, params, config, custom_fields):
+        """Build a spec from request.GET"""
+        custom = []
+        for custom_field in custom_fields:
+            param = f'custom_{custom_field.name}'
+            if custom_field.field_type == 'multiselect':
+                custom.append(CustomFieldFilter(
+                    field=custom_field,
+                    values=[value.strip() for value in params.getlist(param) if value.strip()],
+                    match=MATCH_ALL if params.get(f'{param}_match') == MATCH_ALL else MATCH_ANY,
+                ))
+                continue
+            custom.append(CustomFieldFilter(
+                field=custom_field,
+                value=params.get(param, '').strip(),
+                min_value=params.get(f'{param}_min', '').strip(),
+                max_value=params.get(f'{param}_max', '').strip(),
+            ))
+        return cls(
+            search=params.get('search', '').strip(),
+            fuzzy=params.get('fuzzy', '').lower() in TRUE_VALUES,
+            pair=params.get('pair', '').strip(),
+            choice=params.get(config.choice_param, '').strip(),
+            date_from=params.get('date_from', '').strip(),
+            date_to=params.get('date_to', '').strip(),
+            tags=[tag.strip() for tag in params.getlist('tag') if tag.strip()] if config.has_tags else [],
+            custom=custom,
+            sort=params.get('sort', 'date_desc').strip(),
+        )
+
+    def as_context(self, config):
+        """The `filters` dict the list templates read"""
+        filters = {
+            'search': self.search,
+            'fuzzy': self.fuzzy,
+            'pair': self.pair,
+            config.choice_param: self.choice,
+            'date_from': self.date_from,
+            'date_to': self.date_to,
+            'sort': self.sort,
+        }
+        if config.has_tags:
+            filters['tags'] = self.tags
+        for custom_filter in self.custom:
+            param = f'custom_{custom_filter.field.name}'
+            if custom_filter.field.field_type == 'multiselect':
+                filters[param] = custom_filter.values
+                filters[f'{param}_match'] = custom_filter.match
+                continue
+            filters[param] = custom_filter.value
+            if custom_filter.field.field_type in RANGE_FIELD_TYPES:
+                filters[f'{param}_min'] = custom_filter.min_value
+                filters[f'{param}_max'] = custom_filter.max_value
+        return filters
+
+
+class JournalQueryEngine:
+    """Compiles a JournalFilterSpec into one queryset for a user's journal"""
+
+    def __init__(self, journal_type, user):
+        from .utils import get_user_journal_fields
+
+        if journal_type not in JOURNAL_CONFIGS:
+            raise ValueError(f'Unknown journal type: {journal_type}')
+        self.journal_type = journal_type
+        self.user = user
+        self.config = JOURNAL_CONFIGS[journal_type]
+        self.custom_fields = get_user_journal_fields(user, journal_type)
+
+    def base_queryset(self):
+        return self.config.model.objects.filter(user=self.user)
+
+    def parse(self, params):
+        return JournalFilterSpec.from_querydict(params, self.config, self.custom_fields)
+
+    def queryset(self, spec):
+        """All filters, search and sort of the spec applied to the user's entries"""
+        entries = self.base_queryset()
+        if spec.search:
+            entries = self.search(entries, spec.search, spec.fuzzy)
+        if spec.pair:
+            entries = entries.filter(pair__icontains=spec.pair)
+        if spec.choice:
+            entries = entries.filter(**{self.config.choice_field: spec.choice})
+        date_from = _parse_date(spec.date_from)
+        if date_from:
+            entries = entries.filter(date__gte=date_from)
+        date_to = _parse_date(spec.date_to)
+        if date_to:
+            entries = entries.filter(date__lte=date_to)
+        if spec.tags:
+            entries = entries.filter(self.tags_q(spec.tags))
+        for custom_filter in spec.custom:
+            if custom_filter.is_active:
+                entries = entries.filter(self.custom_field_q(custom_filter))
+        return self.sort(entries, spec.sort)
+
+    def unique_pairs(self):
+        """Pairs the user has entries for, for the filter dropdown"""
+        return list(
+            self.base_queryset().order_by('pair').values_list('pair', flat=True).distinct()
+        )
+
+    # Building blocks
+
+    def field_values_q(self, **lookups):
+        """
+        pk IN (entry ids of the JournalFieldValues matching lookups).
+
+        Uncorrelated, so the database reads the matching values once through
+        the (field, typed value, entry_id) indexes instead of probing each
+        entry's values in turn.
+        """
+        return Q(pk__in=JournalFieldValue.objects.filter(
+            entry_type=self.journal_type,
+            **lookups
+        ).values('entry_id'))
+
+    def choices_exist(self, custom_field, option_values):
+        """EXISTS (the outer entry's multi-select value has one of option_values selected)"""
+        return Exists(JournalFieldValueChoice.objects.filter(
+            value__entry_type=self.journal_type,
+            value__entry_id=OuterRef('pk'),
+            value__field=custom_field,
+            option__field=custom_field,
+            option__value__in=option_values,
+        ))
+
+    def search(self, entries, term, fuzzy=False):
+        """
+        Entries matching the qualifiers of term and whose search document
+        (system text and custom field text) matches the rest of it
+        """
+        from .search import filter_by_search
+
+        return filter_by_search(entries, self.user, self.journal_type, term, fuzzy)
+
+    def tags_q(self, tags):
+        """Entries carrying any of the given strategy tags (by name)"""
+        through = self.config.model.strategy_tags.through
+        return Q(Exists(through.objects.filter(
+            aftertradeentry_id=OuterRef('pk'), strategytag__name__in=tags
+        )))
+
+    def custom_field_q(self, custom_filter):
+        """Condition for one custom field filter; invalid bounds are ignored"""
+        custom_field = custom_filter.field
+        field_type = custom_field.field_type
+        value = custom_filter.value
+
+        if field_type == 'multiselect':
+            # A plain value (filter_entries_by_custom_field) may list options comma-separated
+            selected = custom_filter.values or JournalFieldValue.split_choices(value)
+            if not selected:
+                return Q()
+            if custom_filter.match == MATCH_ALL:
+                condition = Q()
+                for option_value in dict.fromkeys(selected):
+                    condition &= Q(self.choices_exist(custom_field, [option_value]))
+                return condition
+            return Q(self.choices_exist(custom_field, selected))
+
+        if field_type == 'checkbox':
+            if not value:
+                return Q()
+            # = TRUE rather than a bare column test, which SQLite can't match to the index
+            checked = self.field_values_q(field=custom_field, value_boolean=Value(True))
+            return checked if value.lower() in TRUE_VALUES else ~checked
+
+        if field_type in RANGE_FIELD_TYPES:
+            parse, column = RANGE_FIELD_TYPES[field_type]
+            lookups = {}
+            for suffix, raw in (('', value), ('__gte', custom_filter.min_value), ('__lte', custom_filter.max_value)):
+                parsed = parse(raw) if raw else None
+                if parsed is not None:
+                    lookups[column + suffix] = parsed
+        elif not value:
+            return Q()
+        elif field_type == 'select':
+            lookups = {'value_text': value}
+        elif field_type in ['text', 'textarea']:
+            lookups = {'value_text__icontains': value}
+        else:
+            return Q()
+
+        if not lookups:
+            return Q()
+        return self.field_values_q(field=custom_field, **lookups)
+
+    # Search qualifiers
+
+    def qualifiers_q(self, qualifiers):
+        """
+        AND of the conditions of search qualifiers; None when one names a
+        field or custom field this journal doesn't have, so nothing matches
+        """
+        condition = Q()
+        for qualifier in qualifiers:
+            qualifier_condition = self.qualifier_q(qualifier)
+            if qualifier_condition is None:
+                return None
+            condition &= qualifier_condition
+        return condition
+
+    def qualifier_q(self, qualifier):
+        """Condition for one qualifier; invalid values are ignored like invalid filter bounds"""
+        if qualifier.key.startswith(CUSTOM_QUALIFIER_PREFIX):
+            name = qualifier.key[len(CUSTOM_QUALIFIER_PREFIX):]
+            custom_field = next((f for f in self.custom_fields if f.name.lower() == name), None)
+            return self.custom_qualifier_q(custom_field, qualifier) if custom_field else None
+
+        target = COMMON_QUALIFIERS.get(qualifier.key) or self.config.qualifiers.get(qualifier.key)
+        if target is None:
+            return None
+        if target.kind == 'date':
+            return Q(**range_lookups(target.field, qualifier, _date_bounds))
+        if target.kind == 'number':
+            return Q(**range_lookups(target.field, qualifier, _exact_bounds(_parse_decimal)))
+        if qualifier.op not in (':', '='):
+            return Q()
+        if target.kind == 'pair':
+            spellings = [spelling for pair in qualifier.values for spelling in pair_spellings(pair)]
+            return Q(**{f'{target.field}__in': spellings})
+        if target.kind == 'tag':
+            return self.tag_names_q(qualifier.values)
+        from .utils import get_choices
+
+        model_field = self.config.model._meta.get_field(target.field)
+        choices = get_choices(target.category, model_field.flatchoices)
+        return Q(**{f'{target.field}__in': [_choice_value(value, choices) for value in qualifier.values]})
+
+    def custom_qualifier_q(self, custom_field, qualifier):
+        """Condition of a cf.<name> qualifier, reusing the custom field filters"""
+        field_type = custom_field.field_type
+        if field_type in RANGE_FIELD_TYPES:
+            parse, column = RANGE_FIELD_TYPES[field_type]
+            bounds = _date_bounds if field_type == 'date' else _exact_bounds(parse)
+            lookups = range_lookups(column, qualifier, bounds)
+            return self.field_values_q(field=custom_field, **lookups) if lookups else Q()
+        if qualifier.op not in (':', '='):
+            return Q()
+
+        options = [(option.value, option.display_label) for option in custom_field.options.all()]
+        if field_type == 'multiselect':
+            values = [_choice_value(value, options) for value in qualifier.values]
+            return self.custom_field_q(CustomFieldFilter(field=custom_field, values=values))
+        if field_type == 'select':
+            value = _choice_value(qualifier.value, options)
+        else:
+            value = qualifier.value
+        return self.custom_field_q(CustomFieldFilter(field=custom_field, value=value))
+
+    def tag_names_q(self, names):
+        """Entries carrying any of the named strategy tags, names in any case"""
+        name_q = Q()
+        for name in names:
+            name_q |= Q(strategytag__name__iexact=name)
+        through = self.config.model.strategy_tags.through
+        return Q(Exists(through.objects.filter(name_q, aftertradeentry_id=OuterRef('pk'))))
+
+    @staticmethod
+    def _split_sort(sort_by):
+        if '_' in sort_by:
+            return sort_by.rsplit('_', 1)
+        return sort_by, 'desc'
+
+    def sort(self, entries, sort_by):
+        """Apply ?sort=<key>_<asc|desc>; unknown keys keep the model's default ordering"""
+        if not sort_by:
+            return entries
+        sort_key, sort_order = self._split_sort(sort_by)
+
+        if sort_key in self.config.sort_fields:
+            model_field = self.config.sort_fields[sort_key]
+            return entries.order_by(f'-{model_field}' if sort_order == 'desc' else model_field)
+        if sort_key.startswith('custom_'):
+            from .utils import sort_entries_by_custom_field
+
+            custom_field = next((f for f in self.custom_fields if f.name == sort_key[len('custom_'):]), None)
+            if custom_field:
+                return sort_entries_by_custom_field(entries, custom_field, sort_order, self.journal_type)
+        return entries
+
+    def keyset(self, sort_by):
+        """
+        Unique (expression, descending) sort key for cursor pagination, or None
+        when the sort can't be paginated by key (custom field sorts).
+        """
+        sort_key, sort_order = self._split_sort(sort_by or 'date_desc')
+        if sort_key not in self.config.sort_fields:
+            return None
+        descending = sort_order == 'desc'
+        keys = [(F(self.config.sort_fields[sort_key]), descending)]
+        if sort_key == 'date' and self.config.time_field:
+            # Entries without a time sort as midnight: first within their day ascending, last descending
+            keys.append((Coalesce(self.config.time_field, Value(time.min)), descending))
+        keys.append((F('id'), descending))
+        return keys
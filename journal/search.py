@@ -0,0 +1,649 @@
+"""
+Full-text search over the journal entries
+
+Every entry has one SearchDocument row (pair, system text, custom field
+text) and the database's full-text index is built over that table alone: a
+weighted tsvector column with a GIN index on PostgreSQL, an external content
+FTS5 table kept in sync by triggers on SQLite (migration 0021). Global
+search and the list views' search box are each a single query against it.
+Other databases, or an SQLite build without FTS5, fall back to icontains
+over the same documents.
+
+Field qualifiers in a query (outcome:loss rr>2, see
+query_engine.parse_search_query) narrow the documents searched to the
+entries they select; only the remaining free text goes to the index.
+
+Fuzzy mode (fuzzy=True) matches misspelt terms by trigram similarity
+instead: pg_trgm's word similarity over a GIN trigram index on PostgreSQL,
+the SearchTrigram table built here in Python everywhere else.
+
+Documents are refreshed on entry saves and deletes and whenever an entry's
+custom_data projection changes, once per deferred_search_refresh block
+when entry forms write both; `manage.py rebuild_search_documents`
+re-syncs anything written behind their back (queryset updates, imports).
+"""
+import math
+import re
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from django.db import connection
+from django.db.models import Count, F, Q, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import AfterTradeEntry, PreTradeEntry, BacktestEntry, JournalFieldValue, SearchDocument, SearchTrigram
+
+
+FTS_TABLE = 'journal_searchdocument_fts'
+# Document columns with their PostgreSQL weight class, and that class's weight in FTS5's bm25()
+DOCUMENT_COLUMNS = (('pair', 'A'), ('body', 'B'), ('custom_text', 'C'))
+WEIGHT_FACTORS = {'A': 10.0, 'B': 4.0, 'C': 2.0, 'D': 1.0}
+# Custom field types whose values are searchable text
+CUSTOM_TEXT_TYPES = ['text', 'textarea', 'select', 'multiselect', 'url', 'email']
+# Markers around the matched terms in raw snippets, swapped for <mark> once the text is escaped
+SNIPPET_START = '\x02'
+SNIPPET_END = '\x03'
+SNIPPET_TOKENS = 12
+# Share of a term's trigrams a document word must have for a fuzzy match (pg_trgm word similarity)
+FUZZY_THRESHOLD = 0.5
+# The document text pg_trgm matches against; the trigram index in migration 0022 is on this expression
+TRIGRAM_DOCUMENT = "(d.pair || ' ' || d.body || ' ' || d.custom_text)"
+
+
+@dataclass(frozen=True)
+class SearchSource:
+    """Where the search documents of one journal's entries come from"""
+    model: type
+    # Columns concatenated into the document body, most important first
+    text_fields: tuple
+
+
+SEARCH_SOURCES = {
+    'after_trade': SearchSource(AfterTradeEntry, (
+        'observations', 'major_impact_news', 'ai_summary', 'outcome', 'session',
+    )),
+    'pre_trade': SearchSource(PreTradeEntry, (
+        'notes', 'reason_for_taking_or_not', 'htf_draws', 'lower_tf_confirmation', 'bias',
+    )),
+    'backtest': SearchSource(BacktestEntry, (
+        'notes', 'entry_trigger', 'behaviour_based_on_previous_moves', 'lower_tf_bos', 'high_impact_news',
+        'htf_bias', 'outcome',
+    )),
+}
+
+
+# Documents
+
+def custom_search_text(entry, fields):
+    """Searchable custom field values of an entry, read from its custom_data; option labels included"""
+    custom_data = entry.custom_data or {}
+    parts = []
+    for field in fields:
+        value = custom_data.get(field.name)
+        if field.field_type not in CUSTOM_TEXT_TYPES or not value:
+            continue
+        if field.field_type in ['select', 'multiselect']:
+            labels = {option.value: option.display_label for option in field.options.all()}
+            for choice in JournalFieldValue.split_choices(value) if field.field_type == 'multiselect' else [value]:
+                parts.append(choice)
+                if labels.get(choice, choice) != choice:
+                    parts.append(labels[choice])
+        else:
+            parts.append(str(value))
+    return '\n'.join(parts)
+
+
+def pair_search_text(pair):
+    """
+    The pair plus its other spelling as separate words: EURUSD also as EUR
+    and USD, EUR/USD also as EURUSD, so either form matches both exactly and
+    fuzzily.
+    """
+    pair = (pair or '').strip()
+    match = re.fullmatch(r'([A-Za-z]{3})(/?)([A-Za-z]{3})', pair)
+    if not match:
+        return pair
+    base, slash, quote = match.groups()
+    return f'{pair} {base}{quote}' if slash else f'{pair} {base} {quote}'
+
+
+def build_search_document(journal_type, entry, fields):
+    """Unsaved SearchDocument of an entry; fields is the user's custom field schema for the journal"""
+    source = SEARCH_SOURCES[journal_type]
+    texts = (getattr(entry, name) for name in source.text_fields)
+    return SearchDocument(
+        user_id=entry.user_id,
+        entry_type=journal_type,
+        entry_id=entry.pk,
+        date=entry.date,
+        pair=pair_search_text(entry.pair),
+        body='\n'.join(str(text) for text in texts if text),
+        custom_text=custom_search_text(entry, fields),
+    )
+
+
+def build_search_documents(journal_type, entries):
+    """Unsaved SearchDocuments of entries of one journal, any mix of users"""
+    from .utils import get_user_journal_fields
+
+    fields_by_user = {}
+    documents = []
+    for entry in entries:
+        if entry.user_id not in fields_by_user:
+            fields_by_user[entry.user_id] = get_user_journal_fields(entry.user_id, journal_type)
+        documents.append(build_search_document(journal_type, entry, fields_by_user[entry.user_id]))
+    return documents
+
+
+def save_search_documents(documents):
+    """Insert or update documents in one query, then their trigrams where the backend keeps them"""
+    if not documents:
+        return
+    SearchDocument.objects.bulk_create(
+        documents,
+        update_conflicts=True,
+        unique_fields=['entry_type', 'entry_id'],
+        update_fields=['user', 'date', 'pair', 'body', 'custom_text', 'updated_at'],
+    )
+    get_search_backend().index_trigrams(documents)
+
+
+def refresh_search_documents(journal_type, entries):
+    """Rebuild and store the documents of entries of one journal"""
+    save_search_documents(build_search_documents(journal_type, entries))
+
+
+# Entries whose refresh waits for the enclosing deferred_search_refresh block
+_deferred = threading.local()
+
+
+def refresh_entry_search_document(journal_type, entry):
+    """Refresh one entry's document now, or when the enclosing deferred_search_refresh block ends"""
+    pending = getattr(_deferred, 'entries', None)
+    if pending is None:
+        refresh_search_documents(journal_type, [entry])
+    else:
+        pending[(journal_type, entry.pk)] = entry
+
+
+@contextmanager
+def deferred_search_refresh():
+    """
+    Refresh the documents of the entries written inside the block once, on
+    leaving it. Entry forms save the entry and then its custom field values;
+    each write would otherwise rebuild the document and its trigrams.
+    """
+    if getattr(_deferred, 'entries', None) is not None:
+        # Nested: the outermost block refreshes
+        yield
+        return
+    _deferred.entries = {}
+    try:
+        yield
+    finally:
+        pending, _deferred.entries = _deferred.entries, None
+        by_type = {}
+        for (journal_type, _), entry in pending.items():
+            by_type.setdefault(journal_type, []).append(entry)
+        for journal_type, entries in by_type.items():
+            refresh_search_documents(journal_type, entries)
+
+
+def remove_search_documents(journal_type, entry_ids):
+    SearchDocument.objects.filter(entry_type=journal_type, entry_id__in=entry_ids).delete()
+
+
+# Querying
+
+def search_terms(query):
+    """
+    The words and "quoted phrases" of a search box query, lowercased;
+    punctuation only separates words
+    """
+    terms = []
+    for phrase, text in re.findall(r'"([^"]*)"?|([^"]+)', query.lower()):
+        if text:
+            terms.extend(re.findall(r'\w+', text))
+        elif re.findall(r'\w+', phrase):
+            terms.append(' '.join(re.findall(r'\w+', phrase)))
+    return terms
+
+
+def term_pattern(term):
+    """Regex source matching a term, a phrase's words separated by any non-word run"""
+    return r'\W+'.join(re.escape(word) for word in term.split())
+
+
+def scope_q(scopes, prefix=''):
+    """
+    Documents within scopes: {journal type: subquery of entry ids, or None
+    for all of the journal's entries}. prefix reaches the document through
+    a relation (document__).
+    """
+    condition = None
+    for journal_type, entry_ids in scopes.items():
+        journal_q = Q(**{f'{prefix}entry_type': journal_type})
+        if entry_ids is not None:
+            journal_q &= Q(**{f'{prefix}entry_id__in': entry_ids})
+        condition = journal_q if condition is None else condition | journal_q
+    return condition
+
+
+def scope_sql(scopes):
+    """scope_q as an SQL condition on the document alias d, with its params"""
+    clauses = []
+    params = []
+    for journal_type, entry_ids in scopes.items():
+        if entry_ids is None:
+            clauses.append('d.entry_type = %s')
+            params.append(journal_type)
+        else:
+            sql, entry_params = entry_ids.query.sql_with_params()
+            clauses.append(f'(d.entry_type = %s AND d.entry_id IN ({sql}))')
+            params.extend([journal_type, *entry_params])
+    return '(' + ' OR '.join(clauses) + ')', params
+
+
+def trigrams(text):
+    """pg_trgm style trigrams of the words of text: each word padded with two spaces before, one after"""
+    found = set()
+    for word in search_terms(text):
+        padded = f'  {word} '
+        found.update(padded[index:index + 3] for index in range(len(padded) - 2))
+    return found
+
+
+def highlight(raw_snippet):
+    """Escape a snippet built with the SNIPPET_* markers and turn the markers into <mark>"""
+    html = escape(raw_snippet or '')
+    return mark_safe(html.replace(SNIPPET_START, '<mark>').replace(SNIPPET_END, '</mark>'))
+
+
+def term_similarity(term_trigrams, word):
+    """Share of a term's trigrams found in word"""
+    return len(term_trigrams & trigrams(word)) / len(term_trigrams)
+
+
+class SearchBackend:
+    """
+    icontains fallback: every term must appear in one of the document's
+    columns; newest first. Fuzzy search runs on the SearchTrigram table.
+    """
+    # Whether save_search_documents maintains SearchTrigram rows for this backend
+    keeps_trigrams = True
+
+    def documents(self, user_id, terms, scopes):
+        condition = Q()
+        for term in terms:
+            term_q = Q()
+            for column, _ in DOCUMENT_COLUMNS:
+                term_q |= Q(**{f'{column}__icontains': term})
+            condition &= term_q
+        return SearchDocument.objects.filter(scope_q(scopes), user_id=user_id).filter(condition)
+
+    def ranked(self, user_id, terms, scopes, limit):
+        """
+        (document id, entry type, entry id, rank) of the best limit matches
+        per journal in scopes (see scope_q), best first
+        """
+        return self.newest(self.documents(user_id, terms, scopes), limit)
+
+    @staticmethod
+    def newest(documents, limit):
+        """ranked() rows of the newest limit documents per journal"""
+        documents = documents.annotate(position=Window(
+            RowNumber(), partition_by=F('entry_type'), order_by=[F('date').desc(), F('pk').desc()]
+        )).filter(position__lte=limit).order_by('entry_type', 'position')
+        return list(documents.values_list('pk', 'entry_type', 'entry_id', 'position'))
+
+    def snippets(self, document_ids, terms):
+        """{document id: highlighted snippet}"""
+        pattern = re.compile('|'.join(term_pattern(term) for term in terms), re.IGNORECASE)
+        return {
+            document.pk: self.excerpt(document, pattern)
+            for document in SearchDocument.objects.filter(pk__in=document_ids)
+        }
+
+    @staticmethod
+    def excerpt(document, pattern, width=80):
+        """Highlighted window around the first match in the document's columns"""
+        for column, _ in DOCUMENT_COLUMNS:
+            text = getattr(document, column)
+            match = pattern.search(text)
+            if not match:
+                continue
+            start = max(match.start() - width // 2, 0)
+            window = text[start:start + width]
+            marked = pattern.sub(lambda m: f'{SNIPPET_START}{m.group(0)}{SNIPPET_END}', window)
+            return highlight(('…' if start else '') + marked + ('…' if start + width < len(text) else ''))
+        return ''
+
+    def entry_ids(self, user_id, journal_type, terms):
+        """Subquery of the ids of the user's matching entries in one journal"""
+        return self.documents(user_id, terms, {journal_type: None}).values('entry_id')
+
+    # Fuzzy search
+
+    def index_trigrams(self, documents):
+        """Replace the SearchTrigram rows of saved documents"""
+        if not self.keeps_trigrams:
+            return
+        if any(document.pk is None for document in documents):
+            # Backends that don't return primary keys from an upsert
+            pks = {
+                (entry_type, entry_id): pk
+                for pk, entry_type, entry_id in SearchDocument.objects.filter(
+                    entry_type__in={document.entry_type for document in documents},
+                    entry_id__in=[document.entry_id for document in documents],
+                ).values_list('pk', 'entry_type', 'entry_id')
+            }
+            for document in documents:
+                document.pk = pks.get((document.entry_type, document.entry_id))
+        SearchTrigram.objects.filter(document_id__in=[document.pk for document in documents]).delete()
+        SearchTrigram.objects.bulk_create([
+            SearchTrigram(document_id=document.pk, user_id=document.user_id, trigram=trigram)
+            for document in documents
+            for trigram in trigrams(' '.join([document.pair, document.body, document.custom_text]))
+        ], batch_size=1000)
+
+    def fuzzy_matches(self, user_id, terms, scopes):
+        """Per-document trigram hit counts, keeping documents that match every term closely enough"""
+        term_trigrams = [trigrams(term) for term in terms]
+        counts = {f'term_{index}': Count('pk', filter=Q(trigram__in=grams)) for index, grams in enumerate(term_trigrams)}
+        required = {
+            f'term_{index}__gte': math.ceil(FUZZY_THRESHOLD * len(grams)) for index, grams in enumerate(term_trigrams)
+        }
+        return SearchTrigram.objects.filter(
+            scope_q(scopes, 'document__'), user_id=user_id, trigram__in=set().union(*term_trigrams)
+        ).values('document_id').annotate(**counts).filter(**required).order_by()
+
+    def fuzzy_ranked(self, user_id, terms, scopes, limit):
+        """Like ranked(), by mean trigram similarity of the terms"""
+        sizes = [len(trigrams(term)) for term in terms]
+        matches = self.fuzzy_matches(user_id, terms, scopes).values(
+            'document_id', 'document__entry_type', 'document__entry_id', 'document__date',
+            *[f'term_{index}' for index in range(len(terms))],
+        )
+        scored = [
+            (sum(row[f'term_{index}'] / size for index, size in enumerate(sizes)) / len(sizes), row)
+            for row in matches
+        ]
+        # Best first, newest first among equals
+        scored.sort(key=lambda item: (-item[0], -item[1]['document__date'].toordinal(), -item[1]['document_id']))
+        per_type = {}
+        rows = []
+        for score, row in scored:
+            entry_type = row['document__entry_type']
+            per_type[entry_type] = per_type.get(entry_type, 0) + 1
+            if per_type[entry_type] <= limit:
+                rows.append((row['document_id'], entry_type, row['document__entry_id'], score))
+        return rows
+
+    def fuzzy_entry_ids(self, user_id, journal_type, terms):
+        """Subquery of the ids of the user's entries in one journal that fuzzily match every term"""
+        return self.fuzzy_matches(user_id, terms, {journal_type: None}).values('document__entry_id')
+
+    def fuzzy_snippets(self, document_ids, terms):
+        """{document id: snippet} highlighting the document words closest to the terms"""
+        term_trigrams = [trigrams(term) for term in terms]
+        snippets = {}
+        for document in SearchDocument.objects.filter(pk__in=document_ids):
+            words = {
+                word for word in re.findall(r'\w+', ' '.join([document.pair, document.body, document.custom_text]))
+                if any(term_similarity(grams, word) >= FUZZY_THRESHOLD for grams in term_trigrams)
+            }
+            if words:
+                pattern = re.compile(r'\b(?:' + '|'.join(re.escape(word) for word in words) + r')\b', re.IGNORECASE)
+                snippets[document.pk] = self.excerpt(document, pattern)
+            else:
+                snippets[document.pk] = ''
+        return snippets
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """FTS5 MATCH with bm25() ranking and snippet() highlighting"""
+
+    @staticmethod
+    def match_expression(terms):
+        # Every term quoted (no FTS5 syntax from the user), the last one as a prefix for search-as-you-type
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' AND '.join(quoted)
+
+    def ranked(self, user_id, terms, scopes, limit):
+        weights = ', '.join(str(WEIGHT_FACTORS[weight]) for _, weight in DOCUMENT_COLUMNS)
+        scope, scope_params = scope_sql(scopes)
+        # bm25() can't be used inside a window function, so the matches are ranked in an inner query
+        sql = (
+            f'SELECT id, entry_type, entry_id, rank FROM ('
+            f'  SELECT *, ROW_NUMBER() OVER (PARTITION BY entry_type ORDER BY rank, date DESC) AS position FROM ('
+            f'    SELECT d.id, d.entry_type, d.entry_id, d.date, bm25({FTS_TABLE}, {weights}) AS rank'
+            f'    FROM {FTS_TABLE} JOIN journal_searchdocument d ON d.id = {FTS_TABLE}.rowid'
+            f'    WHERE {FTS_TABLE} MATCH %s AND d.user_id = %s AND {scope}'
+            f'  )'
+            f') WHERE position <= %s ORDER BY rank'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [self.match_expression(terms), user_id, *scope_params, limit])
+            return cursor.fetchall()
+
+    def snippets(self, document_ids, terms):
+        if not document_ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(document_ids))
+        sql = (
+            f"SELECT rowid, snippet({FTS_TABLE}, -1, %s, %s, '…', {SNIPPET_TOKENS}) FROM {FTS_TABLE} "
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid IN ({placeholders})'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [SNIPPET_START, SNIPPET_END, self.match_expression(terms), *document_ids])
+            return {pk: highlight(snippet) for pk, snippet in cursor.fetchall()}
+
+    def entry_ids(self, user_id, journal_type, terms):
+        return RawSQL(
+            f'SELECT d.entry_id FROM {FTS_TABLE} JOIN journal_searchdocument d ON d.id = {FTS_TABLE}.rowid '
+            f'WHERE {FTS_TABLE} MATCH %s AND d.user_id = %s AND d.entry_type = %s',
+            (self.match_expression(terms), user_id, journal_type),
+        )
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    search_vector @@ tsquery over the GIN index, ts_rank() ranking and
+    ts_headline() highlighting; fuzzy search with pg_trgm's <% operator over
+    the trigram GIN index.
+    """
+    keeps_trigrams = False
+
+    @staticmethod
+    def tsquery(terms):
+        return ' & '.join(f"'{term}':*" for term in terms)
+
+    def ranked(self, user_id, terms, scopes, limit):
+        scope, scope_params = scope_sql(scopes)
+        sql = (
+            f'SELECT id, entry_type, entry_id, rank FROM ('
+            f'  SELECT d.id, d.entry_type, d.entry_id, ts_rank(d.search_vector, query) AS rank,'
+            f'    ROW_NUMBER() OVER ('
+            f'      PARTITION BY d.entry_type ORDER BY ts_rank(d.search_vector, query) DESC, d.date DESC'
+            f'    ) AS position'
+            f"  FROM journal_searchdocument d, to_tsquery('english'::regconfig, %s) query"
+            f'  WHERE d.search_vector @@ query AND d.user_id = %s AND {scope}'
+            f') ranked WHERE position <= %s ORDER BY rank DESC'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [self.tsquery(terms), user_id, *scope_params, limit])
+            return cursor.fetchall()
+
+    def snippets(self, document_ids, terms):
+        if not document_ids:
+            return {}
+        placeholders = ', '.join(['%s'] * len(document_ids))
+        options = f'StartSel={SNIPPET_START}, StopSel={SNIPPET_END}, MaxWords={SNIPPET_TOKENS * 2}, MinWords=5'
+        sql = (
+            f"SELECT id, ts_headline('english'::regconfig, concat_ws(' ', pair, body, custom_text), "
+            f"to_tsquery('english'::regconfig, %s), %s) "
+            f'FROM journal_searchdocument WHERE id IN ({placeholders})'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [self.tsquery(terms), options, *document_ids])
+            return {pk: highlight(snippet) for pk, snippet in cursor.fetchall()}
+
+    def entry_ids(self, user_id, journal_type, terms):
+        return RawSQL(
+            "SELECT entry_id FROM journal_searchdocument WHERE search_vector @@ to_tsquery('english'::regconfig, %s) "
+            'AND user_id = %s AND entry_type = %s',
+            (self.tsquery(terms), user_id, journal_type),
+        )
+
+    @staticmethod
+    def set_fuzzy_threshold(cursor):
+        # Session setting read by <%; set before each fuzzy query so pooled connections agree
+        cursor.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, false)", [str(FUZZY_THRESHOLD)])
+
+    @staticmethod
+    def fuzzy_conditions(terms):
+        return ' AND '.join([f'%s <%% {TRIGRAM_DOCUMENT}'] * len(terms))
+
+    def fuzzy_ranked(self, user_id, terms, scopes, limit):
+        scope, scope_params = scope_sql(scopes)
+        score = '(' + ' + '.join([f'word_similarity(%s, {TRIGRAM_DOCUMENT})'] * len(terms)) + f') / {len(terms)}'
+        sql = (
+            f'SELECT id, entry_type, entry_id, score FROM ('
+            f'  SELECT d.id, d.entry_type, d.entry_id, {score} AS score,'
+            f'    ROW_NUMBER() OVER (PARTITION BY d.entry_type ORDER BY {score} DESC, d.date DESC) AS position'
+            f'  FROM journal_searchdocument d'
+            f'  WHERE d.user_id = %s AND {scope} AND {self.fuzzy_conditions(terms)}'
+            f') ranked WHERE position <= %s ORDER BY score DESC'
+        )
+        with connection.cursor() as cursor:
+            self.set_fuzzy_threshold(cursor)
+            cursor.execute(sql, [*terms, *terms, user_id, *scope_params, *terms, limit])
+            return cursor.fetchall()
+
+    def fuzzy_entry_ids(self, user_id, journal_type, terms):
+        with connection.cursor() as cursor:
+            self.set_fuzzy_threshold(cursor)
+        return RawSQL(
+            f'SELECT d.entry_id FROM journal_searchdocument d '
+            f'WHERE d.user_id = %s AND d.entry_type = %s AND {self.fuzzy_conditions(terms)}',
+            (user_id, journal_type, *terms),
+        )
+
+
+def fts_available():
+    """Whether migration 0021 could create the database's full-text structures"""
+    if connection.vendor == 'postgresql':
+        return True
+    if connection.vendor == 'sqlite':
+        return FTS_TABLE in connection.introspection.table_names()
+    return False
+
+
+_backend = None
+
+
+def get_search_backend():
+    """The search backend for the default database"""
+    global _backend
+    if _backend is None:
+        if fts_available():
+            _backend = PostgresSearchBackend() if connection.vendor == 'postgresql' else SQLiteSearchBackend()
+        else:
+            _backend = SearchBackend()
+    return _backend
+
+
+def search_scopes(user_id, query, journal_types):
+    """
+    (scopes, free text) of a query: each journal's entries narrowed by the
+    query's qualifiers (see query_engine.parse_search_query). Journals
+    lacking a qualified field are left out; a journal without qualifiers
+    scopes all of its entries (None).
+    """
+    from .query_engine import JournalQueryEngine, parse_search_query
+
+    parsed = parse_search_query(query)
+    if not parsed.qualifiers:
+        return {journal_type: None for journal_type in journal_types}, parsed.text
+    scopes = {}
+    for journal_type in journal_types:
+        engine = JournalQueryEngine(journal_type, user_id)
+        condition = engine.qualifiers_q(parsed.qualifiers)
+        if condition is not None:
+            scopes[journal_type] = engine.base_queryset().filter(condition).values('pk')
+    return scopes, parsed.text
+
+
+def search_journals(user, query, journal_types=None, limit=20, fuzzy=False):
+    """
+    Ranked search of several of a user's (or user id's) journals in one query.
+
+    Returns {journal type: up to limit entries, best first}; each entry has
+    search_rank and a highlighted search_snippet. With fuzzy, terms match
+    similar words (EURUDS finds EURUSD) and are ranked by similarity.
+    Qualifiers (outcome:loss, rr>2, ...) narrow the entries searched; a
+    query of qualifiers alone lists the matching entries newest first.
+    """
+    journal_types = list(journal_types or SEARCH_SOURCES)
+    results = {journal_type: [] for journal_type in journal_types}
+    user_id = getattr(user, 'pk', user)
+    scopes, text = search_scopes(user_id, query, journal_types)
+    terms = search_terms(text)
+    if not scopes or (not terms and all(entry_ids is None for entry_ids in scopes.values())):
+        return results
+    backend = get_search_backend()
+    if not terms:
+        rows = backend.newest(backend.documents(user_id, [], scopes), limit)
+        snippets = {}
+    elif fuzzy:
+        rows = backend.fuzzy_ranked(user_id, terms, scopes, limit)
+        snippets = backend.fuzzy_snippets([pk for pk, _, _, _ in rows], terms)
+    else:
+        rows = backend.ranked(user_id, terms, scopes, limit)
+        snippets = backend.snippets([pk for pk, _, _, _ in rows], terms)
+
+    entries = {}
+    for journal_type in journal_types:
+        entry_ids = [entry_id for _, row_type, entry_id, _ in rows if row_type == journal_type]
+        entries[journal_type] = SEARCH_SOURCES[journal_type].model.objects.in_bulk(entry_ids) if entry_ids else {}
+    for pk, journal_type, entry_id, rank in rows:
+        entry = entries[journal_type].get(entry_id)
+        if entry is None:
+            continue
+        entry.search_rank = rank
+        entry.search_snippet = snippets.get(pk, '')
+        results[journal_type].append(entry)
+    return results
+
+
+def search_journal(user, journal_type, query, limit=20, fuzzy=False):
+    """Ranked search of one of the user's journals"""
+    return search_journals(user, query, [journal_type], limit, fuzzy)[journal_type]
+
+
+def filter_by_search(entries, user, journal_type, query, fuzzy=False):
+    """
+    entries narrowed by query's qualifiers and to those whose search
+    document matches its free text (list views' search box)
+    """
+    from .query_engine import JournalQueryEngine, parse_search_query
+
+    parsed = parse_search_query(query)
+    if parsed.qualifiers:
+        condition = JournalQueryEngine(journal_type, user).qualifiers_q(parsed.qualifiers)
+        if condition is None:
+            return entries.none()
+        entries = entries.filter(condition)
+    terms = search_terms(parsed.text)
+    if not terms:
+        return entries
+    backend = get_search_backend()
+    user_id = getattr(user, 'pk', user)
+    if fuzzy:
+        return entries.filter(pk__in=backend.fuzzy_entry_ids(user_id, journal_type, terms))
+    return entries.filter(pk__in=backend.entry_ids(user_id, journal_type, terms))
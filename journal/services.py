@@ -1,10 +1,18 @@
 """
-AI-powered trade summary generator service and Error Pattern Detection
+AI-powered trade summary generator service, Error Pattern Detection,
+dashboard KPI aggregation and trade statistics
 """
+import hashlib
+import json
+
+from django.db import connection
 from django.utils import timezone
+from django.utils.dateparse import parse_date
 from decimal import Decimal
-from django.db.models import Q, Count, Avg, Sum, Case, When, IntegerField
+from django.db.models import Q, Count, Avg, Sum, Case, When, IntegerField, Exists, F, OuterRef, Window
+from django.db.models.functions import RowNumber, TruncMonth, TruncWeek
 from collections import Counter
+from dataclasses import dataclass, field
 from datetime import datetime, timedelta
 
 
@@ -496,3 +504,360 @@ class ErrorPatternAnalyzer:
         }
         return suggestions.get(behavior, 'Review your trading strategy for this market behavior.')
 
+
+
+MARKET_CONDITIONS = ['Trending Up', 'Trending Down', 'Consolidating']
+
+# Default and maximum chart windows (5 years)
+DEFAULT_CHART_WEEKS = 12
+DEFAULT_CHART_MONTHS = 6
+MAX_CHART_WEEKS = 260
+MAX_CHART_MONTHS = 60
+
+
+@dataclass(frozen=True)
+class DashboardKPIs:
+    """Typed snapshot of the dashboard KPIs for one user"""
+    total_trades: int = 0
+    wins: int = 0
+    correct_bias: int = 0
+    avg_poi_score: float = 0.0
+    week_trades: int = 0
+    week_wins: int = 0
+    market_condition_counts: dict = field(default_factory=dict)
+    streak_abs: int = 0
+    streak_type: str = ''
+
+    @property
+    def win_rate(self):
+        return (self.wins / self.total_trades * 100) if self.total_trades > 0 else 0
+
+    @property
+    def correct_bias_pct(self):
+        return (self.correct_bias / self.total_trades * 100) if self.total_trades > 0 else 0
+
+    @property
+    def week_win_rate(self):
+        return (self.week_wins / self.week_trades * 100) if self.week_trades > 0 else 0
+
+    def as_dict(self):
+        """Rounded, JSON serializable values as shown on the dashboard"""
+        return {
+            'total_entries': self.total_trades,
+            'total_trades': self.total_trades,
+            'win_rate': round(self.win_rate, 1),
+            'correct_bias_pct': round(self.correct_bias_pct, 1),
+            'avg_poi_score': round(self.avg_poi_score, 1),
+            'streak_abs': self.streak_abs,
+            'streak_type': self.streak_type,
+            'week_win_rate': round(self.week_win_rate, 1),
+            'market_conditions': list(self.market_condition_counts.keys()),
+            'market_condition_counts': [int(count) for count in self.market_condition_counts.values()],
+        }
+
+
+class DashboardMetrics:
+    """
+    Computes the dashboard KPIs with one conditional-aggregation query;
+    the current streak is read from the user's TradeStreak row.
+    """
+
+    @staticmethod
+    def compute(user, today=None):
+        """
+        Compute all dashboard KPIs for a user.
+
+        Args:
+            user: User instance
+            today: Optional date used as "now" for the 7-day window
+
+        Returns:
+            DashboardKPIs
+        """
+        from .models import AfterTradeEntry, TradeStreak
+
+        after_trades = AfterTradeEntry.objects.filter(user=user)
+        today = today or timezone.now().date()
+        week_ago = today - timedelta(days=7)
+
+        aggregates = {
+            'total_trades': Count('id'),
+            'wins': Count('id', filter=Q(outcome='win')),
+            'correct_bias': Count('id', filter=Q(predicted_directional_bias='correct')),
+            'avg_poi_score': Avg('poi_quality_score'),
+            'week_trades': Count('id', filter=Q(date__gte=week_ago)),
+            'week_wins': Count('id', filter=Q(date__gte=week_ago, outcome='win')),
+        }
+        for idx, condition in enumerate(MARKET_CONDITIONS):
+            aggregates[f'condition_{idx}'] = Count('id', filter=Q(market_condition=condition))
+
+        result = after_trades.order_by().aggregate(**aggregates)
+        if not result['total_trades']:
+            return DashboardKPIs(market_condition_counts={c: 0 for c in MARKET_CONDITIONS})
+
+        # Maintained on every trade write, so no history scan is needed here
+        streak = TradeStreak.for_user(user.pk)
+
+        return DashboardKPIs(
+            total_trades=result['total_trades'],
+            wins=result['wins'],
+            correct_bias=result['correct_bias'],
+            avg_poi_score=float(result['avg_poi_score'] or 0),
+            week_trades=result['week_trades'],
+            week_wins=result['week_wins'],
+            market_condition_counts={
+                condition: result[f'condition_{idx}']
+                for idx, condition in enumerate(MARKET_CONDITIONS)
+            },
+            streak_abs=streak.current_length,
+            streak_type=streak.streak_type,
+        )
+
+    @staticmethod
+    def chart_series(user, weeks=DEFAULT_CHART_WEEKS, months=DEFAULT_CHART_MONTHS, today=None):
+        """
+        Win rate per ISO week and average POI score per month, grouped in the database.
+
+        Args:
+            user: User instance
+            weeks: Number of weeks (including the current one) to include
+            months: Number of months (including the current one) to include
+            today: Optional date used as "now"
+
+        Returns:
+            dict: JSON serializable labels and values for the dashboard charts.
+            Weeks/months without trades are left out.
+        """
+        from .models import AfterTradeEntry
+
+        today = today or timezone.now().date()
+        weeks = min(max(int(weeks), 1), MAX_CHART_WEEKS)
+        months = min(max(int(months), 1), MAX_CHART_MONTHS)
+        after_trades = AfterTradeEntry.objects.filter(user=user).order_by()
+
+        first_week = today - timedelta(days=today.weekday() + 7 * (weeks - 1))
+        weekly = after_trades.filter(date__gte=first_week).annotate(
+            week=TruncWeek('date')
+        ).values('week').annotate(
+            total=Count('id'),
+            wins=Count('id', filter=Q(outcome='win')),
+        ).order_by('week')
+
+        month_index = today.year * 12 + today.month - 1 - (months - 1)
+        first_month = today.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+        monthly = after_trades.filter(
+            date__gte=first_month, poi_quality_score__isnull=False
+        ).annotate(
+            month=TruncMonth('date')
+        ).values('month').annotate(
+            avg_poi=Avg('poi_quality_score'),
+        ).order_by('month')
+
+        weekly = list(weekly)
+        monthly = list(monthly)
+        return {
+            'win_rate_weeks': [row['week'].strftime('%b %d') for row in weekly],
+            'win_rate_values': [round(row['wins'] / row['total'] * 100, 1) for row in weekly],
+            'poi_months': [row['month'].strftime('%b %Y') for row in monthly],
+            'poi_avg_scores': [round(float(row['avg_poi']), 2) for row in monthly],
+        }
+
+
+def _filter_date(value):
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
+
+
+@dataclass(frozen=True)
+class StatisticsFilters:
+    """Trade statistics filters (?date_from=&date_to=&pair=&tag=, pair and tag repeatable)"""
+    date_from: object = None
+    date_to: object = None
+    pairs: tuple = ()
+    tags: tuple = ()
+
+    @classmethod
+    def from_querydict(cls, params):
+        return cls(
+            date_from=_filter_date(params.get('date_from')),
+            date_to=_filter_date(params.get('date_to')),
+            pairs=tuple(sorted({pair.strip() for pair in params.getlist('pair') if pair.strip()})),
+            tags=tuple(sorted({tag.strip() for tag in params.getlist('tag') if tag.strip()})),
+        )
+
+    @property
+    def is_active(self):
+        return bool(self.date_from or self.date_to or self.pairs or self.tags)
+
+    def cache_key(self):
+        """Short digest identifying the filters, for keying cached fragments"""
+        payload = json.dumps([str(self.date_from), str(self.date_to), self.pairs, self.tags])
+        return hashlib.md5(payload.encode()).hexdigest()
+
+
+class StatisticsEngine:
+    """
+    Trade statistics of a user's after trade entries, optionally filtered by
+    date range, pairs and strategy tags.
+
+    Totals are one conditional-aggregation query and each breakdown (month,
+    pair, session) one GROUP BY: over the daily rollups when only date and
+    pair filters apply, over the trades themselves once tags are filtered.
+    Streaks come from TradeStreak for the unfiltered history and from one
+    window-function query otherwise.
+    """
+    # Breakdown name -> (rollup/trade column or expression, ordering)
+    BREAKDOWNS = {
+        'monthly': (TruncMonth('date'), '-key'),
+        'pair': (F('pair'), '-total'),
+        'session': (F('session'), '-total'),
+    }
+
+    def __init__(self, user, filters=None):
+        self.user = user
+        self.filters = filters or StatisticsFilters()
+
+    def trades(self):
+        from .models import AfterTradeEntry
+
+        trades = AfterTradeEntry.objects.filter(user=self.user).order_by()
+        filters = self.filters
+        if filters.date_from:
+            trades = trades.filter(date__gte=filters.date_from)
+        if filters.date_to:
+            trades = trades.filter(date__lte=filters.date_to)
+        if filters.pairs:
+            trades = trades.filter(pair__in=filters.pairs)
+        if filters.tags:
+            through = AfterTradeEntry.strategy_tags.through
+            trades = trades.filter(Exists(through.objects.filter(
+                aftertradeentry_id=OuterRef('pk'), strategytag__name__in=filters.tags
+            )))
+        return trades
+
+    @property
+    def uses_rollups(self):
+        """Whether the breakdowns can be summed from DailyTradeRollup (it has no tags)"""
+        return not self.filters.tags
+
+    def rollups(self):
+        from .models import DailyTradeRollup
+
+        rollups = DailyTradeRollup.objects.filter(user=self.user).order_by()
+        if self.filters.date_from:
+            rollups = rollups.filter(date__gte=self.filters.date_from)
+        if self.filters.date_to:
+            rollups = rollups.filter(date__lte=self.filters.date_to)
+        if self.filters.pairs:
+            rollups = rollups.filter(pair__in=self.filters.pairs)
+        return rollups
+
+    def totals(self):
+        """Trade count, wins, losses and average win/loss pips in one query"""
+        return self.trades().aggregate(
+            total=Count('id'),
+            wins=Count('id', filter=Q(outcome='win')),
+            losses=Count('id', filter=Q(outcome='loss')),
+            avg_win_pips=Avg('reward_pips', filter=Q(outcome='win')),
+            avg_loss_pips=Avg('risk_pips', filter=Q(outcome='loss')),
+        )
+
+    def breakdown(self, name):
+        """{key: {'wins', 'losses', 'total', 'win_rate'}} grouped by month (YYYY-MM), pair or session"""
+        expression, ordering = self.BREAKDOWNS[name]
+        if self.uses_rollups:
+            rows = self.rollups().annotate(key=expression).values('key').annotate(
+                total=Sum('trades'), wins=Sum('wins'), losses=Sum('losses'),
+            )
+        else:
+            rows = self.trades().annotate(key=expression).values('key').annotate(
+                total=Count('id'),
+                wins=Count('id', filter=Q(outcome='win')),
+                losses=Count('id', filter=Q(outcome='loss')),
+            )
+        stats = {}
+        for row in rows.order_by(ordering, 'key'):
+            if name == 'monthly':
+                key = f"{row['key'].year}-{row['key'].month:02d}"
+            else:
+                # Rollups store no session as '', trades as NULL or ''
+                key = row['key'] or None
+            entry = stats.setdefault(key, {'wins': 0, 'losses': 0, 'total': 0})
+            entry['total'] += row['total']
+            entry['wins'] += row['wins']
+            entry['losses'] += row['losses']
+        for entry in stats.values():
+            entry['win_rate'] = (entry['wins'] / entry['total'] * 100) if entry['total'] > 0 else 0
+        return stats
+
+    def streaks(self):
+        """(max win streak, max loss streak) over the filtered trades in TradeStreak order"""
+        from .models import TradeStreak
+
+        if not self.filters.is_active:
+            streak = TradeStreak.for_user(self.user.pk)
+            return streak.max_win_streak, streak.max_loss_streak
+
+        # Gaps and islands: within a run of equal outcomes the overall position
+        # and the position among that outcome's trades grow together
+        ordering = TradeStreak.ENTRY_ORDERING
+        runs = self.trades().annotate(
+            run=Window(RowNumber(), order_by=ordering)
+            - Window(RowNumber(), partition_by=[F('outcome')], order_by=ordering)
+        ).values('outcome', 'run')
+        sql, params = runs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT outcome, MAX(length) FROM ('
+                f'  SELECT outcome, run, COUNT(*) AS length FROM ({sql}) runs GROUP BY outcome, run'
+                f') lengths GROUP BY outcome',
+                params,
+            )
+            longest = dict(cursor.fetchall())
+        return longest.get('win', 0), longest.get('loss', 0)
+
+    def compute(self):
+        """Values for the trade statistics page"""
+        totals = self.totals()
+        total_trades = totals['total']
+        wins = totals['wins']
+        losses = totals['losses']
+        win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
+        avg_win_pips = totals['avg_win_pips'] or 0
+        avg_loss_pips = totals['avg_loss_pips'] or 0
+        profit_factor = (avg_win_pips * wins) / (avg_loss_pips * losses) if losses > 0 and avg_loss_pips else 0
+
+        rated = self.trades().filter(rr_ratio__isnull=False)
+        max_win_streak, max_loss_streak = self.streaks()
+        return {
+            'total_trades': total_trades,
+            'wins': wins,
+            'losses': losses,
+            'win_rate': round(win_rate, 1),
+            'avg_win_pips': round(float(avg_win_pips), 2) if avg_win_pips else 0,
+            'avg_loss_pips': round(float(avg_loss_pips), 2) if avg_loss_pips else 0,
+            'profit_factor': round(float(profit_factor), 2) if profit_factor else 0,
+            'best_trade': rated.order_by('-rr_ratio').first(),
+            'worst_trade': rated.order_by('rr_ratio').first(),
+            'max_win_streak': max_win_streak,
+            'max_loss_streak': max_loss_streak,
+            'monthly_stats': self.breakdown('monthly'),
+            'pair_stats': self.breakdown('pair'),
+            'session_stats': self.breakdown('session'),
+        }
+
+    @staticmethod
+    def filter_options(user):
+        """Pairs and strategy tags the user has traded, for the filter form"""
+        from .models import AfterTradeEntry, DailyTradeRollup
+
+        through = AfterTradeEntry.strategy_tags.through
+        return {
+            'pairs': list(DailyTradeRollup.objects.filter(user=user).order_by('pair').values_list('pair', flat=True).distinct()),
+            'tags': list(through.objects.filter(aftertradeentry__user=user).order_by('strategytag__name').values_list(
+                'strategytag__name', flat=True
+            ).distinct()),
+        }
+
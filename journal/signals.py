@@ -0,0 +1,206 @@
+"""
+Model signal handlers that keep derived data in sync with journal entries
+"""
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from .models import (
+    AfterTradeEntry, PreTradeEntry, BacktestEntry, JournalField, JournalFieldOption,
+    JournalFieldValue, JournalFieldValueChoice, DailyTradeRollup, TradeStreak, UserDataVersion
+)
+
+
+# Stored AfterTradeEntry fields that derived data (rollups, streaks) is built from
+TRADE_SNAPSHOT_FIELDS = list(dict.fromkeys(DailyTradeRollup.SOURCE_FIELDS + TradeStreak.SOURCE_FIELDS))
+
+
+def _deleting_user(origin):
+    """True when a delete cascades from the user itself, so there is nothing left to keep in sync"""
+    if isinstance(origin, QuerySet):
+        return origin.model is User
+    return isinstance(origin, User)
+
+
+def _rollup_values(entry):
+    """Snapshot of the fields the daily rollup is built from"""
+    return {name: getattr(entry, name) for name in DailyTradeRollup.SOURCE_FIELDS}
+
+
+@receiver(pre_save, sender=AfterTradeEntry)
+def capture_trade_snapshot(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Remember the stored version of an edited trade so derived data gets a before/after delta"""
+    instance._trade_previous = None
+    instance._trade_skip = False
+    if raw or not instance.pk:
+        return
+    if update_fields is not None and not set(update_fields) & set(TRADE_SNAPSHOT_FIELDS + ['user']):
+        # e.g. saving only the AI summary
+        instance._trade_skip = True
+        return
+    instance._trade_previous = sender.objects.filter(pk=instance.pk).values(*TRADE_SNAPSHOT_FIELDS).first()
+
+
+@receiver(post_save, sender=AfterTradeEntry)
+def update_daily_rollup(sender, instance, created, raw=False, **kwargs):
+    if raw or getattr(instance, '_trade_skip', False):
+        return
+    previous = None if created else getattr(instance, '_trade_previous', None)
+    DailyTradeRollup.record_change(previous, _rollup_values(instance))
+
+
+@receiver(post_delete, sender=AfterTradeEntry)
+def remove_from_daily_rollup(sender, instance, origin=None, **kwargs):
+    if _deleting_user(origin):
+        return
+    DailyTradeRollup.record_change(_rollup_values(instance), None)
+
+
+@receiver(post_save, sender=AfterTradeEntry)
+def update_trade_streak(sender, instance, created, raw=False, **kwargs):
+    if raw or getattr(instance, '_trade_skip', False):
+        return
+    if created:
+        # O(1) unless the trade was back-dated before the latest one
+        TradeStreak.record_append(instance)
+        return
+    previous = getattr(instance, '_trade_previous', None)
+    current = TradeStreak.entry_values(instance)
+    if previous and all(previous[name] == current[name] for name in TradeStreak.SOURCE_FIELDS):
+        return
+    # Outcome or position changed somewhere in the history
+    for user_id in {current['user_id'], previous['user_id'] if previous else None} - {None}:
+        TradeStreak.recompute(user_id)
+
+
+@receiver(post_delete, sender=AfterTradeEntry)
+def remove_from_trade_streak(sender, instance, origin=None, **kwargs):
+    if _deleting_user(origin):
+        return
+    TradeStreak.recompute(instance.user_id)
+
+
+# Data version: any change to a user's journal data invalidates their cached fragments
+@receiver(post_save, sender=AfterTradeEntry)
+@receiver(post_save, sender=PreTradeEntry)
+@receiver(post_save, sender=BacktestEntry)
+@receiver(post_delete, sender=AfterTradeEntry)
+@receiver(post_delete, sender=PreTradeEntry)
+@receiver(post_delete, sender=BacktestEntry)
+def bump_version_for_entry(sender, instance, raw=False, origin=None, **kwargs):
+    if not raw and not _deleting_user(origin):
+        UserDataVersion.bump(instance.user_id)
+
+
+@receiver(post_delete, sender=AfterTradeEntry)
+@receiver(post_delete, sender=PreTradeEntry)
+@receiver(post_delete, sender=BacktestEntry)
+def purge_entry_field_values(sender, instance, origin=None, **kwargs):
+    """JournalFieldValue only references entries by id, so nothing cascades to it"""
+    from .utils import ENTRY_TYPE_MAP
+
+    if _deleting_user(origin):
+        # The user's JournalFields cascade and take the values with them
+        return
+    JournalFieldValue.purge(JournalFieldValue.objects.filter(
+        entry_type=ENTRY_TYPE_MAP[sender.__name__], entry_id=instance.pk
+    ))
+
+
+@receiver(post_save, sender=AfterTradeEntry)
+@receiver(post_save, sender=PreTradeEntry)
+@receiver(post_save, sender=BacktestEntry)
+def refresh_entry_search_document(sender, instance, raw=False, **kwargs):
+    from .search import refresh_entry_search_document
+    from .utils import ENTRY_TYPE_MAP
+
+    if not raw:
+        refresh_entry_search_document(ENTRY_TYPE_MAP[sender.__name__], instance)
+
+
+@receiver(post_delete, sender=AfterTradeEntry)
+@receiver(post_delete, sender=PreTradeEntry)
+@receiver(post_delete, sender=BacktestEntry)
+def remove_entry_search_document(sender, instance, origin=None, **kwargs):
+    from .search import remove_search_documents
+    from .utils import ENTRY_TYPE_MAP
+
+    if not _deleting_user(origin):
+        # The user's documents cascade with them
+        remove_search_documents(ENTRY_TYPE_MAP[sender.__name__], [instance.pk])
+
+
+@receiver(post_save, sender=JournalFieldValue)
+@receiver(post_delete, sender=JournalFieldValue)
+def bump_version_for_field_value(sender, instance, raw=False, origin=None, **kwargs):
+    """
+    Values saved or deleted on their own (e.g. in the admin). Entry forms save
+    through save_field_values_for_entry, which bumps once per entry.
+    """
+    if raw or _deleting_user(origin) or isinstance(origin, JournalField):
+        # Values deleted with their field: remove_field_from_custom_data bumps once
+        return
+    if isinstance(origin, QuerySet) and origin.model is JournalFieldValue:
+        # Bulk deletes go through JournalFieldValue.purge, which bumps once per user
+        return
+    if sender.field.is_cached(instance):
+        user_id = instance.field.user_id
+    else:
+        user_id = JournalField.objects.filter(pk=instance.field_id).values_list('user_id', flat=True).first()
+    UserDataVersion.bump(user_id)
+
+
+@receiver(post_save, sender=JournalFieldValue)
+def sync_field_value_choices(sender, instance, raw=False, **kwargs):
+    """Keep multi-select choice rows current when a value is saved on its own (e.g. in the admin)"""
+    if not raw:
+        JournalFieldValueChoice.sync([instance])
+
+
+@receiver(post_delete, sender=JournalField)
+def remove_field_from_custom_data(sender, instance, origin=None, **kwargs):
+    """Drop a deleted custom field from the custom_data projection of the journal's entries"""
+    from .query_engine import JOURNAL_CONFIGS
+    from .search import refresh_search_documents
+    from .utils import remove_custom_data_key
+
+    if _deleting_user(origin) or instance.journal_type not in JOURNAL_CONFIGS:
+        return
+    UserDataVersion.bump(instance.user_id)
+    model = JOURNAL_CONFIGS[instance.journal_type].model
+    entries = model.objects.filter(user_id=instance.user_id)
+    entry_ids = list(entries.filter(custom_data__has_key=instance.name).values_list('pk', flat=True))
+    if entry_ids:
+        remove_custom_data_key(entries, instance.name)
+        refresh_search_documents(instance.journal_type, model.objects.filter(pk__in=entry_ids))
+
+
+@receiver(post_save, sender=JournalField)
+@receiver(post_delete, sender=JournalField)
+def bump_schema_for_field(sender, instance, raw=False, origin=None, **kwargs):
+    if not raw and not _deleting_user(origin):
+        UserDataVersion.bump_schema(instance.user_id)
+
+
+@receiver(post_save, sender=JournalFieldOption)
+@receiver(post_delete, sender=JournalFieldOption)
+def bump_schema_for_field_option(sender, instance, raw=False, origin=None, **kwargs):
+    if raw or _deleting_user(origin) or isinstance(origin, JournalField):
+        # Options deleted with their field: the field's own delete bumps the schema
+        return
+    user_id = JournalField.objects.filter(pk=instance.field_id).values_list('user_id', flat=True).first()
+    UserDataVersion.bump_schema(user_id)
+
+
+@receiver(m2m_changed, sender=AfterTradeEntry.strategy_tags.through)
+def bump_version_for_strategy_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            UserDataVersion.bump(instance.user_id)
+        return
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    # instance is a StrategyTag; find the owners of the affected entries
+    entries = instance.after_trade_entries.all() if action == 'pre_clear' else AfterTradeEntry.objects.filter(pk__in=pk_set or [])
+    for user_id in entries.order_by().values_list('user_id', flat=True).distinct():
+        UserDataVersion.bump(user_id)
@@ -0,0 +1,209 @@
+"""
+Typeahead suggestions for the search box
+
+A user's suggestions (pairs, strategy tags, custom field option labels and
+phrases from their recent notes) are gathered once into a SuggestIndex, an
+immutable sorted list of lower-cased keys answered by binary search. Each
+suggestion is keyed by its whole text and by every word start in it, so
+"usd" finds EUR/USD and "hunt" finds "stop hunt at open".
+
+Indexes are built lazily and kept in a bounded in-process LRU keyed by the
+user's data and schema versions: any journal write or custom field change
+bumps a version, so stale indexes are never hit again and age out.
+"""
+import heapq
+import re
+from bisect import bisect_left
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+
+from django.db.models import Count
+
+from .models import AfterTradeEntry, PreTradeEntry, BacktestEntry, UserDataVersion
+
+
+DEFAULT_SUGGESTIONS = 8
+MAX_SUGGESTIONS = 20
+# Users whose indexes are kept per process
+SUGGEST_INDEX_CACHE_SIZE = 128
+# Suggestion kinds, in the order they are listed
+SUGGESTION_KINDS = ('pair', 'tag', 'option', 'phrase')
+# Search qualifier that narrows suggestions to one kind (pair:eu, tag:br, cf.model:o)
+QUALIFIER_KINDS = {'pair': 'pair', 'tag': 'tag'}
+# Newest entries per journal whose notes are mined for phrases
+RECENT_NOTE_ENTRIES = 100
+NOTE_FIELDS = (
+    (AfterTradeEntry, 'observations'),
+    (PreTradeEntry, 'notes'),
+    (BacktestEntry, 'notes'),
+)
+# Words in a note phrase; longer clauses are not offered as a whole
+PHRASE_MIN_WORDS = 2
+PHRASE_MAX_WORDS = 6
+
+
+@dataclass(frozen=True)
+class Suggestion:
+    kind: str
+    label: str
+    # Search box text that selects it: pair:EUR/USD, tag:breakout, cf.model:ote, "stop hunt"
+    query: str
+    # Entries (or note occurrences) behind it; more is listed first
+    weight: int = 0
+
+    def as_dict(self):
+        return {'type': self.kind, 'label': self.label, 'query': self.query, 'weight': self.weight}
+
+
+def _quoted(value):
+    return f'"{value}"' if re.search(r'[\s"]', value) else value
+
+
+def _keys(text):
+    """Lower-cased keys of text: the whole text and every suffix starting at a word"""
+    text = ' '.join(text.lower().split())
+    keys = {text}
+    for match in re.finditer(r'(?<=[\W_])\w', text):
+        keys.add(text[match.start():])
+    keys.add(re.sub(r'[\W_]+', '', text))
+    keys.discard('')
+    return keys
+
+
+class SuggestIndex:
+    """Sorted (key, position) pairs over a tuple of suggestions"""
+
+    def __init__(self, suggestions):
+        self.suggestions = tuple(suggestions)
+        entries = sorted(
+            (key, position)
+            for position, suggestion in enumerate(self.suggestions)
+            for key in _keys(suggestion.label)
+        )
+        self.keys = tuple(key for key, _ in entries)
+        self.positions = tuple(position for _, position in entries)
+
+    def __len__(self):
+        return len(self.suggestions)
+
+    def lookup(self, prefix, limit=DEFAULT_SUGGESTIONS, kinds=SUGGESTION_KINDS, query_prefix=''):
+        """
+        Up to limit suggestions of each kind with a key starting with
+        prefix, heaviest first. query_prefix (lower case) keeps only suggestions
+        whose query starts with it, and allows an empty prefix.
+        """
+        prefix = ' '.join(prefix.lower().split())
+        if not prefix and not query_prefix:
+            return []
+        matched = set()
+        start = bisect_left(self.keys, prefix)
+        for index in range(start, len(self.keys)):
+            if not self.keys[index].startswith(prefix):
+                break
+            matched.add(self.positions[index])
+
+        by_kind = {kind: [] for kind in kinds}
+        for position in matched:
+            suggestion = self.suggestions[position]
+            if suggestion.kind in by_kind and suggestion.query.lower().startswith(query_prefix):
+                by_kind[suggestion.kind].append(suggestion)
+        results = []
+        for kind in kinds:
+            results.extend(heapq.nsmallest(limit, by_kind[kind], key=lambda s: (-s.weight, s.label.lower())))
+        return results
+
+
+def _pair_suggestions(user_id):
+    counts = Counter()
+    for model in (AfterTradeEntry, PreTradeEntry, BacktestEntry):
+        for row in model.objects.filter(user_id=user_id).values('pair').annotate(entries=Count('pk')).order_by():
+            counts[row['pair']] += row['entries']
+    return [Suggestion('pair', pair, f'pair:{_quoted(pair)}', weight) for pair, weight in counts.items() if pair]
+
+
+def _tag_suggestions(user_id):
+    through = AfterTradeEntry.strategy_tags.through
+    rows = through.objects.filter(aftertradeentry__user_id=user_id).values(
+        'strategytag__name'
+    ).annotate(entries=Count('pk')).order_by()
+    return [
+        Suggestion('tag', row['strategytag__name'], f"tag:{_quoted(row['strategytag__name'])}", row['entries'])
+        for row in rows
+    ]
+
+
+def _option_suggestions(user_id):
+    from .query_engine import CUSTOM_QUALIFIER_PREFIX, JOURNAL_CONFIGS
+    from .utils import get_user_journal_fields
+
+    suggestions = {}
+    for journal_type in JOURNAL_CONFIGS:
+        for field in get_user_journal_fields(user_id, journal_type):
+            for option in field.options.all():
+                query = f'{CUSTOM_QUALIFIER_PREFIX}{field.name}:{_quoted(option.value)}'
+                suggestions.setdefault(query, Suggestion('option', option.display_label, query))
+    return list(suggestions.values())
+
+
+def note_phrases(text):
+    """Short clauses of a note, lower-cased with whitespace collapsed"""
+    phrases = []
+    for clause in re.split(r'[.,;:!?()\n]+', text or ''):
+        words = clause.replace('"', ' ').lower().split()
+        if PHRASE_MIN_WORDS <= len(words) <= PHRASE_MAX_WORDS:
+            phrases.append(' '.join(words))
+    return phrases
+
+
+def _phrase_suggestions(user_id):
+    counts = Counter()
+    for model, field in NOTE_FIELDS:
+        notes = model.objects.filter(user_id=user_id).order_by('-date', '-pk').values_list(field, flat=True)
+        for note in notes[:RECENT_NOTE_ENTRIES]:
+            counts.update(set(note_phrases(note)))
+    return [
+        Suggestion('phrase', phrase, f'"{phrase}"', weight)
+        for phrase, weight in counts.items()
+    ]
+
+
+@lru_cache(maxsize=SUGGEST_INDEX_CACHE_SIZE)
+def _suggest_index(user_id, version, schema_version):
+    """The user's SuggestIndex (the versions only key the memo)"""
+    return SuggestIndex([
+        *_pair_suggestions(user_id),
+        *_tag_suggestions(user_id),
+        *_option_suggestions(user_id),
+        *_phrase_suggestions(user_id),
+    ])
+
+
+def get_suggest_index(user_id):
+    """The user's current SuggestIndex, built on first use after each data or schema change"""
+    versions = UserDataVersion.objects.filter(user_id=user_id).values_list('version', 'schema_version').first()
+    return _suggest_index(user_id, *(versions or (0, 0)))
+
+
+def suggest(user, query, limit=DEFAULT_SUGGESTIONS):
+    """
+    Suggestions for the word being typed. A qualifier prefix narrows the
+    kind: pair:eu only suggests pairs, cf.<field>: only option labels.
+    """
+    from .query_engine import CUSTOM_QUALIFIER_PREFIX
+
+    text = query.strip().lstrip('"')
+    kinds = SUGGESTION_KINDS
+    query_prefix = ''
+    qualifier = re.match(r'([A-Za-z_][\w.]*):', text)
+    if qualifier:
+        key = qualifier.group(1).lower()
+        if key in QUALIFIER_KINDS:
+            kinds = (QUALIFIER_KINDS[key],)
+        elif key.startswith(CUSTOM_QUALIFIER_PREFIX):
+            kinds = ('option',)
+        else:
+            return []
+        query_prefix = f'{key}:'
+        text = text[qualifier.end():].lstrip('"')
+    return get_suggest_index(getattr(user, 'pk', user)).lookup(text, limit, kinds, query_prefix)
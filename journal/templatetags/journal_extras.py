@@ -28,12 +28,9 @@ def get_field_errors(form, field_name):
 
 @register.simple_tag
 def get_entry_field_value(entry, field):
-    """Get the value for a specific custom field from an entry"""
-    from ..utils import get_field_value_for_entry
-    value_obj = get_field_value_for_entry(entry, field)
-    if value_obj:
-        return value_obj.get_value_display()
-    return ''
+    """Get the value for a specific custom field from an entry's custom_data projection (no query)"""
+    from ..utils import custom_data_display
+    return custom_data_display(entry, [field])[0]
 
 @register.filter(name='get_item')
 def get_item(dictionary, key):
@@ -60,6 +57,12 @@ def get_custom_filter_max(filters, field_name):
     key = f'custom_{field_name}_max'
     return filters.get(key, '') if filters else ''
 
+@register.simple_tag
+def get_custom_filter_match(filters, field_name):
+    """Get custom multi-select filter match mode ('any' or 'all') from filters dict"""
+    key = f'custom_{field_name}_match'
+    return filters.get(key, '') if filters else ''
+
 @register.filter
 def startswith(value, arg):
     """Check if a string starts with a given substring"""
@@ -87,5 +87,10 @@ urlpatterns = [
     # API Endpoints
     path('api/dropdown-choices/', api_views.api_dropdown_choices, name='api_dropdown_choices'),
     path('api/dropdown-choices/<str:category_name>/', api_views.api_dropdown_category, name='api_dropdown_category'),
+    path('api/dashboard/kpis/', api_views.api_dashboard_kpis, name='api_dashboard_kpis'),
+    path('api/dashboard/charts/', api_views.api_dashboard_charts, name='api_dashboard_charts'),
+    path('api/dashboard/recent/<str:journal_type>/', api_views.api_dashboard_recent, name='api_dashboard_recent'),
+    path('api/search/suggest/', api_views.api_search_suggest, name='api_search_suggest'),
+    path('api/instruments/search/', api_views.api_instrument_search, name='api_instrument_search'),
 ]
 
@@ -1,7 +1,7 @@
 """
 Utility functions for getting choice options from Configuration models
 """
-from django.db import models
+from django.db import models, transaction
 from django.db.models import Q
 from .models import ChoiceOption, ChoiceCategory
 
@@ -284,16 +284,40 @@ def apply_dynamic_categories_to_form(form, journal_type):
 
 # Dynamic Field System Utilities
 def get_user_journal_fields(user, journal_type):
-    """Get all active custom fields for a user's journal type"""
-    from .models import JournalField
-    return JournalField.objects.filter(
-        user=user,
-        journal_type=journal_type,
-        is_active=True
-    ).order_by('order', 'display_name')
-
-
-def search_entries_with_custom_fields(queryset, search_term, journal_type, user):
+    """
+    Get all active custom fields for a user's journal type
+    
+    Args:
+        user: User instance or user id
+        journal_type: 'after_trade', 'pre_trade', or 'backtest'
+        
+    Returns:
+        Tuple of JournalField instances with their options prefetched. The
+        snapshot is cached per user and schema version, which is bumped
+        whenever the user's fields or options change (see signals.py).
+    """
+    from django.conf import settings
+    from django.core.cache import cache
+    from django.db.models import Prefetch
+    from .models import JournalField, JournalFieldOption, UserDataVersion
+    
+    user_id = getattr(user, 'pk', user)
+    schema_version = UserDataVersion.get_schema_version(user_id)
+    cache_key = f'journal_schema:{user_id}:{journal_type}:{schema_version}'
+    fields = cache.get(cache_key)
+    if fields is None:
+        fields = tuple(JournalField.objects.filter(
+            user_id=user_id,
+            journal_type=journal_type,
+            is_active=True
+        ).order_by('order', 'display_name').prefetch_related(
+            Prefetch('options', queryset=JournalFieldOption.objects.order_by('order', 'display_label'))
+        ))
+        cache.set(cache_key, fields, settings.JOURNAL_CACHE_TIMEOUT)
+    return fields
+
+
+def search_entries_with_custom_fields(queryset, search_term, journal_type, user, fuzzy=False):
     """
     Search entries across system fields and all custom fields
     
@@ -302,59 +326,18 @@ def search_entries_with_custom_fields(queryset, search_term, journal_type, user)
         search_term: The search string
         journal_type: 'after_trade', 'pre_trade', or 'backtest'
         user: The user whose entries to search
+        fuzzy: Match similar words too (trigram similarity) instead of exact words
         
     Returns:
         Filtered queryset
     """
-    from .models import JournalFieldValue
+    from .search import filter_by_search
     
     if not search_term:
         return queryset
     
-    # Build Q object for system fields (varies by journal type)
-    system_q = Q()
-    
-    if journal_type == 'after_trade':
-        system_q = Q(
-            Q(pair__icontains=search_term) |
-            Q(outcome__icontains=search_term) |
-            Q(observations__icontains=search_term)
-        )
-    elif journal_type == 'pre_trade':
-        system_q = Q(
-            Q(pair__icontains=search_term) |
-            Q(bias__icontains=search_term) |
-            Q(notes__icontains=search_term)
-        )
-    elif journal_type == 'backtest':
-        system_q = Q(
-            Q(pair__icontains=search_term) |
-            Q(htf_bias__icontains=search_term) |
-            Q(notes__icontains=search_term)
-        )
-    
-    # Get custom fields for this journal type
-    custom_fields = get_user_journal_fields(user, journal_type)
-    
-    # Search in custom field values
-    matching_entry_ids = set()
-    if custom_fields:
-        entry_ids = list(queryset.values_list('id', flat=True))
-        if entry_ids:
-            # Search in all text-based custom fields
-            field_ids = list(custom_fields.values_list('id', flat=True))
-            matching_values = JournalFieldValue.objects.filter(
-                field_id__in=field_ids,
-                entry_id__in=entry_ids,
-                value_text__icontains=search_term
-            )
-            matching_entry_ids = set(matching_values.values_list('entry_id', flat=True))
-    
-    # Combine system and custom field searches
-    if matching_entry_ids:
-        return queryset.filter(system_q | Q(id__in=matching_entry_ids))
-    else:
-        return queryset.filter(system_q)
+    # One indexed lookup in the search documents, which include the custom field text
+    return filter_by_search(queryset, user, journal_type, search_term, fuzzy)
 
 
 def filter_entries_by_custom_field(queryset, field, filter_value, journal_type):
@@ -370,59 +353,28 @@ def filter_entries_by_custom_field(queryset, field, filter_value, journal_type):
     Returns:
         Filtered queryset
     """
-    from .models import JournalFieldValue
+    from .query_engine import JournalQueryEngine, CustomFieldFilter
     
     if not filter_value:
         return queryset
     
-    entry_ids = list(queryset.values_list('id', flat=True))
-    if not entry_ids:
-        return queryset.none()
-    
-    field_values = JournalFieldValue.objects.filter(
-        field=field,
-        entry_id__in=entry_ids
-    )
-    
-    if field.field_type == 'select':
-        # Exact match for select
-        field_values = field_values.filter(value_text=filter_value)
-    elif field.field_type == 'multi_select':
-        # Contains check for multi-select (stored as comma-separated or JSON)
-        field_values = field_values.filter(
-            Q(value_text__icontains=filter_value) |
-            Q(value_text__startswith=f"{filter_value},") |
-            Q(value_text__endswith=f",{filter_value}")
-        )
-    elif field.field_type == 'checkbox':
-        # Boolean match
-        bool_value = str(filter_value).lower() in ['true', '1', 'yes']
-        field_values = field_values.filter(value_boolean=bool_value)
-    elif field.field_type in ['number', 'decimal']:
-        # Numeric range - filter_value can be a single value or we use min/max
-        try:
-            num_value = float(filter_value)
-            field_values = field_values.filter(value_number=num_value)
-        except (ValueError, TypeError):
-            pass
-    elif field.field_type == 'date':
-        # Date range
-        field_values = field_values.filter(value_date=filter_value)
-    elif field.field_type in ['text', 'textarea']:
-        # Text contains
-        field_values = field_values.filter(value_text__icontains=filter_value)
-    
-    matching_entry_ids = list(field_values.values_list('entry_id', flat=True))
-    if matching_entry_ids:
-        return queryset.filter(id__in=matching_entry_ids)
+    engine = JournalQueryEngine(journal_type, field.user_id)
+    if isinstance(filter_value, (list, tuple)):
+        # Multi-select: entries having any of the options
+        custom_filter = CustomFieldFilter(field=field, values=list(filter_value))
     else:
-        return queryset.none()
+        custom_filter = CustomFieldFilter(field=field, value=filter_value)
+    return queryset.filter(engine.custom_field_q(custom_filter))
 
 
 def sort_entries_by_custom_field(queryset, field, order='asc', journal_type='after_trade'):
     """
     Sort entries by a custom field or system field
     
+    The custom field's typed value is annotated onto each entry through a
+    correlated subquery and sorted in the database, entries without a value
+    last, so the ordering survives pagination.
+    
     Args:
         queryset: The base queryset to sort
         field: JournalField instance (or None/empty string for system field)
@@ -432,62 +384,97 @@ def sort_entries_by_custom_field(queryset, field, order='asc', journal_type='aft
     Returns:
         Sorted queryset
     """
+    from django.db.models import F, OuterRef, Subquery, TextField, Value
+    from django.db.models.functions import Lower, NullIf
     from .models import JournalFieldValue
     
     if not field or field == '':
         # System field sorting
-        if journal_type == 'after_trade':
-            return queryset.order_by(f'-date' if order == 'desc' else 'date')
-        else:
-            return queryset.order_by(f'-date' if order == 'desc' else 'date')
+        return queryset.order_by(f'-date' if order == 'desc' else 'date')
     
-    # For custom fields, we'll sort in Python after fetching
-    # This is simpler and works for all field types
-    entry_ids = list(queryset.values_list('id', flat=True))
-    if not entry_ids:
-        return queryset
+    if field.field_type in ['number', 'decimal']:
+        sort_value = F('value_number')
+    elif field.field_type == 'date':
+        sort_value = F('value_date')
+    elif field.field_type == 'time':
+        sort_value = F('value_time')
+    elif field.field_type == 'datetime':
+        sort_value = F('value_datetime')
+    elif field.field_type == 'checkbox':
+        sort_value = F('value_boolean')
+    else:
+        # Case-insensitive, and blank text sorts with the missing values
+        sort_value = Lower(NullIf('value_text', Value('', output_field=TextField())))
     
-    # Get field values for sorting
-    field_values = JournalFieldValue.objects.filter(
-        field=field,
-        entry_id__in=entry_ids
-    )
-    
-    # Create mapping of entry_id -> sort value
-    sort_map = {}
-    for fv in field_values:
-        if field.field_type in ['number', 'decimal']:
-            sort_map[fv.entry_id] = fv.value_number or 0
-        elif field.field_type == 'date':
-            sort_map[fv.entry_id] = fv.value_date or ''
-        else:
-            sort_map[fv.entry_id] = (fv.value_text or '').lower()
+    field_value = JournalFieldValue.objects.filter(
+        entry_type=journal_type,
+        entry_id=OuterRef('pk'),
+        field=field
+    ).order_by().annotate(sort_value=sort_value).values('sort_value')[:1]
     
-    # Sort entry IDs by their values
-    sorted_ids = sorted(
-        entry_ids,
-        key=lambda eid: sort_map.get(eid, '' if field.field_type in ['text', 'textarea', 'select'] else 0),
-        reverse=(order == 'desc')
-    )
+    sort_key = F('custom_sort_value')
+    sort_key = sort_key.desc(nulls_last=True) if order == 'desc' else sort_key.asc(nulls_last=True)
+    return queryset.annotate(custom_sort_value=Subquery(field_value)).order_by(sort_key, '-date', '-id')
+
+
+ENTRY_TYPE_MAP = {
+    'AfterTradeEntry': 'after_trade',
+    'PreTradeEntry': 'pre_trade',
+    'BacktestEntry': 'backtest',
+}
+
+
+class CustomFieldValueMap:
+    """
+    Custom field values of a batch of entries, loaded in a single query.
     
-    # Preserve order using a Case/When expression would be complex
-    # Instead, return in the sorted order
-    # Note: This approach works but may not be the most efficient for large datasets
-    # For production, consider using database-level sorting with annotations
+    Build one per page (or per entry on detail/edit pages) and look values up
+    by (entry, field) instead of querying per cell.
+    """
     
-    # For now, return queryset ordered by ID (we'll handle custom sorting in view)
-    return queryset.filter(id__in=sorted_ids).order_by('id')
+    def __init__(self, journal_type, entry_ids, fields=None):
+        from .models import JournalFieldValue
+        
+        self.journal_type = journal_type
+        self._values = {}
+        entry_ids = list(entry_ids)
+        if not entry_ids:
+            return
+        values = JournalFieldValue.objects.filter(
+            entry_type=journal_type,
+            entry_id__in=entry_ids
+        ).select_related('field').order_by()
+        if fields is not None:
+            values = values.filter(field__in=fields)
+        for value_obj in values:
+            self._values[(value_obj.entry_id, value_obj.field_id)] = value_obj
+    
+    @classmethod
+    def for_entries(cls, entries, fields=None):
+        """Map for a list of entries of the same journal type"""
+        entries = list(entries)
+        if not entries:
+            return cls('', [])
+        journal_type = ENTRY_TYPE_MAP.get(entries[0].__class__.__name__, '')
+        return cls(journal_type, [entry.pk for entry in entries], fields)
+    
+    def get(self, entry, field):
+        """The JournalFieldValue of entry for field, or None"""
+        return self._values.get((entry.pk, field.pk))
+    
+    def display(self, entry, field):
+        value_obj = self.get(entry, field)
+        return value_obj.get_value_display() if value_obj else ''
+    
+    def values_for(self, entry, fields):
+        """{field: JournalFieldValue or None} in the order of fields"""
+        return {field: self.get(entry, field) for field in fields}
 
 
 def get_field_value_for_entry(entry, field):
     """Get the value for a specific field from an entry"""
     from .models import JournalFieldValue
-    entry_type_map = {
-        'AfterTradeEntry': 'after_trade',
-        'PreTradeEntry': 'pre_trade',
-        'BacktestEntry': 'backtest',
-    }
-    entry_type = entry_type_map.get(entry.__class__.__name__, '')
+    entry_type = ENTRY_TYPE_MAP.get(entry.__class__.__name__, '')
     
     try:
         value_obj = JournalFieldValue.objects.get(
@@ -502,50 +489,140 @@ def get_field_value_for_entry(entry, field):
 
 def get_all_field_values_for_entry(entry):
     """Get all custom field values for an entry"""
-    from .models import JournalField, JournalFieldValue
-    entry_type_map = {
-        'AfterTradeEntry': 'after_trade',
-        'PreTradeEntry': 'pre_trade',
-        'BacktestEntry': 'backtest',
-    }
-    entry_type = entry_type_map.get(entry.__class__.__name__, '')
+    entry_type = ENTRY_TYPE_MAP.get(entry.__class__.__name__, '')
     
-    fields = get_user_journal_fields(entry.user, entry_type)
-    values = {}
-    for field in fields:
-        value_obj = get_field_value_for_entry(entry, field)
-        values[field] = value_obj
-    return values
+    fields = get_user_journal_fields(entry.user_id, entry_type)
+    return CustomFieldValueMap.for_entries([entry], fields).values_for(entry, fields)
 
 
 def save_field_value_for_entry(entry, field, value):
-    """Save a field value for an entry"""
-    from .models import JournalFieldValue
+    """Save a field value for an entry and update the entry's custom_data projection"""
     try:
-        entry_type_map = {
-            'AfterTradeEntry': 'after_trade',
-            'PreTradeEntry': 'pre_trade',
-            'BacktestEntry': 'backtest',
-        }
-        entry_type = entry_type_map.get(entry.__class__.__name__, '')
-        
-        if not entry_type or not field:
+        if not field:
             return None
-        
-        value_obj, created = JournalFieldValue.objects.get_or_create(
-            entry_type=entry_type,
-            entry_id=entry.pk,
-            field=field,
-            defaults={}
-        )
-        value_obj.set_value(value)
-        value_obj.save()
-        return value_obj
+        saved = save_field_values_for_entry(entry, {field: value})
+        return saved[0] if saved else None
     except Exception as e:
         # Log error but don't break the form submission
         return None
 
 
+def save_field_values_for_entry(entry, values):
+    """
+    Save several custom field values of an entry at once
+    
+    Args:
+        entry: AfterTradeEntry, PreTradeEntry or BacktestEntry instance
+        values: Dict of {JournalField: value}, parsed like JournalFieldValue.set_value
+        
+    Returns:
+        List of the JournalFieldValue rows written
+    
+    One transaction of three statements: an INSERT ... ON CONFLICT DO UPDATE
+    of all rows, the custom_data UPDATE and the data version bump (bulk_create
+    sends no save signals). Multi-select values add the DELETE and INSERT of
+    their choice rows. The search document is refreshed too, once per
+    deferred_search_refresh block when one is open (entry forms).
+    """
+    from django.utils import timezone
+    from .models import JournalFieldValue, JournalFieldValueChoice, UserDataVersion
+    
+    entry_type = ENTRY_TYPE_MAP.get(entry.__class__.__name__, '')
+    if not entry_type or not values:
+        return []
+    
+    now = timezone.now()
+    value_objs = []
+    for field, value in values.items():
+        value_obj = JournalFieldValue(entry_type=entry_type, entry_id=entry.pk, field=field, created_at=now)
+        value_obj.set_value(value)
+        value_objs.append(value_obj)
+    
+    with transaction.atomic():
+        JournalFieldValue.objects.bulk_create(
+            value_objs,
+            update_conflicts=True,
+            unique_fields=['entry_type', 'entry_id', 'field'],
+            update_fields=[
+                'value_text', 'value_number', 'value_boolean', 'value_date', 'value_time', 'value_datetime', 'updated_at'
+            ],
+        )
+        JournalFieldValueChoice.sync(value_objs)
+        update_custom_data(entry, value_objs)
+        UserDataVersion.bump(entry.user_id)
+    return value_objs
+
+
+def update_custom_data(entry, value_objs):
+    """
+    Merge JournalFieldValues into entry.custom_data and write just that column.
+    
+    Uses a queryset update so entry save signals (rollups, streaks) don't fire
+    again; only the entry's search document is refreshed (see
+    search.deferred_search_refresh).
+    """
+    custom_data = dict(entry.custom_data or {})
+    for value_obj in value_objs:
+        projected = value_obj.get_projected_value()
+        if projected is None:
+            custom_data.pop(value_obj.field.name, None)
+        else:
+            custom_data[value_obj.field.name] = projected
+    if custom_data != entry.custom_data:
+        from .search import refresh_entry_search_document
+        entry.custom_data = custom_data
+        entry.__class__.objects.filter(pk=entry.pk).update(custom_data=custom_data)
+        refresh_entry_search_document(ENTRY_TYPE_MAP[entry.__class__.__name__], entry)
+    return custom_data
+
+
+def remove_custom_data_key(entries, name):
+    """
+    Drop name from the custom_data of entries without loading them one by one.
+
+    PostgreSQL removes the key in one UPDATE (jsonb - key); elsewhere the
+    entries are rewritten in chunks of 1000 with bulk_update.
+    """
+    from django.db import connection
+    from django.db.models import F, Func, JSONField, Value
+
+    entries = entries.filter(custom_data__has_key=name).order_by()
+    if connection.vendor == 'postgresql':
+        entries.update(custom_data=Func(
+            F('custom_data'), Value(name), template='%(expressions)s', arg_joiner=' - ', output_field=JSONField()
+        ))
+        return
+    chunk = []
+    for entry in entries.only('pk', 'custom_data').iterator(chunk_size=1000):
+        entry.custom_data.pop(name, None)
+        chunk.append(entry)
+        if len(chunk) == 1000:
+            entries.model.objects.bulk_update(chunk, ['custom_data'])
+            chunk = []
+    if chunk:
+        entries.model.objects.bulk_update(chunk, ['custom_data'])
+
+
+def custom_data_display(entry, fields):
+    """Display values of fields read from entry.custom_data, in field order (no query)"""
+    from .models import JournalFieldValue
+    custom_data = entry.custom_data or {}
+    return [
+        JournalFieldValue.display_projected_value(field.field_type, custom_data.get(field.name))
+        for field in fields
+    ]
+
+
+def build_custom_data(value_objs):
+    """custom_data of an entry rebuilt from all its JournalFieldValues (field must be loaded)"""
+    custom_data = {}
+    for value_obj in value_objs:
+        projected = value_obj.get_projected_value()
+        if projected is not None:
+            custom_data[value_obj.field.name] = projected
+    return custom_data
+
+
 def create_dynamic_form_field(field):
     """Create a Django form field from a JournalField"""
     from django import forms
@@ -592,7 +669,7 @@ def create_dynamic_form_field(field):
     elif field.field_type == 'select':
         try:
             # Use the 'options' related_name from JournalFieldOption model
-            choices = [(opt.value, opt.display_label) for opt in field.options.all().order_by('order')]
+            choices = [(opt.value, opt.display_label) for opt in field.options.all()]
         except (AttributeError, Exception) as e:
             # Fallback if relationship doesn't exist or error occurs
             choices = []
@@ -606,7 +683,7 @@ def create_dynamic_form_field(field):
     elif field.field_type == 'multiselect':
         try:
             # Use the 'options' related_name from JournalFieldOption model
-            choices = [(opt.value, opt.display_label) for opt in field.options.all().order_by('order')]
+            choices = [(opt.value, opt.display_label) for opt in field.options.all()]
         except (AttributeError, Exception) as e:
             # Fallback if relationship doesn't exist or error occurs
             choices = []
@@ -618,8 +695,9 @@ def create_dynamic_form_field(field):
             **field_kwargs
         )
     elif field.field_type == 'checkbox':
+        # Unticked is a valid answer, so a checkbox is never required
+        field_kwargs['required'] = False
         return forms.BooleanField(
-            required=False,
             widget=forms.CheckboxInput(attrs={'class': 'form-check-input'}),
             **field_kwargs
         )
@@ -3,8 +3,9 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
 from django.contrib import messages
 from django.http import JsonResponse, HttpResponse
-from django.db.models import Q, Count, Avg, Sum, Case, When, IntegerField, Max
+from django.db.models import Q, Count, Sum, Case, When, IntegerField, Max
 from django.utils import timezone
+from django.utils.functional import SimpleLazyObject
 from django.core.paginator import Paginator
 from django.conf import settings
 from datetime import datetime, timedelta
@@ -34,322 +35,119 @@ def register(request):
     return render(request, 'journal/register.html', {'form': form})
 
 
+def _fragment_cache_context(user):
+    """
+    Context shared by templates that cache KPI fragments.
+    
+    Fragments are keyed by the user's data version, which every journal write
+    bumps, so a cached block is only ever served for unchanged data.
+    """
+    from .models import UserDataVersion
+    return {
+        'data_version': UserDataVersion.get_version(user.pk),
+        'cache_timeout': settings.JOURNAL_CACHE_TIMEOUT,
+        'cache_day': timezone.now().date().isoformat(),
+    }
+
+
 @login_required
 def dashboard(request):
-    """Dashboard view with KPIs and charts"""
-    # Get user's entries
-    after_trades = AfterTradeEntry.objects.filter(user=request.user)
-    
-    # Calculate KPIs
-    total_entries = after_trades.count()
-    total_trades = after_trades.count()
-    wins = after_trades.filter(outcome='win').count()
-    win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
-    
-    # Correct bias percentage
-    correct_bias = after_trades.filter(predicted_directional_bias='correct').count()
-    correct_bias_pct = (correct_bias / total_trades * 100) if total_trades > 0 else 0
-    
-    # Avg POI score
-    avg_poi_score = after_trades.aggregate(Avg('poi_quality_score'))['poi_quality_score__avg'] or 0
-    
-    # Current streak
-    recent_trades = after_trades.order_by('-date', '-time_of_entry')[:10]
-    current_streak = 0
-    streak_abs = 0
-    streak_type = ''
-    if recent_trades:
-        first_outcome = recent_trades[0].outcome
-        for trade in recent_trades:
-            if trade.outcome == first_outcome:
-                current_streak += 1
-            else:
-                break
-        streak_abs = abs(current_streak)
-        if first_outcome == 'loss':
-            streak_type = 'loss'
-        else:
-            streak_type = 'win'
-    
-    # Last 7 days win rate
-    week_ago = timezone.now().date() - timedelta(days=7)
-    week_trades = after_trades.filter(date__gte=week_ago)
-    week_wins = week_trades.filter(outcome='win').count()
-    week_win_rate = (week_wins / week_trades.count() * 100) if week_trades.count() > 0 else 0
-    
-    # Chart data (simplified) - ensure JSON serializable
-    chart_data = {
-        'win_rate_weeks': ['Week 1', 'Week 2', 'Week 3', 'Week 4'],
-        'win_rate_values': [float(win_rate)] * 4,
-        'market_conditions': ['Trending Up', 'Trending Down', 'Consolidating'],
-        'market_condition_counts': [
-            int(after_trades.filter(market_condition='Trending Up').count()),
-            int(after_trades.filter(market_condition='Trending Down').count()),
-            int(after_trades.filter(market_condition='Consolidating').count()),
-        ],
-        'poi_months': ['Jan', 'Feb', 'Mar'],
-        'poi_avg_scores': [float(avg_poi_score)] * 3,
-    }
-    
-    # Recent entries
-    recent_after = after_trades.order_by('-date')[:5]
-    recent_pre = PreTradeEntry.objects.filter(user=request.user).order_by('-date')[:5]
-    recent_backtest = BacktestEntry.objects.filter(user=request.user).order_by('-date')[:5]
+    """
+    Dashboard shell with KPIs and charts.
+    
+    Only the layout is rendered here; every widget loads its data from its own
+    /api/dashboard/... endpoint, fetched in parallel by the browser.
+    """
+    return render(request, 'journal/dashboard.html')
+
+
+def _journal_list(request, journal_type, template_name):
+    """
+    Shared list view for the three journals.
+    
+    Filters, search and sort are compiled by JournalQueryEngine into a single
+    query; see journal/query_engine.py for the supported parameters.
+    """
+    from .query_engine import JournalQueryEngine
+    
+    engine = JournalQueryEngine(journal_type, request.user)
+    spec = engine.parse(request.GET)
+    entries = engine.queryset(spec)
+    
+    # Pagination - keyset (cursor) pages when opted in and the sort allows it
+    keyset = None
+    if request.GET.get('paginate', settings.JOURNAL_LIST_PAGINATION) == 'cursor':
+        keyset = engine.keyset(spec.sort)
+    if keyset:
+        from .pagination import CursorPaginator, cached_count
+        count_key = sorted(
+            (key, value) for key, value in request.GET.lists()
+            if key not in ('cursor', 'page', 'sort', 'paginate')
+        )
+        paginator = CursorPaginator(
+            entries, keyset, 20,
+            count=lambda: cached_count(entries, request.user.pk, journal_type, count_key)
+        )
+        page_obj = paginator.get_page(request.GET.get('cursor'))
+    else:
+        paginator = Paginator(entries, 20)
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
     
     context = {
-        'total_entries': total_entries,
-        'total_trades': total_trades,
-        'win_rate': round(win_rate, 1),
-        'correct_bias_pct': round(correct_bias_pct, 1),
-        'avg_poi_score': round(avg_poi_score, 1),
-        'streak_abs': streak_abs,
-        'streak_type': streak_type,
-        'week_win_rate': round(week_win_rate, 1),
-        'chart_data': chart_data,
-        'recent_after': recent_after,
-        'recent_pre': recent_pre,
-        'recent_backtest': recent_backtest,
+        'page_obj': page_obj,
+        'filters': spec.as_context(engine.config),
+        'custom_fields': engine.custom_fields,
+        'unique_pairs': engine.unique_pairs(),
+        'total_results': paginator.count,
     }
-    
-    return render(request, 'journal/dashboard.html', context)
+    return render(request, template_name, context)
 
 
 # After Trade Views
 @login_required
 def after_trade_list(request):
     """List after trade entries with advanced filtering, search, and sorting"""
-    from .utils import get_user_journal_fields, search_entries_with_custom_fields, filter_entries_by_custom_field
-    from .models import JournalFieldValue
-    from datetime import datetime
-    
-    entries = AfterTradeEntry.objects.filter(user=request.user)
-    
-    # Get custom fields for this journal type
-    custom_fields = get_user_journal_fields(request.user, 'after_trade')
-    
-    # Search
-    search = request.GET.get('search', '').strip()
-    if search:
-        entries = search_entries_with_custom_fields(entries, search, 'after_trade', request.user)
-    
-    # System field filters
-    pair_filter = request.GET.get('pair', '').strip()
-    if pair_filter:
-        entries = entries.filter(pair__icontains=pair_filter)
-    
-    outcome_filter = request.GET.get('outcome', '').strip()
-    if outcome_filter:
-        entries = entries.filter(outcome=outcome_filter)
-    
-    date_from = request.GET.get('date_from', '').strip()
-    if date_from:
-        try:
-            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
-            entries = entries.filter(date__gte=date_from_obj)
-        except ValueError:
-            pass
-    
-    date_to = request.GET.get('date_to', '').strip()
-    if date_to:
-        try:
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
-            entries = entries.filter(date__lte=date_to_obj)
-        except ValueError:
-            pass
-    
-    # Custom field filters
-    for field in custom_fields:
-        field_name = f'custom_{field.name}'
-        filter_value = request.GET.get(field_name, '').strip()
-        
-        if filter_value:
-            if field.field_type in ['select', 'multi_select']:
-                entries = filter_entries_by_custom_field(entries, field, filter_value, 'after_trade')
-            elif field.field_type in ['number', 'decimal']:
-                min_val = request.GET.get(f'{field_name}_min', '').strip()
-                max_val = request.GET.get(f'{field_name}_max', '').strip()
-                if min_val or max_val:
-                    entry_ids = list(entries.values_list('id', flat=True))
-                    if entry_ids:
-                        field_values = JournalFieldValue.objects.filter(
-                            field=field,
-                            entry_id__in=entry_ids
-                        )
-                        if min_val:
-                            try:
-                                field_values = field_values.filter(value_number__gte=float(min_val))
-                            except (ValueError, TypeError):
-                                pass
-                        if max_val:
-                            try:
-                                field_values = field_values.filter(value_number__lte=float(max_val))
-                            except (ValueError, TypeError):
-                                pass
-                        matching_ids = list(field_values.values_list('entry_id', flat=True))
-                        if matching_ids:
-                            entries = entries.filter(id__in=matching_ids)
-                        else:
-                            entries = entries.none()
-            elif field.field_type == 'date':
-                date_min = request.GET.get(f'{field_name}_min', '').strip()
-                date_max = request.GET.get(f'{field_name}_max', '').strip()
-                if date_min or date_max:
-                    entry_ids = list(entries.values_list('id', flat=True))
-                    if entry_ids:
-                        field_values = JournalFieldValue.objects.filter(
-                            field=field,
-                            entry_id__in=entry_ids
-                        )
-                        if date_min:
-                            try:
-                                date_min_obj = datetime.strptime(date_min, '%Y-%m-%d').date()
-                                field_values = field_values.filter(value_date__gte=date_min_obj)
-                            except (ValueError, TypeError):
-                                pass
-                        if date_max:
-                            try:
-                                date_max_obj = datetime.strptime(date_max, '%Y-%m-%d').date()
-                                field_values = field_values.filter(value_date__lte=date_max_obj)
-                            except (ValueError, TypeError):
-                                pass
-                        matching_ids = list(field_values.values_list('entry_id', flat=True))
-                        if matching_ids:
-                            entries = entries.filter(id__in=matching_ids)
-                        else:
-                            entries = entries.none()
-            elif field.field_type == 'checkbox':
-                if filter_value.lower() in ['true', '1', 'yes']:
-                    entry_ids = list(entries.values_list('id', flat=True))
-                    if entry_ids:
-                        matching_ids = list(JournalFieldValue.objects.filter(
-                            field=field,
-                            entry_id__in=entry_ids,
-                            value_boolean=True
-                        ).values_list('entry_id', flat=True))
-                        entries = entries.filter(id__in=matching_ids)
-    
-    # Sorting
-    sort_by = request.GET.get('sort', 'date_desc').strip()
-    sort_field = None
-    sort_order = 'desc'
-    
-    if sort_by:
-        if '_' in sort_by:
-            sort_field_name, sort_order = sort_by.rsplit('_', 1)
-        else:
-            sort_field_name = sort_by
-            sort_order = 'desc'
-        
-        if sort_field_name == 'date':
-            entries = entries.order_by(f'-date' if sort_order == 'desc' else 'date')
-        elif sort_field_name == 'pair':
-            entries = entries.order_by(f'-pair' if sort_order == 'desc' else 'pair')
-        elif sort_field_name == 'outcome':
-            entries = entries.order_by(f'-outcome' if sort_order == 'desc' else 'outcome')
-        elif sort_field_name.startswith('custom_'):
-            # Custom field sorting
-            field_name = sort_field_name.replace('custom_', '')
-            try:
-                field = custom_fields.get(name=field_name)
-                if field and field.field_type in ['text', 'textarea', 'select', 'number', 'decimal', 'date']:
-                    entry_ids = list(entries.values_list('id', flat=True))
-                    if entry_ids:
-                        field_values = JournalFieldValue.objects.filter(
-                            field=field,
-                            entry_id__in=entry_ids
-                        )
-                        if field.field_type in ['number', 'decimal']:
-                            sorted_values = field_values.order_by(f'-value_number' if sort_order == 'desc' else 'value_number')
-                        elif field.field_type == 'date':
-                            sorted_values = field_values.order_by(f'-value_date' if sort_order == 'desc' else 'value_date')
-                        else:
-                            sorted_values = field_values.order_by(f'-value_text' if sort_order == 'desc' else 'value_text')
-                        sorted_ids = list(sorted_values.values_list('entry_id', flat=True))
-                        # Preserve order by creating a mapping
-                        id_order = {eid: idx for idx, eid in enumerate(sorted_ids)}
-                        entries_list = list(entries)
-                        entries_list.sort(key=lambda e: id_order.get(e.id, 999999))
-                        # Convert back to queryset (this is a limitation, but works for pagination)
-                        entries = entries.filter(id__in=sorted_ids)
-            except Exception:
-                pass
-    
-    # Get unique pairs for filter dropdown
-    unique_pairs = sorted(set(AfterTradeEntry.objects.filter(user=request.user).values_list('pair', flat=True).distinct()))
-    
-    # Pagination
-    paginator = Paginator(entries, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # Build filter context
-    filters = {
-        'search': search,
-        'pair': pair_filter,
-        'outcome': outcome_filter,
-        'date_from': date_from,
-        'date_to': date_to,
-        'sort': sort_by,
-    }
-    
-    # Add custom field filter values
-    for field in custom_fields:
-        field_name = f'custom_{field.name}'
-        filters[field_name] = request.GET.get(field_name, '').strip()
-        if field.field_type in ['number', 'decimal', 'date']:
-            filters[f'{field_name}_min'] = request.GET.get(f'{field_name}_min', '').strip()
-            filters[f'{field_name}_max'] = request.GET.get(f'{field_name}_max', '').strip()
-    
-    context = {
-        'page_obj': page_obj,
-        'filters': filters,
-        'custom_fields': custom_fields,
-        'unique_pairs': unique_pairs,
-        'total_results': paginator.count,
-    }
-    return render(request, 'journal/after_trade_list.html', context)
+    return _journal_list(request, 'after_trade', 'journal/after_trade_list.html')
 
 
 @login_required
 def after_trade_create(request):
     """Create after trade entry"""
     from .forms import AfterTradeEntryForm
-    from .utils import save_field_value_for_entry, get_user_journal_fields
+    from .search import deferred_search_refresh
+    from .utils import save_field_values_for_entry
     
     if request.method == 'POST':
-        form = AfterTradeEntryForm(request.POST, request.FILES, user=request.user)
+        form = AfterTradeEntryForm.for_user(request.user)(request.POST, request.FILES)
         if form.is_valid():
-            entry = form.save(commit=False)
-            entry.user = request.user
-            entry.save()
-            form.save_m2m()  # Save many-to-many relationships
+            with deferred_search_refresh():
+                entry = form.save(commit=False)
+                entry.user = request.user
+                entry.save()
+                form.save_m2m()  # Save many-to-many relationships
             
-            # Save custom field values
-            try:
-                custom_fields = get_user_journal_fields(request.user, 'after_trade')
-                for field in custom_fields:
-                    field_key = f'custom_{field.name}'
-                    if field_key in form.cleaned_data:
-                        value = form.cleaned_data[field_key]
-                        try:
-                            save_field_value_for_entry(entry, field, value)
-                        except Exception as e:
-                            # Continue even if one field fails to save
-                            pass
-            except Exception as e:
-                # Continue even if custom fields can't be saved
-                pass
-            
-            # Auto-generate AI summary
-            try:
-                from .services import TradeSummaryGenerator
-                TradeSummaryGenerator.generate_and_save_summary(entry)
-                messages.success(request, 'After Trade entry created successfully! AI summary generated.')
-            except Exception as e:
-                messages.success(request, 'After Trade entry created successfully!')
+                # Save custom field values
+                try:
+                    save_field_values_for_entry(entry, {
+                        field: form.cleaned_data[f'custom_{field.name}']
+                        for field in form.custom_fields
+                        if f'custom_{field.name}' in form.cleaned_data
+                    })
+                except Exception as e:
+                    # Continue even if custom fields can't be saved
+                    pass
+                
+                # Auto-generate AI summary
+                try:
+                    from .services import TradeSummaryGenerator
+                    TradeSummaryGenerator.generate_and_save_summary(entry)
+                    messages.success(request, 'After Trade entry created successfully! AI summary generated.')
+                except Exception as e:
+                    messages.success(request, 'After Trade entry created successfully!')
             return redirect('after_trade_detail', pk=entry.pk)
     else:
-        form = AfterTradeEntryForm(user=request.user)
+        form = AfterTradeEntryForm.for_user(request.user)()
     return render(request, 'journal/after_trade_form.html', {
         'form': form,
         'action': 'Create'
@@ -379,35 +177,31 @@ def after_trade_detail(request, pk):
 def after_trade_edit(request, pk):
     """Edit after trade entry"""
     from .forms import AfterTradeEntryForm
-    from .utils import save_field_value_for_entry, get_user_journal_fields
+    from .search import deferred_search_refresh
+    from .utils import save_field_values_for_entry
     entry = get_object_or_404(AfterTradeEntry, pk=pk, user=request.user)
     
     if request.method == 'POST':
-        form = AfterTradeEntryForm(request.POST, request.FILES, instance=entry, user=request.user)
+        form = AfterTradeEntryForm.for_user(request.user)(request.POST, request.FILES, instance=entry)
         if form.is_valid():
-            entry = form.save()
-            form.save_m2m()
+            with deferred_search_refresh():
+                entry = form.save()
             
-            # Save custom field values
-            try:
-                custom_fields = get_user_journal_fields(request.user, 'after_trade')
-                for field in custom_fields:
-                    field_key = f'custom_{field.name}'
-                    if field_key in form.cleaned_data:
-                        value = form.cleaned_data[field_key]
-                        try:
-                            save_field_value_for_entry(entry, field, value)
-                        except Exception as e:
-                            # Continue even if one field fails to save
-                            pass
-            except Exception as e:
-                # Continue even if custom fields can't be saved
-                pass
+                # Save custom field values
+                try:
+                    save_field_values_for_entry(entry, {
+                        field: form.cleaned_data[f'custom_{field.name}']
+                        for field in form.custom_fields
+                        if f'custom_{field.name}' in form.cleaned_data
+                    })
+                except Exception as e:
+                    # Continue even if custom fields can't be saved
+                    pass
             
             messages.success(request, 'Entry updated successfully!')
             return redirect('after_trade_detail', pk=entry.pk)
     else:
-        form = AfterTradeEntryForm(instance=entry, user=request.user)
+        form = AfterTradeEntryForm.for_user(request.user)(instance=entry)
     return render(request, 'journal/after_trade_form.html', {
         'form': form,
         'entry': entry,
@@ -439,13 +233,18 @@ def regenerate_summary(request, pk):
 @login_required
 def after_trade_export_csv(request):
     """Export after trade entries to CSV"""
+    from .utils import get_user_journal_fields, custom_data_display
+    
     entries = AfterTradeEntry.objects.filter(user=request.user)
     
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="after_trade_entries.csv"'
     
+    # Custom field columns come from each entry's custom_data, so no extra queries
+    custom_fields = list(get_user_journal_fields(request.user, 'after_trade'))
+    
     writer = csv.writer(response)
-    writer.writerow(['Date', 'Pair', 'Session', 'Bias', 'Outcome', 'POI Score', 'RR Ratio', 'Risk %', 'Observations'])
+    writer.writerow(['Date', 'Pair', 'Session', 'Bias', 'Outcome', 'POI Score', 'RR Ratio', 'Risk %', 'Observations'] + [field.display_name for field in custom_fields])
     
     for entry in entries:
         writer.writerow([
@@ -458,7 +257,7 @@ def after_trade_export_csv(request):
             entry.rr_ratio or '',
             entry.risk_percentage,
             entry.observations[:100]  # Truncate long observations
-        ])
+        ] + custom_data_display(entry, custom_fields))
     
     return response
 
@@ -467,201 +266,39 @@ def after_trade_export_csv(request):
 @login_required
 def pre_trade_list(request):
     """List pre trade entries with advanced filtering, search, and sorting"""
-    from .utils import get_user_journal_fields, search_entries_with_custom_fields, filter_entries_by_custom_field
-    from .models import JournalFieldValue
-    from datetime import datetime
-    
-    entries = PreTradeEntry.objects.filter(user=request.user)
-    
-    # Get custom fields for this journal type
-    custom_fields = get_user_journal_fields(request.user, 'pre_trade')
-    
-    # Search
-    search = request.GET.get('search', '').strip()
-    if search:
-        entries = search_entries_with_custom_fields(entries, search, 'pre_trade', request.user)
-    
-    # System field filters
-    pair_filter = request.GET.get('pair', '').strip()
-    if pair_filter:
-        entries = entries.filter(pair__icontains=pair_filter)
-    
-    bias_filter = request.GET.get('bias', '').strip()
-    if bias_filter:
-        entries = entries.filter(bias=bias_filter)
-    
-    date_from = request.GET.get('date_from', '').strip()
-    if date_from:
-        try:
-            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
-            entries = entries.filter(date__gte=date_from_obj)
-        except ValueError:
-            pass
-    
-    date_to = request.GET.get('date_to', '').strip()
-    if date_to:
-        try:
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
-            entries = entries.filter(date__lte=date_to_obj)
-        except ValueError:
-            pass
-    
-    # Custom field filters (same logic as after_trade_list)
-    for field in custom_fields:
-        field_name = f'custom_{field.name}'
-        filter_value = request.GET.get(field_name, '').strip()
-        
-        if filter_value:
-            if field.field_type in ['select', 'multi_select']:
-                entries = filter_entries_by_custom_field(entries, field, filter_value, 'pre_trade')
-            elif field.field_type in ['number', 'decimal']:
-                min_val = request.GET.get(f'{field_name}_min', '').strip()
-                max_val = request.GET.get(f'{field_name}_max', '').strip()
-                if min_val or max_val:
-                    entry_ids = list(entries.values_list('id', flat=True))
-                    if entry_ids:
-                        field_values = JournalFieldValue.objects.filter(
-                            field=field,
-                            entry_id__in=entry_ids
-                        )
-                        if min_val:
-                            try:
-                                field_values = field_values.filter(value_number__gte=float(min_val))
-                            except (ValueError, TypeError):
-                                pass
-                        if max_val:
-                            try:
-                                field_values = field_values.filter(value_number__lte=float(max_val))
-                            except (ValueError, TypeError):
-                                pass
-                        matching_ids = list(field_values.values_list('entry_id', flat=True))
-                        if matching_ids:
-                            entries = entries.filter(id__in=matching_ids)
-                        else:
-                            entries = entries.none()
-            elif field.field_type == 'date':
-                date_min = request.GET.get(f'{field_name}_min', '').strip()
-                date_max = request.GET.get(f'{field_name}_max', '').strip()
-                if date_min or date_max:
-                    entry_ids = list(entries.values_list('id', flat=True))
-                    if entry_ids:
-                        field_values = JournalFieldValue.objects.filter(
-                            field=field,
-                            entry_id__in=entry_ids
-                        )
-                        if date_min:
-                            try:
-                                date_min_obj = datetime.strptime(date_min, '%Y-%m-%d').date()
-                                field_values = field_values.filter(value_date__gte=date_min_obj)
-                            except (ValueError, TypeError):
-                                pass
-                        if date_max:
-                            try:
-                                date_max_obj = datetime.strptime(date_max, '%Y-%m-%d').date()
-                                field_values = field_values.filter(value_date__lte=date_max_obj)
-                            except (ValueError, TypeError):
-                                pass
-                        matching_ids = list(field_values.values_list('entry_id', flat=True))
-                        if matching_ids:
-                            entries = entries.filter(id__in=matching_ids)
-                        else:
-                            entries = entries.none()
-            elif field.field_type == 'checkbox':
-                if filter_value.lower() in ['true', '1', 'yes']:
-                    entry_ids = list(entries.values_list('id', flat=True))
-                    if entry_ids:
-                        matching_ids = list(JournalFieldValue.objects.filter(
-                            field=field,
-                            entry_id__in=entry_ids,
-                            value_boolean=True
-                        ).values_list('entry_id', flat=True))
-                        entries = entries.filter(id__in=matching_ids)
-    
-    # Sorting
-    sort_by = request.GET.get('sort', 'date_desc').strip()
-    if sort_by:
-        if '_' in sort_by:
-            sort_field_name, sort_order = sort_by.rsplit('_', 1)
-        else:
-            sort_field_name = sort_by
-            sort_order = 'desc'
-        
-        if sort_field_name == 'date':
-            entries = entries.order_by(f'-date' if sort_order == 'desc' else 'date')
-        elif sort_field_name == 'pair':
-            entries = entries.order_by(f'-pair' if sort_order == 'desc' else 'pair')
-        elif sort_field_name == 'bias':
-            entries = entries.order_by(f'-bias' if sort_order == 'desc' else 'bias')
-    
-    # Get unique pairs for filter dropdown
-    unique_pairs = sorted(set(PreTradeEntry.objects.filter(user=request.user).values_list('pair', flat=True).distinct()))
-    
-    # Pagination
-    paginator = Paginator(entries, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # Build filter context
-    filters = {
-        'search': search,
-        'pair': pair_filter,
-        'bias': bias_filter,
-        'date_from': date_from,
-        'date_to': date_to,
-        'sort': sort_by,
-    }
-    
-    # Add custom field filter values
-    for field in custom_fields:
-        field_name = f'custom_{field.name}'
-        filters[field_name] = request.GET.get(field_name, '').strip()
-        if field.field_type in ['number', 'decimal', 'date']:
-            filters[f'{field_name}_min'] = request.GET.get(f'{field_name}_min', '').strip()
-            filters[f'{field_name}_max'] = request.GET.get(f'{field_name}_max', '').strip()
-    
-    context = {
-        'page_obj': page_obj,
-        'filters': filters,
-        'custom_fields': custom_fields,
-        'unique_pairs': unique_pairs,
-        'total_results': paginator.count,
-    }
-    return render(request, 'journal/pre_trade_list.html', context)
+    return _journal_list(request, 'pre_trade', 'journal/pre_trade_list.html')
 
 
 @login_required
 def pre_trade_create(request):
     """Create pre trade entry"""
     from .forms import PreTradeEntryForm
-    from .utils import save_field_value_for_entry, get_user_journal_fields
+    from .search import deferred_search_refresh
+    from .utils import save_field_values_for_entry
     
     if request.method == 'POST':
-        form = PreTradeEntryForm(request.POST, request.FILES, user=request.user)
+        form = PreTradeEntryForm.for_user(request.user)(request.POST, request.FILES)
         if form.is_valid():
-            entry = form.save(commit=False)
-            entry.user = request.user
-            entry.save()
+            with deferred_search_refresh():
+                entry = form.save(commit=False)
+                entry.user = request.user
+                entry.save()
             
-            # Save custom field values
-            try:
-                custom_fields = get_user_journal_fields(request.user, 'pre_trade')
-                for field in custom_fields:
-                    field_key = f'custom_{field.name}'
-                    if field_key in form.cleaned_data:
-                        value = form.cleaned_data[field_key]
-                        try:
-                            save_field_value_for_entry(entry, field, value)
-                        except Exception as e:
-                            # Continue even if one field fails to save
-                            pass
-            except Exception as e:
-                # Continue even if custom fields can't be saved
-                pass
+                # Save custom field values
+                try:
+                    save_field_values_for_entry(entry, {
+                        field: form.cleaned_data[f'custom_{field.name}']
+                        for field in form.custom_fields
+                        if f'custom_{field.name}' in form.cleaned_data
+                    })
+                except Exception as e:
+                    # Continue even if custom fields can't be saved
+                    pass
             
             messages.success(request, 'Pre Trade entry created successfully!')
             return redirect('pre_trade_detail', pk=entry.pk)
     else:
-        form = PreTradeEntryForm(user=request.user)
+        form = PreTradeEntryForm.for_user(request.user)()
     return render(request, 'journal/pre_trade_form.html', {
         'form': form,
         'action': 'Create'
@@ -685,34 +322,31 @@ def pre_trade_detail(request, pk):
 def pre_trade_edit(request, pk):
     """Edit pre trade entry"""
     from .forms import PreTradeEntryForm
-    from .utils import save_field_value_for_entry, get_user_journal_fields
+    from .search import deferred_search_refresh
+    from .utils import save_field_values_for_entry
     entry = get_object_or_404(PreTradeEntry, pk=pk, user=request.user)
     
     if request.method == 'POST':
-        form = PreTradeEntryForm(request.POST, request.FILES, instance=entry, user=request.user)
+        form = PreTradeEntryForm.for_user(request.user)(request.POST, request.FILES, instance=entry)
         if form.is_valid():
-            entry = form.save()
+            with deferred_search_refresh():
+                entry = form.save()
             
-            # Save custom field values
-            try:
-                custom_fields = get_user_journal_fields(request.user, 'pre_trade')
-                for field in custom_fields:
-                    field_key = f'custom_{field.name}'
-                    if field_key in form.cleaned_data:
-                        value = form.cleaned_data[field_key]
-                        try:
-                            save_field_value_for_entry(entry, field, value)
-                        except Exception as e:
-                            # Continue even if one field fails to save
-                            pass
-            except Exception as e:
-                # Continue even if custom fields can't be saved
-                pass
+                # Save custom field values
+                try:
+                    save_field_values_for_entry(entry, {
+                        field: form.cleaned_data[f'custom_{field.name}']
+                        for field in form.custom_fields
+                        if f'custom_{field.name}' in form.cleaned_data
+                    })
+                except Exception as e:
+                    # Continue even if custom fields can't be saved
+                    pass
             
             messages.success(request, 'Entry updated successfully!')
             return redirect('pre_trade_detail', pk=entry.pk)
     else:
-        form = PreTradeEntryForm(instance=entry, user=request.user)
+        form = PreTradeEntryForm.for_user(request.user)(instance=entry)
     return render(request, 'journal/pre_trade_form.html', {
         'form': form,
         'entry': entry,
@@ -734,13 +368,18 @@ def pre_trade_delete(request, pk):
 @login_required
 def pre_trade_export_csv(request):
     """Export pre trade entries to CSV"""
+    from .utils import get_user_journal_fields, custom_data_display
+    
     entries = PreTradeEntry.objects.filter(user=request.user)
     
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="pre_trade_entries.csv"'
     
+    # Custom field columns come from each entry's custom_data, so no extra queries
+    custom_fields = list(get_user_journal_fields(request.user, 'pre_trade'))
+    
     writer = csv.writer(response)
-    writer.writerow(['Date', 'Pair', 'Bias', 'Trade Taken', 'All Conditions Met', 'Notes'])
+    writer.writerow(['Date', 'Pair', 'Bias', 'Trade Taken', 'All Conditions Met', 'Notes'] + [field.display_name for field in custom_fields])
     
     for entry in entries:
         writer.writerow([
@@ -750,7 +389,7 @@ def pre_trade_export_csv(request):
             entry.trade_taken,
             entry.all_conditions_met,
             entry.notes[:100]
-        ])
+        ] + custom_data_display(entry, custom_fields))
     
     return response
 
@@ -759,201 +398,39 @@ def pre_trade_export_csv(request):
 @login_required
 def backtest_list(request):
     """List backtest entries with advanced filtering, search, and sorting"""
-    from .utils import get_user_journal_fields, search_entries_with_custom_fields, filter_entries_by_custom_field
-    from .models import JournalFieldValue
-    from datetime import datetime
-    
-    entries = BacktestEntry.objects.filter(user=request.user)
-    
-    # Get custom fields for this journal type
-    custom_fields = get_user_journal_fields(request.user, 'backtest')
-    
-    # Search
-    search = request.GET.get('search', '').strip()
-    if search:
-        entries = search_entries_with_custom_fields(entries, search, 'backtest', request.user)
-    
-    # System field filters
-    pair_filter = request.GET.get('pair', '').strip()
-    if pair_filter:
-        entries = entries.filter(pair__icontains=pair_filter)
-    
-    bias_filter = request.GET.get('bias', '').strip()
-    if bias_filter:
-        entries = entries.filter(htf_bias=bias_filter)
-    
-    date_from = request.GET.get('date_from', '').strip()
-    if date_from:
-        try:
-            date_from_obj = datetime.strptime(date_from, '%Y-%m-%d').date()
-            entries = entries.filter(date__gte=date_from_obj)
-        except ValueError:
-            pass
-    
-    date_to = request.GET.get('date_to', '').strip()
-    if date_to:
-        try:
-            date_to_obj = datetime.strptime(date_to, '%Y-%m-%d').date()
-            entries = entries.filter(date__lte=date_to_obj)
-        except ValueError:
-            pass
-    
-    # Custom field filters (same logic as after_trade_list)
-    for field in custom_fields:
-        field_name = f'custom_{field.name}'
-        filter_value = request.GET.get(field_name, '').strip()
-        
-        if filter_value:
-            if field.field_type in ['select', 'multi_select']:
-                entries = filter_entries_by_custom_field(entries, field, filter_value, 'backtest')
-            elif field.field_type in ['number', 'decimal']:
-                min_val = request.GET.get(f'{field_name}_min', '').strip()
-                max_val = request.GET.get(f'{field_name}_max', '').strip()
-                if min_val or max_val:
-                    entry_ids = list(entries.values_list('id', flat=True))
-                    if entry_ids:
-                        field_values = JournalFieldValue.objects.filter(
-                            field=field,
-                            entry_id__in=entry_ids
-                        )
-                        if min_val:
-                            try:
-                                field_values = field_values.filter(value_number__gte=float(min_val))
-                            except (ValueError, TypeError):
-                                pass
-                        if max_val:
-                            try:
-                                field_values = field_values.filter(value_number__lte=float(max_val))
-                            except (ValueError, TypeError):
-                                pass
-                        matching_ids = list(field_values.values_list('entry_id', flat=True))
-                        if matching_ids:
-                            entries = entries.filter(id__in=matching_ids)
-                        else:
-                            entries = entries.none()
-            elif field.field_type == 'date':
-                date_min = request.GET.get(f'{field_name}_min', '').strip()
-                date_max = request.GET.get(f'{field_name}_max', '').strip()
-                if date_min or date_max:
-                    entry_ids = list(entries.values_list('id', flat=True))
-                    if entry_ids:
-                        field_values = JournalFieldValue.objects.filter(
-                            field=field,
-                            entry_id__in=entry_ids
-                        )
-                        if date_min:
-                            try:
-                                date_min_obj = datetime.strptime(date_min, '%Y-%m-%d').date()
-                                field_values = field_values.filter(value_date__gte=date_min_obj)
-                            except (ValueError, TypeError):
-                                pass
-                        if date_max:
-                            try:
-                                date_max_obj = datetime.strptime(date_max, '%Y-%m-%d').date()
-                                field_values = field_values.filter(value_date__lte=date_max_obj)
-                            except (ValueError, TypeError):
-                                pass
-                        matching_ids = list(field_values.values_list('entry_id', flat=True))
-                        if matching_ids:
-                            entries = entries.filter(id__in=matching_ids)
-                        else:
-                            entries = entries.none()
-            elif field.field_type == 'checkbox':
-                if filter_value.lower() in ['true', '1', 'yes']:
-                    entry_ids = list(entries.values_list('id', flat=True))
-                    if entry_ids:
-                        matching_ids = list(JournalFieldValue.objects.filter(
-                            field=field,
-                            entry_id__in=entry_ids,
-                            value_boolean=True
-                        ).values_list('entry_id', flat=True))
-                        entries = entries.filter(id__in=matching_ids)
-    
-    # Sorting
-    sort_by = request.GET.get('sort', 'date_desc').strip()
-    if sort_by:
-        if '_' in sort_by:
-            sort_field_name, sort_order = sort_by.rsplit('_', 1)
-        else:
-            sort_field_name = sort_by
-            sort_order = 'desc'
-        
-        if sort_field_name == 'date':
-            entries = entries.order_by(f'-date' if sort_order == 'desc' else 'date')
-        elif sort_field_name == 'pair':
-            entries = entries.order_by(f'-pair' if sort_order == 'desc' else 'pair')
-        elif sort_field_name == 'bias':
-            entries = entries.order_by(f'-htf_bias' if sort_order == 'desc' else 'htf_bias')
-    
-    # Get unique pairs for filter dropdown
-    unique_pairs = sorted(set(BacktestEntry.objects.filter(user=request.user).values_list('pair', flat=True).distinct()))
-    
-    # Pagination
-    paginator = Paginator(entries, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # Build filter context
-    filters = {
-        'search': search,
-        'pair': pair_filter,
-        'bias': bias_filter,
-        'date_from': date_from,
-        'date_to': date_to,
-        'sort': sort_by,
-    }
-    
-    # Add custom field filter values
-    for field in custom_fields:
-        field_name = f'custom_{field.name}'
-        filters[field_name] = request.GET.get(field_name, '').strip()
-        if field.field_type in ['number', 'decimal', 'date']:
-            filters[f'{field_name}_min'] = request.GET.get(f'{field_name}_min', '').strip()
-            filters[f'{field_name}_max'] = request.GET.get(f'{field_name}_max', '').strip()
-    
-    context = {
-        'page_obj': page_obj,
-        'filters': filters,
-        'custom_fields': custom_fields,
-        'unique_pairs': unique_pairs,
-        'total_results': paginator.count,
-    }
-    return render(request, 'journal/backtest_list.html', context)
+    return _journal_list(request, 'backtest', 'journal/backtest_list.html')
 
 
 @login_required
 def backtest_create(request):
     """Create backtest entry"""
     from .forms import BacktestEntryForm
-    from .utils import save_field_value_for_entry, get_user_journal_fields
+    from .search import deferred_search_refresh
+    from .utils import save_field_values_for_entry
     
     if request.method == 'POST':
-        form = BacktestEntryForm(request.POST, request.FILES, user=request.user)
+        form = BacktestEntryForm.for_user(request.user)(request.POST, request.FILES)
         if form.is_valid():
-            entry = form.save(commit=False)
-            entry.user = request.user
-            entry.save()
+            with deferred_search_refresh():
+                entry = form.save(commit=False)
+                entry.user = request.user
+                entry.save()
             
-            # Save custom field values
-            try:
-                custom_fields = get_user_journal_fields(request.user, 'backtest')
-                for field in custom_fields:
-                    field_key = f'custom_{field.name}'
-                    if field_key in form.cleaned_data:
-                        value = form.cleaned_data[field_key]
-                        try:
-                            save_field_value_for_entry(entry, field, value)
-                        except Exception as e:
-                            # Continue even if one field fails to save
-                            pass
-            except Exception as e:
-                # Continue even if custom fields can't be saved
-                pass
+                # Save custom field values
+                try:
+                    save_field_values_for_entry(entry, {
+                        field: form.cleaned_data[f'custom_{field.name}']
+                        for field in form.custom_fields
+                        if f'custom_{field.name}' in form.cleaned_data
+                    })
+                except Exception as e:
+                    # Continue even if custom fields can't be saved
+                    pass
             
             messages.success(request, 'Backtest entry created successfully!')
             return redirect('backtest_detail', pk=entry.pk)
     else:
-        form = BacktestEntryForm(user=request.user)
+        form = BacktestEntryForm.for_user(request.user)()
     return render(request, 'journal/backtest_form.html', {
         'form': form,
         'action': 'Create'
@@ -977,34 +454,31 @@ def backtest_detail(request, pk):
 def backtest_edit(request, pk):
     """Edit backtest entry"""
     from .forms import BacktestEntryForm
-    from .utils import save_field_value_for_entry, get_user_journal_fields
+    from .search import deferred_search_refresh
+    from .utils import save_field_values_for_entry
     entry = get_object_or_404(BacktestEntry, pk=pk, user=request.user)
     
     if request.method == 'POST':
-        form = BacktestEntryForm(request.POST, request.FILES, instance=entry, user=request.user)
+        form = BacktestEntryForm.for_user(request.user)(request.POST, request.FILES, instance=entry)
         if form.is_valid():
-            entry = form.save()
+            with deferred_search_refresh():
+                entry = form.save()
             
-            # Save custom field values
-            try:
-                custom_fields = get_user_journal_fields(request.user, 'backtest')
-                for field in custom_fields:
-                    field_key = f'custom_{field.name}'
-                    if field_key in form.cleaned_data:
-                        value = form.cleaned_data[field_key]
-                        try:
-                            save_field_value_for_entry(entry, field, value)
-                        except Exception as e:
-                            # Continue even if one field fails to save
-                            pass
-            except Exception as e:
-                # Continue even if custom fields can't be saved
-                pass
+                # Save custom field values
+                try:
+                    save_field_values_for_entry(entry, {
+                        field: form.cleaned_data[f'custom_{field.name}']
+                        for field in form.custom_fields
+                        if f'custom_{field.name}' in form.cleaned_data
+                    })
+                except Exception as e:
+                    # Continue even if custom fields can't be saved
+                    pass
             
             messages.success(request, 'Entry updated successfully!')
             return redirect('backtest_detail', pk=entry.pk)
     else:
-        form = BacktestEntryForm(instance=entry, user=request.user)
+        form = BacktestEntryForm.for_user(request.user)(instance=entry)
     return render(request, 'journal/backtest_form.html', {
         'form': form,
         'entry': entry,
@@ -1026,13 +500,18 @@ def backtest_delete(request, pk):
 @login_required
 def backtest_export_csv(request):
     """Export backtest entries to CSV"""
+    from .utils import get_user_journal_fields, custom_data_display
+    
     entries = BacktestEntry.objects.filter(user=request.user)
     
     response = HttpResponse(content_type='text/csv')
     response['Content-Disposition'] = 'attachment; filename="backtest_entries.csv"'
     
+    # Custom field columns come from each entry's custom_data, so no extra queries
+    custom_fields = list(get_user_journal_fields(request.user, 'backtest'))
+    
     writer = csv.writer(response)
-    writer.writerow(['Date', 'Pair', 'Outcome', 'Strategy Name', 'Notes'])
+    writer.writerow(['Date', 'Pair', 'Outcome', 'Strategy Name', 'Notes'] + [field.display_name for field in custom_fields])
     
     for entry in entries:
         writer.writerow([
@@ -1041,7 +520,7 @@ def backtest_export_csv(request):
             entry.outcome,
             entry.strategy_name or '',
             entry.notes[:100]
-        ])
+        ] + custom_data_display(entry, custom_fields))
     
     return response
 
@@ -1090,8 +569,7 @@ def daily_summary(request, year, month, day):
 def lot_size_calculator(request):
     """Lot size calculator tool"""
     from .forms import LotSizeCalculatorForm
-    from .instrument_data import INSTRUMENTS, get_instrument_data
-    import json
+    from .instrument_data import INSTRUMENT_INDEX, get_instrument_data
     
     if request.method == 'POST':
         form = LotSizeCalculatorForm(request.POST)
@@ -1116,7 +594,7 @@ def lot_size_calculator(request):
                 'form': form, 
                 'result': result,
                 'instrument_data': instrument_data,
-                'instruments_json': json.dumps(INSTRUMENTS),
+                'instruments_json': INSTRUMENT_INDEX.json,
                 'recent_calculations': []
             })
     else:
@@ -1132,7 +610,7 @@ def lot_size_calculator(request):
     
     return render(request, 'journal/lot_size_calculator.html', {
         'form': form,
-        'instruments_json': json.dumps(INSTRUMENTS),
+        'instruments_json': INSTRUMENT_INDEX.json,
         'recent_calculations': recent_calculations
     })
 
@@ -1239,21 +717,28 @@ def view_related_trades(request):
 
 
 # Profile
+def _profile_counts(user):
+    """Entry counts for the profile page's cached statistics block"""
+    after_count = AfterTradeEntry.objects.filter(user=user).count()
+    pre_count = PreTradeEntry.objects.filter(user=user).count()
+    backtest_count = BacktestEntry.objects.filter(user=user).count()
+    return {
+        'after_count': after_count,
+        'pre_count': pre_count,
+        'backtest_count': backtest_count,
+        'total_entries': after_count + pre_count + backtest_count,
+    }
+
+
 @login_required
 def profile(request):
     """User profile page"""
-    after_count = AfterTradeEntry.objects.filter(user=request.user).count()
-    pre_count = PreTradeEntry.objects.filter(user=request.user).count()
-    backtest_count = BacktestEntry.objects.filter(user=request.user).count()
-    total_entries = after_count + pre_count + backtest_count
-    
     context = {
         'user': request.user,
-        'after_count': after_count,
-        'pre_count': pre_count,
-        'backtest_count': backtest_count,
-        'total_entries': total_entries,
+        # Only evaluated when the cached statistics block misses
+        'counts': SimpleLazyObject(lambda: _profile_counts(request.user)),
     }
+    context.update(_fragment_cache_context(request.user))
     return render(request, 'journal/profile.html', context)
 
 
@@ -1262,159 +747,45 @@ def profile(request):
 @login_required
 def global_search(request):
     """Global search across all journal types"""
+    from .query_engine import TRUE_VALUES
+
     query = request.GET.get('q', '').strip()
+    fuzzy = request.GET.get('fuzzy', '').lower() in TRUE_VALUES
     results = {
         'after_trades': [],
         'pre_trades': [],
         'backtests': [],
-        'query': query
+        'query': query,
+        'fuzzy': fuzzy,
     }
     
     if query:
-        # Search after trades
-        after_q = Q(
-            Q(pair__icontains=query) |
-            Q(observations__icontains=query) |
-            Q(major_impact_news__icontains=query) |
-            Q(ai_summary__icontains=query)
-        )
-        results['after_trades'] = AfterTradeEntry.objects.filter(
-            user=request.user
-        ).filter(after_q).order_by('-date', '-time_of_entry')[:20]
-        
-        # Search pre trades
-        pre_q = Q(
-            Q(pair__icontains=query) |
-            Q(notes__icontains=query) |
-            Q(reason_for_taking_or_not__icontains=query) |
-            Q(htf_draws__icontains=query) |
-            Q(lower_tf_confirmation__icontains=query)
-        )
-        results['pre_trades'] = PreTradeEntry.objects.filter(
-            user=request.user
-        ).filter(pre_q).order_by('-date')[:20]
-        
-        # Search backtests
-        backtest_q = Q(
-            Q(pair__icontains=query) |
-            Q(notes__icontains=query) |
-            Q(entry_trigger__icontains=query) |
-            Q(behaviour_based_on_previous_moves__icontains=query) |
-            Q(lower_tf_bos__icontains=query) |
-            Q(high_impact_news__icontains=query)
-        )
-        results['backtests'] = BacktestEntry.objects.filter(
-            user=request.user
-        ).filter(backtest_q).order_by('-date')[:20]
+        # One ranked full-text query over the search documents of all journals
+        from .search import search_journals
+
+        found = search_journals(request.user, query, fuzzy=fuzzy)
+        results['after_trades'] = found['after_trade']
+        results['pre_trades'] = found['pre_trade']
+        results['backtests'] = found['backtest']
     
     return render(request, 'journal/global_search.html', results)
 
 
 @login_required
 def trade_statistics(request):
-    """Comprehensive trade statistics page"""
-    after_trades = AfterTradeEntry.objects.filter(user=request.user)
-    
-    # Overall stats
-    total_trades = after_trades.count()
-    wins = after_trades.filter(outcome='win').count()
-    losses = after_trades.filter(outcome='loss').count()
-    win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
-    
-    # Advanced metrics
-    winning_trades = after_trades.filter(outcome='win')
-    losing_trades = after_trades.filter(outcome='loss')
-    
-    # Average win/loss (using pips as proxy)
-    avg_win_pips = winning_trades.aggregate(Avg('reward_pips'))['reward_pips__avg'] or 0
-    avg_loss_pips = losing_trades.aggregate(Avg('risk_pips'))['risk_pips__avg'] or 0
-    profit_factor = (avg_win_pips * wins) / (avg_loss_pips * losses) if losses > 0 and avg_loss_pips else 0
-    
-    # Best and worst trades (by RR ratio)
-    best_trade = after_trades.filter(rr_ratio__isnull=False).order_by('-rr_ratio').first()
-    worst_trade = after_trades.filter(rr_ratio__isnull=False).order_by('rr_ratio').first()
-    
-    # Max consecutive wins/losses
-    trades_ordered = after_trades.order_by('date', 'time_of_entry')
-    max_win_streak = 0
-    max_loss_streak = 0
-    current_win_streak = 0
-    current_loss_streak = 0
-    
-    for trade in trades_ordered:
-        if trade.outcome == 'win':
-            current_win_streak += 1
-            current_loss_streak = 0
-            max_win_streak = max(max_win_streak, current_win_streak)
-        else:
-            current_loss_streak += 1
-            current_win_streak = 0
-            max_loss_streak = max(max_loss_streak, current_loss_streak)
-    
-    # Monthly stats
-    monthly_stats = {}
-    for trade in after_trades:
-        month_key = f"{trade.date.year}-{trade.date.month:02d}"
-        if month_key not in monthly_stats:
-            monthly_stats[month_key] = {'wins': 0, 'losses': 0, 'total': 0}
-        monthly_stats[month_key]['total'] += 1
-        if trade.outcome == 'win':
-            monthly_stats[month_key]['wins'] += 1
-        else:
-            monthly_stats[month_key]['losses'] += 1
-    
-    # Calculate win rates for monthly stats
-    for key in monthly_stats:
-        stats = monthly_stats[key]
-        stats['win_rate'] = (stats['wins'] / stats['total'] * 100) if stats['total'] > 0 else 0
-    
-    # Per pair stats
-    pair_stats = {}
-    for trade in after_trades:
-        if trade.pair not in pair_stats:
-            pair_stats[trade.pair] = {'wins': 0, 'losses': 0, 'total': 0}
-        pair_stats[trade.pair]['total'] += 1
-        if trade.outcome == 'win':
-            pair_stats[trade.pair]['wins'] += 1
-        else:
-            pair_stats[trade.pair]['losses'] += 1
-    
-    # Per session stats
-    session_stats = {}
-    for trade in after_trades:
-        if trade.session not in session_stats:
-            session_stats[trade.session] = {'wins': 0, 'losses': 0, 'total': 0}
-        session_stats[trade.session]['total'] += 1
-        if trade.outcome == 'win':
-            session_stats[trade.session]['wins'] += 1
-        else:
-            session_stats[trade.session]['losses'] += 1
-    
-    # Calculate win rates for pair and session
-    for key in pair_stats:
-        stats = pair_stats[key]
-        stats['win_rate'] = (stats['wins'] / stats['total'] * 100) if stats['total'] > 0 else 0
-    
-    for key in session_stats:
-        stats = session_stats[key]
-        stats['win_rate'] = (stats['wins'] / stats['total'] * 100) if stats['total'] > 0 else 0
+    """Comprehensive trade statistics page, optionally filtered by date range, pairs and tags"""
+    from .services import StatisticsEngine, StatisticsFilters
     
+    filters = StatisticsFilters.from_querydict(request.GET)
+    engine = StatisticsEngine(request.user, filters)
+    # Only evaluated when the cached statistics block misses
     context = {
-        'total_trades': total_trades,
-        'wins': wins,
-        'losses': losses,
-        'win_rate': round(win_rate, 1),
-        'avg_win_pips': round(float(avg_win_pips), 2) if avg_win_pips else 0,
-        'avg_loss_pips': round(float(avg_loss_pips), 2) if avg_loss_pips else 0,
-        'profit_factor': round(float(profit_factor), 2) if profit_factor else 0,
-        'best_trade': best_trade,
-        'worst_trade': worst_trade,
-        'max_win_streak': max_win_streak,
-        'max_loss_streak': max_loss_streak,
-        'monthly_stats': monthly_stats,
-        'pair_stats': pair_stats,
-        'session_stats': session_stats,
+        'statistics': SimpleLazyObject(engine.compute),
+        'filters': filters,
+        'filter_key': filters.cache_key(),
+        'filter_options': SimpleLazyObject(lambda: StatisticsEngine.filter_options(request.user)),
     }
+    context.update(_fragment_cache_context(request.user))
     
     return render(request, 'journal/trade_statistics.html', context)
 
@@ -1514,7 +885,7 @@ def use_template(request, template_id):
         'risk_percentage': template.risk_percentage,
     }
     
-    form = AfterTradeEntryForm(initial=initial_data)
+    form = AfterTradeEntryForm.for_user(request.user)(initial=initial_data)
     return render(request, 'journal/after_trade_form.html', {
         'form': form,
         'template': template,
@@ -209,6 +209,14 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Cached dashboard/statistics fragments are keyed by a per-user data version,
+# so writes never serve stale numbers; old fragments simply expire after this many seconds
+JOURNAL_CACHE_TIMEOUT = int(os.environ.get('JOURNAL_CACHE_TIMEOUT', 60 * 15))
+
+# Journal list pagination: 'offset' (numbered pages) or 'cursor' (keyset pages with a
+# cached total). Can also be chosen per request with ?paginate=cursor / ?paginate=offset
+JOURNAL_LIST_PAGINATION = os.environ.get('JOURNAL_LIST_PAGINATION', 'offset')
+
 # Login URLs
 LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'